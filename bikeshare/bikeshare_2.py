@@ -1,21 +1,82 @@
 import calendar
+import collections
 from datetime import datetime
+import json
+import os
+import zipfile
 import numpy as np
 import pandas as pd
 import time
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Without pyarrow, every city file is read from its CSV file
+    pq = None
+
 CITY_DATA = { 'chicago': 'chicago.csv',
               'new york city': 'new_york_city.csv',
               'washington': 'washington.csv' }
 
-def display_data(df):
+# The columns that the statistics use (besides 'Start Time' and 'Trip Duration'), and the type
+# to read each as. Repeated strings become categories; Washington has no 'Gender' or 'Birth Year'.
+COLUMN_DTYPES = { 'Start Station': 'category',
+                  'End Station': 'category',
+                  'User Type': 'category',
+                  'Gender': 'category',
+                  'Birth Year': 'float32' }
+
+# The layout of the 'Start Time' column in every city file.
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june']
+
+# Bump this whenever the columns of the Parquet cache or the layout of the cube change, so that
+# old cache and cube files are rebuilt.
+CACHE_VERSION = 2
+# The key of the Parquet cache's own metadata, which describes the CSV file it was built from.
+CACHE_METADATA_KEY = b'bikeshare'
+# How many trips each row group of the Parquet cache holds. Trips are sorted by month and day
+# before they're written, so a month or day filter can skip the row groups of other days.
+CACHE_ROW_GROUP_SIZE = 1 << 16
+
+# How many cities' trips to keep in memory between restarts, and how much memory they may take up.
+MAX_CACHED_CITIES = 3
+MAX_CACHED_BYTES = 256 * 1024 * 1024
+
+# Each city kept in memory maps to its CSV file's metadata, its trips and their size in bytes,
+# least recently used first.
+CITY_FRAMES = collections.OrderedDict()
+
+# The cities whose trips have been dropped from memory since they were last reported.
+DROPPED_CITIES = []
+
+# Each city whose cube has been loaded maps to its CSV file's metadata and its cube.
+CITY_CUBES = {}
+
+# The hours of the day, and the optional user columns that a cube can count trips by.
+HOURS = 24
+USER_COLUMNS = ('Gender', 'Birth Year')
+
+def display_data(city, month, day):
     """
     Asks the user if they want to see 5 rows of data and keeps iterating until the user says 'no'.
+
+    The trips are only loaded once the user asks to see them, since the statistics don't need them.
+
+    Args:
+        (str) city - name of the city to analyze
+        (str) month - name of the month to filter by, or "all" to apply no month filter
+        (str) day - name of the day of week to filter by, or "all" to apply no day filter
     """
+    df = None
     start_row = 0
     while True:
         show_data = input("\nWould you like to see 5 rows of data? Enter 'yes' or 'no': ").strip().lower()
         if show_data == 'yes':
+            if df is None:
+                df = load_data(city, month, day)
             # display(df.iloc[start_row:start_row+5])  # Display next 5 rows
             # print(df.head(start_row:start_row+5))
             print(df[start_row:start_row+5].head())
@@ -73,30 +134,459 @@ def load_data(city, month, day):
     """
     Loads data for the specified city and filters by month and day if applicable.
 
+    If the city's trips are in memory (see get_city_data), filtering selects from them, so
+    changing the filters doesn't read the city again. Otherwise, only the trips of the month and
+    day are read from the city's Parquet cache, if it's up to date, with the filters pushed down
+    into the Parquet reader; failing that, all of the city's trips are loaded and kept in memory.
+
     Args:
         (str) city - name of the city to analyze
         (str) month - name of the month to filter by, or "all" to apply no month filter
         (str) day - name of the day of week to filter by, or "all" to apply no day filter
     Returns:
-        df - Pandas DataFrame containing city data filtered by month and day
+        df - Pandas DataFrame containing city data filtered by month and day, which mustn't be
+             modified (unfiltered, it's the very frame kept in memory)
     """
-    df = pd.read_csv(CITY_DATA[city])
-    df.drop('Unnamed: 0', axis=1, inplace=True)
-    df['Start Time'] = pd.to_datetime(df['Start Time'])
-    df['month'] = df['Start Time'].dt.month
-    df['day_of_week'] = df['Start Time'].dt.day_name()
-    
+    filters = []
     if month != 'all':
-        months = ['january', 'february', 'march', 'april', 'may', 'june']
-        month = months.index(month) + 1
-        df = df[df['month'] == month]
-        
+        filters.append(('month', '==', MONTHS.index(month) + 1))
     if day != 'all':
-        df = df[df['day_of_week'] == day.title()]
+        filters.append(('day_of_week', '==', day.title()))
+
+    df = city_data_in_memory(city, city_source_metadata(city))
+    if df is None and filters:
+        df = read_city_cache(city, filters)
+        if df is not None:
+            return df
+    if df is None:
+        df = get_city_data(city)
+    if not filters:
+        return df
+
+    mask = np.ones(len(df), dtype=bool)
+    for column, _, value in filters:
+        mask &= (df[column] == value).to_numpy()
         
+    return df[mask]
+
+def city_data_in_memory(city, source):
+    """
+    Returns all of a city's trips if they're in memory and its CSV file hasn't changed since, or else None.
+
+    Args:
+        (str) city - name of the city
+        (bytes) source - the current metadata of the city's CSV file, from city_source_metadata
+    Returns:
+        df - Pandas DataFrame containing all of the city's data, or None
+    """
+    if city not in CITY_FRAMES:
+        return None
+    cached_source, df, _ = CITY_FRAMES[city]
+    if cached_source != source:
+        del CITY_FRAMES[city]
+        return None
+    CITY_FRAMES.move_to_end(city)
+    return df
+
+def get_city_data(city):
+    """
+    Returns all of a city's trips, from memory if they've been loaded since its CSV file changed.
+
+    Otherwise, they're read from the city's Parquet cache if it's up to date, or else from its
+    CSV file (which rebuilds the cache), and kept in memory. The least recently used cities are
+    dropped from memory when there are more than MAX_CACHED_CITIES of them, or when they take up
+    more than MAX_CACHED_BYTES; they're listed in DROPPED_CITIES, for report_dropped_cities.
+
+    Args:
+        (str) city - name of the city to load
+    Returns:
+        df - Pandas DataFrame containing all of the city's data, which mustn't be modified
+    """
+    source = city_source_metadata(city)
+    df = city_data_in_memory(city, source)
+    if df is not None:
+        return df
+
+    df = read_city_cache(city)
+    if df is None:
+        df = read_city_data(city)
+        write_city_cache(city, df)
+
+    size = df.memory_usage(deep=True).sum()
+    if size <= MAX_CACHED_BYTES:
+        CITY_FRAMES[city] = (source, df, size)
+    while len(CITY_FRAMES) > MAX_CACHED_CITIES or \
+            sum(size for _, _, size in CITY_FRAMES.values()) > MAX_CACHED_BYTES:
+        evicted, _ = CITY_FRAMES.popitem(last=False)
+        DROPPED_CITIES.append(evicted)
+    return df
+
+def report_dropped_cities():
+    """
+    Tells the user which cities' trips have been dropped from memory since the last report.
+    """
+    for city in DROPPED_CITIES:
+        print(f"Dropped {city.title()}'s trips from memory to make room.")
+    DROPPED_CITIES.clear()
+
+def read_city_data(city):
+    """
+    Reads every trip of a city, keeping only the columns the statistics use, in compact types.
+
+    Prints how long the city file took to load and how much memory its data takes up.
+
+    Args:
+        (str) city - name of the city to load
+    Returns:
+        df - Pandas DataFrame containing all of the city's data, with 'month', 'day_of_week' and 'hour' columns
+    """
+    start_time = time.time()
+    df = pd.read_csv(CITY_DATA[city],
+                     usecols=lambda column: column in ('Start Time', 'Trip Duration') or column in COLUMN_DTYPES,
+                     dtype=COLUMN_DTYPES)
+    # Store whole-second durations in the narrowest integer type; fractional ones (Washington's) stay floats
+    df['Trip Duration'] = pd.to_numeric(df['Trip Duration'], downcast='integer')
+    df['Start Time'] = pd.to_datetime(df['Start Time'], format=TIME_FORMAT)
+    df['month'] = df['Start Time'].dt.month.astype('int8')
+    df['hour'] = df['Start Time'].dt.hour.astype('int8')
+    # Name the days through a category, rather than formatting a name for every trip
+    df['day_of_week'] = pd.Categorical.from_codes(df['Start Time'].dt.dayofweek,
+                                                  categories=list(calendar.day_name))
+
+    memory = df.memory_usage(deep=True).sum()
+    print(f"Loaded {CITY_DATA[city]}: {len(df):,} trips in {time.time() - start_time:.3f} seconds, "
+          f"{memory / 1024 / 1024:.1f} MB in memory.")
     return df
 
-def station_stats(df):
+def city_cache_path(city):
+    """
+    Returns the path of a city's Parquet cache, which sits next to its CSV file.
+    """
+    return os.path.splitext(CITY_DATA[city])[0] + '.parquet'
+
+def city_source_metadata(city):
+    """
+    Describes a city's CSV file, so that a cache built from it can tell when it has changed.
+
+    Returns:
+        (bytes) metadata - JSON describing the CSV file and the cache layout
+    """
+    stat = os.stat(CITY_DATA[city])
+    return json.dumps({'version': CACHE_VERSION, 'source': CITY_DATA[city],
+                       'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}).encode()
+
+def read_city_cache(city, filters=()):
+    """
+    Reads the trips of a city that match some filters from its Parquet cache, if it's up to date.
+
+    The filters are pushed down into the Parquet reader, which skips the row groups that can't
+    match them, and drops the other trips before they're converted into a DataFrame.
+
+    Args:
+        (str) city - name of the city to load
+        (list) filters - (column, '==', value) filters on the 'month' and 'day_of_week' columns, if any
+    Returns:
+        df - Pandas DataFrame containing the city's matching trips, or None if there's no up to date cache
+    """
+    path = city_cache_path(city)
+    if pq is None or not os.path.exists(path):
+        return None
+    start_time = time.time()
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+        if metadata.get(CACHE_METADATA_KEY) != city_source_metadata(city):
+            return None
+        df = pq.read_table(path, filters=filters or None).to_pandas()
+    except (OSError, pa.ArrowException):
+        # A damaged cache is rebuilt, just like an outdated one
+        return None
+
+    print(f"Loaded {path}: {len(df):,} trips in {time.time() - start_time:.3f} seconds.")
+    return df
+
+def write_city_cache(city, df):
+    """
+    Writes all of a city's trips to its Parquet cache, sorted by month and day.
+
+    Failing to write the cache isn't fatal: the CSV file is just read again the next time.
+
+    Args:
+        (str) city - name of the city whose trips these are
+        df - Pandas DataFrame containing all of the city's data, as read by read_city_data
+    """
+    if pq is None:
+        return
+    path = city_cache_path(city)
+    # Sorting is stable, so the trips of each month and day stay in the order of the CSV file
+    table = pa.Table.from_pandas(df.sort_values(['month', 'day_of_week'], kind='stable'),
+                                 preserve_index=False)
+    table = table.replace_schema_metadata({**table.schema.metadata,
+                                           CACHE_METADATA_KEY: city_source_metadata(city)})
+    try:
+        # Write to a temporary file first, so that a half written cache is never read
+        pq.write_table(table, path + '.tmp', row_group_size=CACHE_ROW_GROUP_SIZE)
+        os.replace(path + '.tmp', path)
+    except OSError as err:
+        print(f"Couldn't cache {CITY_DATA[city]} in {path}: {err}")
+
+
+# Everything that the statistics report about some trips, computed together by compute_stats.
+# The user statistics are None where the city's data has no such column.
+TripStats = collections.namedtuple('TripStats', [
+    'common_month', 'common_day', 'common_hour',
+    'common_start_station', 'common_end_station', 'common_trip',
+    'total_travel_time', 'mean_travel_time',
+    'user_types', 'gender_counts', 'birth_years', 'age_distribution', 'user_type_durations'])
+
+def most_common_name(counts, name_of):
+    """
+    Returns the name of the most common value, given how many trips have each value.
+
+    Ties go to the name that comes first alphabetically, just as mode() sorts the tied values.
+
+    Args:
+        (ndarray) counts - how many trips have each value
+        name_of - function from the position of a value in counts to its name
+    """
+    return min(name_of(code) for code in np.flatnonzero(counts == counts.max()))
+
+def value_counts(counts, names, name):
+    """
+    Lists how many trips have each value of a column, most common first, leaving out absent values.
+
+    Args:
+        (ndarray) counts - how many trips have each value
+        (ndarray) names - the values
+        (str) name - name of the column
+    Returns:
+        counts - Pandas Series of the counts, indexed by value, just as value_counts returns them
+    """
+    order = np.argsort(-counts, kind='stable')
+    order = order[counts[order] > 0]
+    return pd.Series(counts[order], index=pd.Index(names[order], name=name), name='count')
+
+def category_codes(column):
+    """
+    Returns the category codes of a categorical column, with missing values coded as the number of categories.
+    """
+    codes = column.cat.codes.to_numpy().astype(np.int64)
+    codes[codes < 0] = len(column.cat.categories)
+    return codes
+
+def build_cube(df):
+    """
+    Aggregates all of a city's trips into a cube, from which the statistics of any month and day follow.
+
+    The cube counts trips, and sums their durations and squared durations, for every month, day of
+    the week, hour, user type and gender (with missing user types and genders counted as one more
+    of each). Alongside, it counts the trips from and to each station, between each pair of stations
+    and by each year of birth, for every month and day of the week. Every statistic is then exact,
+    and is computed from the cells of the month and day rather than from the trips.
+
+    Args:
+        df - Pandas DataFrame containing all of the city's data, as returned by get_city_data
+    Returns:
+        (dict) cube - the cube's arrays, by name
+    """
+    user_columns = [column for column in USER_COLUMNS if column in df]
+    user_types = df['User Type'].cat.categories.to_numpy(dtype=str)
+    genders = df['Gender'].cat.categories.to_numpy(dtype=str) if 'Gender' in df else np.array([], dtype=str)
+    start_stations = df['Start Station'].cat.categories.to_numpy(dtype=str)
+    end_stations = df['End Station'].cat.categories.to_numpy(dtype=str)
+
+    # The cell of each trip's month and day of the week, and of its hour, user type and gender within that
+    days = (df['month'].to_numpy().astype(np.int64) - 1) * 7 + df['day_of_week'].cat.codes.to_numpy()
+    shape = (12, 7, HOURS, len(user_types) + 1, len(genders) + 1)
+    cells = days * HOURS + df['hour'].to_numpy()
+    cells = cells * shape[3] + category_codes(df['User Type'])
+    cells = cells * shape[4] + (category_codes(df['Gender']) if 'Gender' in df else 0)
+
+    durations = df['Trip Duration'].to_numpy()
+    duration_sums = np.bincount(cells, weights=durations, minlength=np.prod(shape)).reshape(shape)
+    if np.issubdtype(durations.dtype, np.integer):
+        # Whole seconds add up to whole seconds, exactly
+        duration_sums = duration_sums.astype(np.int64)
+
+    # Trips from and to stations without a name aren't counted, just as mode() doesn't count them
+    start_codes, end_codes = category_codes(df['Start Station']), category_codes(df['End Station'])
+    day_cells = 12 * 7  # one for every month and day of the week
+    start_counts = np.bincount(days * (len(start_stations) + 1) + start_codes,
+                               minlength=day_cells * (len(start_stations) + 1))
+    end_counts = np.bincount(days * (len(end_stations) + 1) + end_codes,
+                             minlength=day_cells * (len(end_stations) + 1))
+    # Only the pairs of stations that trips are taken between, on each day, are counted
+    known = (start_codes < len(start_stations)) & (end_codes < len(end_stations))
+    pairs = len(start_stations) * len(end_stations)
+    trip_keys, trip_counts = np.unique(
+        days[known] * pairs + start_codes[known] * len(end_stations) + end_codes[known], return_counts=True)
+
+    if 'Birth Year' in df:
+        years = df['Birth Year'].to_numpy(dtype='float64')
+        known = ~np.isnan(years)
+        first_year = int(years[known].min()) if known.any() else 0
+        year_count = int(years[known].max()) - first_year + 1 if known.any() else 0
+        birth_year_counts = np.bincount(days[known] * year_count + (years[known] - first_year).astype(np.int64),
+                                        minlength=day_cells * year_count)
+    else:
+        first_year, year_count, birth_year_counts = 0, 0, np.zeros(0, dtype=np.int64)
+
+    return {'counts': np.bincount(cells, minlength=np.prod(shape)).reshape(shape),
+            'duration_sums': duration_sums,
+            'duration_squares': np.bincount(cells, weights=np.square(durations, dtype='float64'),
+                                            minlength=np.prod(shape)).reshape(shape),
+            'user_columns': np.array(user_columns, dtype=str), 'user_types': user_types, 'genders': genders,
+            'start_stations': start_stations, 'end_stations': end_stations,
+            'start_counts': start_counts.reshape(12, 7, -1)[..., :-1],
+            'end_counts': end_counts.reshape(12, 7, -1)[..., :-1],
+            'trip_keys': trip_keys, 'trip_counts': trip_counts,
+            'first_birth_year': np.array(first_year),
+            'birth_year_counts': birth_year_counts.reshape(12, 7, year_count)}
+
+def city_cube_path(city):
+    """
+    Returns the path of a city's cube file, which sits next to its CSV file.
+    """
+    return os.path.splitext(CITY_DATA[city])[0] + '.cube.npz'
+
+def get_city_cube(city):
+    """
+    Returns a city's cube: from memory or from its cube file if they're up to date, or else built from its trips.
+
+    A cube that's built is written to the city's cube file, for the next time.
+
+    Args:
+        (str) city - name of the city to load
+    Returns:
+        (dict) cube - the cube's arrays, by name, as returned by build_cube
+    """
+    source = city_source_metadata(city)
+    if city in CITY_CUBES and CITY_CUBES[city][0] == source:
+        return CITY_CUBES[city][1]
+
+    path = city_cube_path(city)
+    cube = None
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as file, np.load(file) as arrays:
+                if arrays['source'].item().encode() == source:
+                    cube = {name: arrays[name] for name in arrays.files if name != 'source'}
+        except (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile):
+            # A damaged cube file (an empty one, a truncated one that isn't even a zip file, or one
+            # missing an array) is rebuilt, just like an outdated one
+            pass
+
+    if cube is None:
+        start_time = time.time()
+        cube = build_cube(get_city_data(city))
+        print(f"Built the cube of {CITY_DATA[city]} in {time.time() - start_time:.3f} seconds.")
+        try:
+            # Write to a temporary file first, so that a half written cube is never read
+            with open(path + '.tmp', 'wb') as file:
+                np.savez(file, source=np.array(source.decode()), **cube)
+            os.replace(path + '.tmp', path)
+        except OSError as err:
+            print(f"Couldn't save the cube of {CITY_DATA[city]} in {path}: {err}")
+
+    CITY_CUBES[city] = (source, cube)
+    return cube
+
+def order_statistics(values, counts, ranks):
+    """
+    Returns the values at some ranks (counting from 0) of the sorted trips, given how many trips have each value.
+    """
+    return values[np.searchsorted(np.cumsum(counts), ranks, side='right')]
+
+def compute_stats(city, month, day):
+    """
+    Computes every statistic about the trips of a city in a month and on a day from the city's cube.
+
+    Only the cells of the month and day are added up, however many trips they count. Ties for
+    the most common value go to the same value as mode(): the first month, hour or year of birth,
+    and the alphabetically first day, station or trip.
+
+    Args:
+        (str) city - name of the city to analyze
+        (str) month - name of the month to filter by, or "all" to apply no month filter
+        (str) day - name of the day of week to filter by, or "all" to apply no day filter
+    Returns:
+        (TripStats) stats - the statistics, to be printed by the *_stats functions, or None if no trips match
+    """
+    cube = get_city_cube(city)
+
+    print('\nCalculating the statistics...\n')
+    start_time = time.time()
+
+    selected = np.zeros((12, 7), dtype=bool)
+    selected[slice(None) if month == 'all' else MONTHS.index(month),
+             slice(None) if day == 'all' else list(calendar.day_name).index(day.title())] = True
+    counts = cube['counts'][selected]
+    trip_count = counts.sum()
+    if not trip_count:
+        return None
+
+    # The most frequent times of travel
+    day_counts = cube['counts'].sum(axis=(2, 3, 4)) * selected
+    common_month = int(day_counts.sum(axis=1).argmax()) + 1
+    common_day = most_common_name(day_counts.sum(axis=0), calendar.day_name.__getitem__)
+    common_hour = int(counts.sum(axis=(0, 2, 3)).argmax())
+
+    # The most popular stations, and trip between them
+    start_stations, end_stations = cube['start_stations'], cube['end_stations']
+    common_start_station = most_common_name(cube['start_counts'][selected].sum(axis=0),
+                                            start_stations.__getitem__)
+    common_end_station = most_common_name(cube['end_counts'][selected].sum(axis=0),
+                                          end_stations.__getitem__)
+    pairs = len(start_stations) * len(end_stations)
+    trip_keys, trip_counts = cube['trip_keys'], cube['trip_counts']
+    on_selected_days = selected.ravel()[trip_keys // pairs]
+    pair_counts = np.bincount(trip_keys[on_selected_days] % pairs,
+                              weights=trip_counts[on_selected_days], minlength=pairs)
+    common_trip = most_common_name(
+        pair_counts,
+        lambda pair: f"{start_stations[pair // len(end_stations)]} to {end_stations[pair % len(end_stations)]}")
+
+    # The total and mean trip durations, overall and by user type
+    duration_sums = cube['duration_sums'][selected]
+    total_travel_time = duration_sums.sum()
+    mean_travel_time = total_travel_time / trip_count
+    user_type_counts = counts.sum(axis=(0, 1, 3))[:-1]
+    user_types = value_counts(user_type_counts, cube['user_types'], 'User Type')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_durations = duration_sums.sum(axis=(0, 1, 3))[:-1] / user_type_counts
+    user_type_durations = dict(zip(cube['user_types'], mean_durations))
+
+    # The users' genders and years of birth, where the city records them
+    gender_counts = birth_years = age_distribution = None
+    if 'Gender' in cube['user_columns']:
+        gender_counts = value_counts(counts.sum(axis=(0, 1, 2))[:-1], cube['genders'], 'Gender')
+    year_counts = cube['birth_year_counts'][selected].sum(axis=0)
+    if 'Birth Year' in cube['user_columns'] and year_counts.any():
+        years = cube['first_birth_year'] + np.flatnonzero(year_counts)
+        year_counts = year_counts[year_counts > 0]
+        birth_years = int(years[0]), int(years[-1]), int(years[year_counts.argmax()])
+        # The ages, youngest first, just as describe() finds their mean, spread and quartiles
+        ages, age_counts = (pd.to_datetime('now').year - years[::-1]).astype('float64'), year_counts[::-1]
+        count = age_counts.sum()
+        mean = (ages * age_counts).sum() / count
+        # describe() has no spread for a single age
+        std = np.sqrt((np.square(ages - mean) * age_counts).sum() / (count - 1)) if count > 1 else np.nan
+        positions = np.array([0.25, 0.5, 0.75]) * (count - 1)
+        lower = order_statistics(ages, age_counts, np.floor(positions))
+        upper = order_statistics(ages, age_counts, np.ceil(positions))
+        quartiles = lower + (upper - lower) * (positions - np.floor(positions))
+        age_distribution = pd.Series([count, mean, std, ages[0], *quartiles, ages[-1]],
+                                     index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'],
+                                     name='Age')
+
+    print("This took %s seconds." % (time.time() - start_time))
+    print('-'*40)
+    return TripStats(common_month, common_day, common_hour,
+                     common_start_station, common_end_station, common_trip,
+                     total_travel_time, mean_travel_time,
+                     user_types, gender_counts, birth_years, age_distribution, user_type_durations)
+
+
+def station_stats(stats):
     """Displays statistics on the most popular stations and trip.
     
     Returns and prints:
@@ -106,55 +596,31 @@ def station_stats(df):
     
     """
 
-    print('\nCalculating The Most Popular Stations and Trip...\n')
-    start_time = time.time()
+    print('\nThe Most Popular Stations and Trip...\n')
 
-    try:
-        # display most commonly used start station, end station and most frequent combination of start station and end station trip
-        most_common_start_station = df['Start Station'].mode()[0]
-        most_common_end_station = df['End Station'].mode()[0]
-        df['Start End Station'] = df['Start Station'] + ' to ' + df['End Station']
-        most_common_combination = df['Start End Station'].mode()[0]
-        
-        # Print most common start station, end station, and combination
-        print("Most common start station is: ", most_common_start_station, "\nMost common end station is: ", most_common_end_station, "\nMost common combination is: ", most_common_combination)
-    
-    except KeyError:
-        print("The 'Start Station' or 'End Station' columns are not present in the dataset.")
-    
+    # Print most common start station, end station, and combination
+    print("Most common start station is: ", stats.common_start_station, "\nMost common end station is: ", stats.common_end_station, "\nMost common combination is: ", stats.common_trip)
 
-    print("\nThis took %s seconds." % (time.time() - start_time))
     print('-'*40)
     
-    return most_common_start_station, most_common_end_station, most_common_combination
+    return stats.common_start_station, stats.common_end_station, stats.common_trip
 
 
-def time_stats(df):
+def time_stats(stats):
     """Displays statistics on the most frequent times of travel."""
 
-    print('\nCalculating The Most Frequent Times of Travel...\n')
-    start_time = time.time()
+    print('\nThe Most Frequent Times of Travel...\n')
 
-    # display the most common month
-    common_month = df['month'].mode()[0]
-    common_month_name = calendar.month_name[common_month]  # Convert month number to month name
-
-    # display the most common day of week
-    common_day = df['day_of_week'].mode()[0]
-
-    # display the most common start hour
-    df['hour'] = df['Start Time'].dt.hour
-    common_hour = df['hour'].mode()[0]
-    common_hour_12hr = datetime.strptime(str(common_hour), "%H").strftime("%I %p")  # Convert to 12-hour format
+    common_month_name = calendar.month_name[stats.common_month]  # Convert month number to month name
+    common_hour_12hr = datetime.strptime(str(stats.common_hour), "%H").strftime("%I %p")  # Convert to 12-hour format
 
     # print the most common month, day of week, and start hour
-    print("Common month is: ", common_month_name, "\nCommon day is: ", common_day, "\nAnd finally common hour is: ", common_hour_12hr)
+    print("Common month is: ", common_month_name, "\nCommon day is: ", stats.common_day, "\nAnd finally common hour is: ", common_hour_12hr)
     
-    print("\nThis took %s seconds." % (time.time() - start_time))
     print('-'*40)
 
 
-def trip_duration_stats(df):
+def trip_duration_stats(stats):
     """Displays statistics on the total and average trip duration.
     
     Returns and prints:
@@ -162,89 +628,67 @@ def trip_duration_stats(df):
         (int) mean_travel_time - The mean travel time
     """
 
-    print('\nCalculating Trip Duration...\n')
-    start_time = time.time()
-
-    try:
+    print('\nTrip Duration...\n')
 
-        # display total travel time
-        total_travel_time = df['Trip Duration'].sum()
-        total_minutes = total_travel_time // 60 + (total_travel_time % 60)
-        
-        total_hours = total_minutes // 60
-        total_days = total_hours // 24
-        rounded_total_travel_time = np.round(total_days, 2)
-
-        # display mean travel time
-        mean_travel_time = df['Trip Duration'].mean()
-        mean_minutes = mean_travel_time // 60 + (mean_travel_time % 60)
-        rounded_mean_travel_time = np.round(mean_minutes, 2)
+    # display total travel time
+    total_travel_time = stats.total_travel_time
+    total_minutes = total_travel_time // 60 + (total_travel_time % 60)
+    
+    total_hours = total_minutes // 60
+    total_days = total_hours // 24
+    rounded_total_travel_time = np.round(total_days, 2)
 
-        # Print total and mean travel time
-        print(f"Total travel time is: {rounded_total_travel_time} days\nMean travel time is: {rounded_mean_travel_time} minutes")
+    # display mean travel time
+    mean_travel_time = stats.mean_travel_time
+    mean_minutes = mean_travel_time // 60 + (mean_travel_time % 60)
+    rounded_mean_travel_time = np.round(mean_minutes, 2)
 
-    except KeyError:
-        print("The 'Trip Duration' column is not present in the dataset.")
+    # Print total and mean travel time
+    print(f"Total travel time is: {rounded_total_travel_time} days\nMean travel time is: {rounded_mean_travel_time} minutes")
 
-    print("\nThis took %s seconds." % (time.time() - start_time))
     print('-'*40)
     return rounded_total_travel_time.item(), rounded_mean_travel_time.item()
 
-def user_stats(df):
+def user_stats(stats):
     """Displays statistics on bikeshare users."""
     
-    print('\nCalculating User Stats...\n')
-    start_time = time.time()
+    print('\nUser Stats...\n')
 
     # Display counts of user types
-    user_types = df['User Type'].value_counts()
-    print("User types are: ", user_types, "\n")
+    print("User types are: ", stats.user_types, "\n")
     
     # For the Birth Year Information
     print("For the Birth Year Information:")
-    try:
-        # Display earliest, most recent, and most common year of birth
-        earliest_birth_year = int(df['Birth Year'].min())
-        most_recent_birth_year = int(df['Birth Year'].max())
-        most_common_birth_year = int(df['Birth Year'].mode()[0])
-
-        # Print user types and birth year stats
+    if stats.birth_years is not None:
+        # Print earliest, most recent, and most common year of birth
+        earliest_birth_year, most_recent_birth_year, most_common_birth_year = stats.birth_years
         print("Earliest birth year is: ", earliest_birth_year)
         print("Most recent birth year is: ", most_recent_birth_year)
         print("Most common birth year is: ", most_common_birth_year)
-
-    except KeyError:
+    else:
         print("The 'Birth Year' column is not present in the dataset.")
 
     # Gender Distribution
     print("\nGender Distribution:")
-    try:
-        gender_counts = df['Gender'].value_counts()
-        print("Counts of each gender: ", gender_counts)
-    except KeyError:
+    if stats.gender_counts is not None:
+        print("Counts of each gender: ", stats.gender_counts)
+    else:
         print("The 'Gender' column is not present in the dataset.")
 
     # Age Distribution
     print("\nAge Distribution:")
-    try:
-        current_year = pd.to_datetime('now').year
-        df['Age'] = current_year - df['Birth Year']
-        age_distribution = np.round(df['Age'].describe(), 2)
-        print(age_distribution)
-    except KeyError:
+    if stats.age_distribution is not None:
+        print(np.round(stats.age_distribution, 2))
+    else:
         print("The 'Birth Year' column is not present in the dataset.")
     
     # User Type Comparison
     print("\nUser Type Comparison:")
-    try:
-        subscriber_duration = np.round(df[df['User Type'] == 'Subscriber']['Trip Duration'].mean(), 2)
-        customer_duration = np.round(df[df['User Type'] == 'Customer']['Trip Duration'].mean(), 2)
-        print(f"Average trip duration for Subscribers: {subscriber_duration} seconds")
-        print(f"Average trip duration for Customers: {customer_duration} seconds")
-    except KeyError:
-        print("The 'User Type' or 'Trip Duration' columns are not present in the dataset.")
-
-    print("\nThis took %s seconds." % (time.time() - start_time))
+    subscriber_duration = np.round(stats.user_type_durations.get('Subscriber', np.nan), 2)
+    customer_duration = np.round(stats.user_type_durations.get('Customer', np.nan), 2)
+    print(f"Average trip duration for Subscribers: {subscriber_duration} seconds")
+    print(f"Average trip duration for Customers: {customer_duration} seconds")
+
     print('-'*40)
     
     return 
@@ -252,13 +696,17 @@ def user_stats(df):
 def main():
     while True:
         city, month, day = get_filters()
-        df = load_data(city, month, day)
-        display_data(df)
-        time_stats(df)
-        station_stats(df)
-        trip_duration_stats(df)
-        user_stats(df)
-        display_data(df)
+        stats = compute_stats(city, month, day)
+        if stats is None:
+            print("There are no trips in that month and on that day.")
+        else:
+            display_data(city, month, day)
+            time_stats(stats)
+            station_stats(stats)
+            trip_duration_stats(stats)
+            user_stats(stats)
+            display_data(city, month, day)
+        report_dropped_cities()
         
         while True:
             restart = input('\nWould you like to restart? Enter yes or no.\n').lower()
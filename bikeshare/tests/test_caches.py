@@ -0,0 +1,73 @@
+"""Check that each city's cube is saved, loaded and rebuilt when its CSV file changes.
+
+A cube built from an older CSV file, or a damaged cube file, must never be used.
+
+To run these tests from the bikeshare folder, run:
+
+    $ python3 -m unittest --verbose tests.test_caches
+"""
+import os
+import unittest
+import unittest.mock
+
+import bikeshare_2
+from tests.test_stats import BikeshareTestCase, append_trip, quietly, touch
+
+
+class TestCube(BikeshareTestCase):
+    def test_cube_is_saved_and_loaded(self):
+        with unittest.mock.patch('bikeshare_2.build_cube', wraps=bikeshare_2.build_cube) as build:
+            first = quietly(bikeshare_2.compute_stats, 'chicago', 'all', 'all')
+            self.assertTrue(os.path.exists('chicago.cube.npz'))
+            bikeshare_2.CITY_CUBES.clear()
+            bikeshare_2.CITY_FRAMES.clear()
+            with unittest.mock.patch('bikeshare_2.get_city_data') as get_city_data:
+                second = quietly(bikeshare_2.compute_stats, 'chicago', 'all', 'all')
+                get_city_data.assert_not_called()
+            build.assert_called_once()
+        self.assertEqual(first.common_trip, second.common_trip)
+        self.assertEqual(first.user_types.to_dict(), second.user_types.to_dict())
+
+    def test_touched_csv_file_rebuilds_cube(self):
+        quietly(bikeshare_2.compute_stats, 'chicago', 'all', 'all')
+        with unittest.mock.patch('bikeshare_2.build_cube', wraps=bikeshare_2.build_cube) as build:
+            # The cube in memory is as stale as the cube file.
+            touch('chicago.csv')
+            quietly(bikeshare_2.compute_stats, 'chicago', 'all', 'all')
+            touch('chicago.csv')
+            bikeshare_2.CITY_CUBES.clear()
+            quietly(bikeshare_2.compute_stats, 'chicago', 'all', 'all')
+            self.assertEqual(build.call_count, 2)
+
+    def test_changed_csv_file_changes_stats(self):
+        before = quietly(bikeshare_2.compute_stats, 'chicago', 'june', 'friday')
+        append_trip('chicago.csv')
+        after = quietly(bikeshare_2.compute_stats, 'chicago', 'june', 'friday')
+        self.assertEqual(after.user_types.sum(), before.user_types.sum() + 1)
+
+    def test_damaged_cube_file_is_rebuilt(self):
+        quietly(bikeshare_2.compute_stats, 'washington', 'all', 'all')
+        with open('washington.cube.npz', 'rb') as file:
+            saved = file.read()
+        # Truncated, emptied, and with a byte flipped in the middle of an array.
+        flipped = bytearray(saved)
+        flipped[len(saved) // 2] ^= 0xff
+        for damaged in (saved[:100], b'', bytes(flipped)):
+            with self.subTest(size=len(damaged)):
+                bikeshare_2.CITY_CUBES.clear()
+                with open('washington.cube.npz', 'wb') as file:
+                    file.write(damaged)
+                with unittest.mock.patch('bikeshare_2.build_cube', wraps=bikeshare_2.build_cube) as build:
+                    self.assertIsNotNone(quietly(bikeshare_2.compute_stats, 'washington', 'all', 'all'))
+                    build.assert_called_once()
+
+    def test_unexpected_errors_propagate(self):
+        quietly(bikeshare_2.compute_stats, 'washington', 'all', 'all')
+        bikeshare_2.CITY_CUBES.clear()
+        with unittest.mock.patch('numpy.load', side_effect=ZeroDivisionError):
+            with self.assertRaises(ZeroDivisionError):
+                quietly(bikeshare_2.compute_stats, 'washington', 'all', 'all')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Check that the trips kept in memory stay up to date, and bounded.
+
+Trips in memory must be read again whenever their CSV file is touched, and
+dropped, least recently used first, to respect `MAX_CACHED_CITIES` and
+`MAX_CACHED_BYTES`; the dropped cities are only reported by the caller.
+
+To run these tests from the bikeshare folder, run:
+
+    $ python3 -m unittest --verbose tests.test_memory
+"""
+import contextlib
+import io
+import unittest
+import unittest.mock
+
+import bikeshare_2
+from tests.test_stats import BikeshareTestCase, quietly, touch
+
+
+class TestTripsInMemory(BikeshareTestCase):
+    def test_filters_select_from_memory(self):
+        quietly(bikeshare_2.get_city_data, 'chicago')
+        with unittest.mock.patch('bikeshare_2.read_city_cache') as read_cache, \
+                unittest.mock.patch('bikeshare_2.read_city_data') as read_data:
+            df = quietly(bikeshare_2.load_data, 'chicago', 'april', 'all')
+            read_cache.assert_not_called()
+            read_data.assert_not_called()
+        self.assertEqual(set(df['month']), {4})
+
+    def test_least_recently_used_city_is_dropped(self):
+        with unittest.mock.patch('bikeshare_2.MAX_CACHED_CITIES', 1):
+            quietly(bikeshare_2.get_city_data, 'chicago')
+            quietly(bikeshare_2.get_city_data, 'washington')
+            self.assertEqual(list(bikeshare_2.CITY_FRAMES), ['washington'])
+            self.assertEqual(bikeshare_2.DROPPED_CITIES, ['chicago'])
+
+        with unittest.mock.patch('bikeshare_2.MAX_CACHED_CITIES', 2):
+            quietly(bikeshare_2.get_city_data, 'chicago')
+            quietly(bikeshare_2.get_city_data, 'washington')
+            self.assertEqual(list(bikeshare_2.CITY_FRAMES), ['chicago', 'washington'])
+
+    def test_memory_cap(self):
+        # Read each city once, so that both are read from the same place (their caches) from now on.
+        for city in ('chicago', 'washington'):
+            quietly(bikeshare_2.get_city_data, city)
+        bikeshare_2.CITY_FRAMES.clear()
+        size = quietly(bikeshare_2.get_city_data, 'chicago').memory_usage(deep=True).sum()
+        bikeshare_2.CITY_FRAMES.clear()
+        with unittest.mock.patch('bikeshare_2.MAX_CACHED_BYTES', size):
+            quietly(bikeshare_2.get_city_data, 'washington')
+            quietly(bikeshare_2.get_city_data, 'chicago')
+            self.assertEqual(list(bikeshare_2.CITY_FRAMES), ['chicago'])
+        # A city that takes up more than the cap is never kept.
+        with unittest.mock.patch('bikeshare_2.MAX_CACHED_BYTES', size - 1):
+            bikeshare_2.CITY_FRAMES.clear()
+            quietly(bikeshare_2.get_city_data, 'chicago')
+            self.assertEqual(list(bikeshare_2.CITY_FRAMES), [])
+
+    def test_touched_csv_file_drops_trips(self):
+        first = quietly(bikeshare_2.get_city_data, 'washington')
+        self.assertIs(quietly(bikeshare_2.get_city_data, 'washington'), first)
+        touch('washington.csv')
+        self.assertIsNot(quietly(bikeshare_2.get_city_data, 'washington'), first)
+
+
+    def test_dropped_cities_are_reported_by_the_caller(self):
+        with unittest.mock.patch('bikeshare_2.MAX_CACHED_CITIES', 1):
+            quietly(bikeshare_2.get_city_data, 'chicago')
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                bikeshare_2.get_city_data('chicago')
+                bikeshare_2.get_city_data('washington')
+                self.assertNotIn('Dropped', output.getvalue())
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            bikeshare_2.report_dropped_cities()
+            bikeshare_2.report_dropped_cities()
+        self.assertEqual(output.getvalue(), "Dropped Chicago's trips from memory to make room.\n")
+        self.assertEqual(bikeshare_2.DROPPED_CITIES, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
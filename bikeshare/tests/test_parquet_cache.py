@@ -0,0 +1,80 @@
+"""Check that each city's Parquet cache is written, read and rebuilt when its CSV file changes.
+
+Month and day filters must be pushed down into the Parquet reader, and a cache
+built from an older CSV file must never be read.
+
+To run these tests from the bikeshare folder, run:
+
+    $ python3 -m unittest --verbose tests.test_parquet_cache
+"""
+import os
+import unittest
+import unittest.mock
+
+import bikeshare_2
+from tests.test_stats import BikeshareTestCase, append_trip, quietly, touch
+
+
+@unittest.skipIf(bikeshare_2.pq is None, "pyarrow isn't installed")
+class TestParquetCache(BikeshareTestCase):
+    def test_cache_is_written_and_read(self):
+        with unittest.mock.patch('bikeshare_2.read_city_data', wraps=bikeshare_2.read_city_data) as read:
+            first = quietly(bikeshare_2.load_data, 'chicago', 'march', 'all')
+            self.assertTrue(os.path.exists('chicago.parquet'))
+            bikeshare_2.CITY_FRAMES.clear()
+            second = quietly(bikeshare_2.load_data, 'chicago', 'march', 'all')
+            self.assertEqual(read.call_count, 1)
+        self.assertEqual(sorted(first['Start Time']), sorted(second['Start Time']))
+        self.assertEqual(list(first.columns), list(second.columns))
+
+    def test_cached_trips_keep_their_types(self):
+        first = quietly(bikeshare_2.get_city_data, 'chicago')
+        bikeshare_2.CITY_FRAMES.clear()
+        second = quietly(bikeshare_2.read_city_cache, 'chicago')
+        self.assertEqual(second.dtypes.to_dict(), first.dtypes.to_dict())
+        self.assertEqual(list(second['day_of_week'].cat.categories),
+                         list(first['day_of_week'].cat.categories))
+
+    def test_damaged_cache_is_rebuilt(self):
+        quietly(bikeshare_2.get_city_data, 'chicago')
+        bikeshare_2.CITY_FRAMES.clear()
+        with open('chicago.parquet', 'r+b') as file:
+            file.truncate(100)
+        with unittest.mock.patch('bikeshare_2.read_city_data', wraps=bikeshare_2.read_city_data) as read:
+            self.assertEqual(len(quietly(bikeshare_2.load_data, 'chicago', 'march', 'all')),
+                             len(quietly(bikeshare_2.read_city_data, 'chicago').query('month == 3')))
+            self.assertEqual(read.call_count, 2)
+        self.assertIsNotNone(quietly(bikeshare_2.read_city_cache, 'chicago'))
+
+    def test_filters_are_pushed_down(self):
+        quietly(bikeshare_2.get_city_data, 'chicago')
+        bikeshare_2.CITY_FRAMES.clear()
+        with unittest.mock.patch('bikeshare_2.read_city_cache', wraps=bikeshare_2.read_city_cache) as read:
+            df = quietly(bikeshare_2.load_data, 'chicago', 'march', 'friday')
+        read.assert_called_once_with('chicago', [('month', '==', 3), ('day_of_week', '==', 'Friday')])
+        self.assertEqual(set(df['month']), {3})
+        self.assertEqual(set(df['day_of_week'].astype(str)), {'Friday'})
+        # Only the month and day were read, so the city isn't kept in memory.
+        self.assertNotIn('chicago', bikeshare_2.CITY_FRAMES)
+
+    def test_touched_csv_file_rebuilds_cache(self):
+        quietly(bikeshare_2.get_city_data, 'washington')
+        bikeshare_2.CITY_FRAMES.clear()
+        touch('washington.csv')
+        with unittest.mock.patch('bikeshare_2.read_city_data', wraps=bikeshare_2.read_city_data) as read:
+            quietly(bikeshare_2.load_data, 'washington', 'all', 'all')
+            read.assert_called_once()
+            bikeshare_2.CITY_FRAMES.clear()
+            quietly(bikeshare_2.load_data, 'washington', 'all', 'all')
+            read.assert_called_once()
+
+    def test_changed_csv_file_is_read_again(self):
+        before = len(quietly(bikeshare_2.load_data, 'chicago', 'june', 'friday'))
+        append_trip('chicago.csv')
+        self.assertEqual(len(quietly(bikeshare_2.load_data, 'chicago', 'june', 'friday')), before + 1)
+        bikeshare_2.CITY_FRAMES.clear()
+        self.assertEqual(len(quietly(bikeshare_2.load_data, 'chicago', 'june', 'friday')), before + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
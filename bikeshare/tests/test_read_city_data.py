@@ -0,0 +1,70 @@
+"""Check that a city file is read with only the columns the statistics use, in compact types.
+
+Every column that's read must hold the same values as the CSV file read with
+default types, so pruning and narrowing the columns mustn't change a statistic.
+
+To run these tests from the bikeshare folder, run:
+
+    $ python3 -m unittest --verbose tests.test_read_city_data
+"""
+import calendar
+import unittest
+
+import pandas as pd
+
+import bikeshare_2
+from tests.test_stats import BikeshareTestCase, quietly
+
+
+class TestReadCityData(BikeshareTestCase):
+    def read(self, city):
+        return quietly(bikeshare_2.read_city_data, city)
+
+    def test_only_used_columns_are_read(self):
+        self.assertEqual(list(self.read('chicago').columns),
+                         ['Start Time', 'Trip Duration', 'Start Station', 'End Station', 'User Type',
+                          'Gender', 'Birth Year', 'month', 'hour', 'day_of_week'])
+        # Washington has no user columns, which isn't an error.
+        self.assertEqual(list(self.read('washington').columns),
+                         ['Start Time', 'Trip Duration', 'Start Station', 'End Station', 'User Type',
+                          'month', 'hour', 'day_of_week'])
+
+    def test_column_types(self):
+        df = self.read('chicago')
+        for column, dtype in bikeshare_2.COLUMN_DTYPES.items():
+            with self.subTest(column=column):
+                self.assertEqual(df[column].dtype, dtype)
+        self.assertEqual(df['Trip Duration'].dtype, 'int16')
+        self.assertEqual(df['month'].dtype, 'int8')
+        self.assertEqual(df['hour'].dtype, 'int8')
+        self.assertEqual(list(df['day_of_week'].cat.categories), list(calendar.day_name))
+        self.assertTrue(pd.api.types.is_datetime64_dtype(df['Start Time']))
+        # Fractional durations aren't rounded into integers.
+        self.assertEqual(self.read('washington')['Trip Duration'].dtype, 'float64')
+
+    def test_values_match_default_types(self):
+        for city in ('chicago', 'washington'):
+            df = self.read(city)
+            reference = pd.read_csv(bikeshare_2.CITY_DATA[city])
+            start_times = pd.to_datetime(reference['Start Time'])
+            for column in df.columns.intersection(reference.columns).drop('Start Time'):
+                with self.subTest(city=city, column=column):
+                    pd.testing.assert_series_equal(df[column].astype(reference[column].dtype),
+                                                   reference[column])
+            with self.subTest(city=city, column='derived'):
+                self.assertEqual(df['Start Time'].tolist(), start_times.tolist())
+                self.assertEqual(df['month'].tolist(), start_times.dt.month.tolist())
+                self.assertEqual(df['hour'].tolist(), start_times.dt.hour.tolist())
+                self.assertEqual(df['day_of_week'].astype(str).tolist(),
+                                 start_times.dt.day_name().tolist())
+
+    def test_compact_types_take_less_memory(self):
+        for city in ('chicago', 'washington'):
+            with self.subTest(city=city):
+                reference = pd.read_csv(bikeshare_2.CITY_DATA[city])
+                self.assertLess(self.read(city).memory_usage(deep=True).sum(),
+                                reference.memory_usage(deep=True).sum() / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+"""Check that the statistics from a city's cube match those computed by pandas from its trips.
+
+The reference statistics are computed just as the original `*_stats` functions
+computed them: from the CSV file read with default types, with `mode()`,
+`value_counts()` and `describe()`. Where several values tie for the mode, the
+cube must pick the same one as `mode()`.
+
+Each test runs in a temporary directory, holding copies of the fixture city
+files, so that the caches and cubes built from them are thrown away after.
+
+To run these tests from the bikeshare folder, run:
+
+    $ python3 -m unittest --verbose tests.test_stats
+"""
+import calendar
+import contextlib
+import io
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import bikeshare_2
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+CITIES = ('chicago', 'washington')
+
+
+def reference_trips(city, month, day):
+    """Read and filter a city's trips just as the original load_data did."""
+    df = pd.read_csv(bikeshare_2.CITY_DATA[city])
+    df['Start Time'] = pd.to_datetime(df['Start Time'])
+    df['month'] = df['Start Time'].dt.month
+    df['day_of_week'] = df['Start Time'].dt.day_name()
+    df['hour'] = df['Start Time'].dt.hour
+    if month != 'all':
+        df = df[df['month'] == bikeshare_2.MONTHS.index(month) + 1]
+    if day != 'all':
+        df = df[df['day_of_week'] == day.title()]
+    return df
+
+
+def quietly(function, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args)
+
+
+def touch(path):
+    """Move a file's modification time a second forward."""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def append_trip(path):
+    """Add a copy of a city file's first trip, on a new day, to its end."""
+    with open(path) as file:
+        first = file.read().splitlines()[1].split(',')
+    first[1] = '2017-06-30 23:59:00'
+    with open(path, 'a') as file:
+        file.write(','.join(first) + '\n')
+
+
+class BikeshareTestCase(unittest.TestCase):
+    """Run each test in a temporary copy of the fixture city files, with nothing in memory."""
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = pathlib.Path(tmp.name)
+        for city in CITIES:
+            shutil.copy(TESTS_ROOT / bikeshare_2.CITY_DATA[city], self.root)
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        self.addCleanup(os.chdir, cwd)
+        bikeshare_2.CITY_FRAMES.clear()
+        bikeshare_2.CITY_CUBES.clear()
+        bikeshare_2.DROPPED_CITIES.clear()
+        self.addCleanup(bikeshare_2.CITY_FRAMES.clear)
+        self.addCleanup(bikeshare_2.CITY_CUBES.clear)
+        self.addCleanup(bikeshare_2.DROPPED_CITIES.clear)
+
+
+class TestComputeStats(BikeshareTestCase):
+    def assertModeOf(self, value, column):
+        self.assertEqual(value, column.mode()[0])
+
+    def assertCountsEqual(self, counts, reference):
+        self.assertEqual(counts.to_dict(), reference.to_dict())
+        self.assertTrue(counts.is_monotonic_decreasing)
+
+    def assertStatsMatch(self, stats, df):
+        self.assertModeOf(stats.common_month, df['month'])
+        self.assertModeOf(stats.common_day, df['day_of_week'])
+        self.assertModeOf(stats.common_hour, df['hour'])
+
+        self.assertModeOf(stats.common_start_station, df['Start Station'])
+        self.assertModeOf(stats.common_end_station, df['End Station'])
+        self.assertModeOf(stats.common_trip, df['Start Station'] + ' to ' + df['End Station'])
+
+        # Fractional durations may be added up in another order; whole seconds add up exactly.
+        if pd.api.types.is_integer_dtype(df['Trip Duration']):
+            self.assertEqual(stats.total_travel_time, df['Trip Duration'].sum())
+        else:
+            self.assertAlmostEqual(stats.total_travel_time, df['Trip Duration'].sum(), places=6)
+        self.assertAlmostEqual(stats.mean_travel_time, df['Trip Duration'].mean())
+        self.assertCountsEqual(stats.user_types, df['User Type'].value_counts())
+        for user_type in ('Subscriber', 'Customer'):
+            expected = df[df['User Type'] == user_type]['Trip Duration'].mean()
+            np.testing.assert_allclose(stats.user_type_durations.get(user_type, np.nan), expected)
+
+        if 'Gender' in df:
+            self.assertCountsEqual(stats.gender_counts, df['Gender'].value_counts())
+        else:
+            self.assertIsNone(stats.gender_counts)
+        if 'Birth Year' in df:
+            years = df['Birth Year']
+            self.assertEqual(stats.birth_years[:2], (int(years.min()), int(years.max())))
+            self.assertModeOf(stats.birth_years[2], years)
+            ages = (pd.to_datetime('now').year - years).describe()
+            np.testing.assert_allclose(stats.age_distribution[ages.index], ages)
+        else:
+            self.assertIsNone(stats.birth_years)
+            self.assertIsNone(stats.age_distribution)
+
+    def test_stats_match_pandas(self):
+        for city in CITIES:
+            for month in ['all'] + bikeshare_2.MONTHS:
+                for day in ['all'] + [name.lower() for name in calendar.day_name]:
+                    with self.subTest(city=city, month=month, day=day):
+                        stats = quietly(bikeshare_2.compute_stats, city, month, day)
+                        df = reference_trips(city, month, day)
+                        if df.empty:
+                            self.assertIsNone(stats)
+                        else:
+                            self.assertStatsMatch(stats, df)
+
+    def test_whole_second_durations_add_up_to_whole_seconds(self):
+        stats = quietly(bikeshare_2.compute_stats, 'chicago', 'all', 'all')
+        self.assertIsInstance(stats.total_travel_time.item(), int)
+
+    def test_loaded_trips_match_pandas(self):
+        for city, month, day in (('chicago', 'all', 'all'), ('chicago', 'march', 'all'),
+                                 ('washington', 'all', 'sunday'), ('washington', 'june', 'monday')):
+            with self.subTest(city=city, month=month, day=day):
+                df = quietly(bikeshare_2.load_data, city, month, day)
+                reference = reference_trips(city, month, day)
+                self.assertEqual(sorted(df['Start Time']), sorted(reference['Start Time']))
+                self.assertEqual(set(df['day_of_week'].astype(str)), set(reference['day_of_week']))
+
+
+if __name__ == '__main__':
+    unittest.main()
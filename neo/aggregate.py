@@ -0,0 +1,165 @@
+"""Aggregate the close approaches that match a query, without generating them.
+
+Counting the matches of a query, or finding their average distance, shouldn't
+take building and printing one line of output per match. The `summarize`
+method of a database (see `NEODatabase.summarize`) instead folds every match
+into a `Summary` of its group in a single pass:
+
+- the number of approaches in the group;
+- the minimum, maximum and mean of their nominal approach distances; and
+- the minimum, maximum and mean of their relative velocities.
+
+The approaches can be grouped by any of `GROUPINGS`: the year or the month of
+the approach, and whether its NEO is potentially hazardous.
+"""
+import datetime
+import functools
+import math
+
+
+# The ways that close approaches can be grouped, in the order of a group's key.
+GROUPINGS = ('year', 'month', 'hazardous')
+
+
+class Summary:
+    """The number of close approaches in a group, and the range and mean of their attributes."""
+    __slots__ = ('count', 'distance_min', 'distance_max', 'distance_total',
+                 'velocity_min', 'velocity_max', 'velocity_total')
+
+    def __init__(self):
+        """Create a new `Summary` of no close approaches."""
+        self.count = 0
+        self.distance_min = self.velocity_min = math.inf
+        self.distance_max = self.velocity_max = -math.inf
+        self.distance_total = self.velocity_total = 0.0
+
+    @classmethod
+    def from_columns(cls, distances, velocities):
+        """Summarize whole columns of distances and velocities at once.
+
+        :param distances: A sequence of nominal approach distances, in astronomical units.
+        :param velocities: A sequence of relative approach velocities, in kilometers per second.
+        :return: A `Summary` of the approaches described by the columns.
+        """
+        summary = cls()
+        summary.count = len(distances)
+        if summary.count:
+            summary.distance_min, summary.distance_max = min(distances), max(distances)
+            summary.velocity_min, summary.velocity_max = min(velocities), max(velocities)
+            summary.distance_total = sum(distances)
+            summary.velocity_total = sum(velocities)
+        return summary
+
+    def add(self, distance, velocity):
+        """Fold a single close approach into this summary.
+
+        :param distance: The nominal approach distance, in astronomical units.
+        :param velocity: The relative approach velocity, in kilometers per second.
+        """
+        self.count += 1
+        self.distance_total += distance
+        self.velocity_total += velocity
+        if distance < self.distance_min:
+            self.distance_min = distance
+        if distance > self.distance_max:
+            self.distance_max = distance
+        if velocity < self.velocity_min:
+            self.velocity_min = velocity
+        if velocity > self.velocity_max:
+            self.velocity_max = velocity
+
+    @property
+    def distance_mean(self):
+        """Return the mean approach distance, or NaN if there are no approaches."""
+        return self.distance_total / self.count if self.count else math.nan
+
+    @property
+    def velocity_mean(self):
+        """Return the mean approach velocity, or NaN if there are no approaches."""
+        return self.velocity_total / self.count if self.count else math.nan
+
+    def serialize(self):
+        """Produce a dictionary containing the attributes of this summary.
+
+        :return: A dictionary of the count and the distance and velocity statistics.
+        """
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'distance_min': self.distance_min,
+            'distance_max': self.distance_max,
+            'distance_mean': self.distance_mean,
+            'velocity_min': self.velocity_min,
+            'velocity_max': self.velocity_max,
+            'velocity_mean': self.velocity_mean,
+        }
+
+    def __repr__(self):
+        """Return `repr(self)`, a computer-readable string representation of this object."""
+        return f"Summary(count={self.count!r}, distance_mean={self.distance_mean:.4f}, " \
+               f"velocity_mean={self.velocity_mean:.2f})"
+
+
+def summarize(rows, group_by=()):
+    """Fold a stream of close approaches into a `Summary` per group, in one pass.
+
+    :param rows: An iterable of `(time_key, hazardous, distance, velocity)` tuples.
+    :param group_by: A collection of names from `GROUPINGS` to group by.
+    :return: A dictionary mapping each group's key - a tuple of its year, month
+             and/or hazardous flag, in the order of `GROUPINGS` - to its `Summary`,
+             sorted by key. Without any grouping, the only key is the empty tuple.
+    """
+    group_by = check_grouping(group_by)
+    key = _group_key(group_by)
+    summaries = {}
+    if not group_by:
+        summaries[()] = Summary()
+    for time_key, hazardous, distance, velocity in rows:
+        group = key(time_key, hazardous)
+        summary = summaries.get(group)
+        if summary is None:
+            summary = summaries[group] = Summary()
+        summary.add(distance, velocity)
+    return dict(sorted(summaries.items()))
+
+
+def _group_key(group_by):
+    """Make a function from an approach's time key and hazardous flag to the key of its group.
+
+    :param group_by: A tuple of names from `GROUPINGS`, as returned by `check_grouping`.
+    :return: A function of `(time_key, hazardous)` that returns a tuple.
+    """
+    by_year, by_month, by_hazardous = (name in group_by for name in GROUPINGS)
+    if not (by_year or by_month):
+        return (lambda time_key, hazardous: (bool(hazardous),)) if by_hazardous else \
+            (lambda time_key, hazardous: ())
+
+    def key(time_key, hazardous):
+        year, month = _year_month(time_key // (24 * 60))
+        group = (year, month) if by_month else (year,)
+        return group + (bool(hazardous),) if by_hazardous else group
+    return key
+
+
+def check_grouping(group_by):
+    """Validate the names of a grouping, and put them in the order of `GROUPINGS`.
+
+    :param group_by: A collection of names from `GROUPINGS` to group by.
+    :return: A tuple of the names, in order, including 'year' if 'month' is among them.
+    :raises ValueError: If a name isn't one of `GROUPINGS`.
+    """
+    unknown = set(group_by) - set(GROUPINGS)
+    if unknown:
+        raise ValueError(f"Can't group close approaches by {', '.join(sorted(unknown))}.")
+    # A month is only meaningful within its year.
+    if 'month' in group_by:
+        group_by = set(group_by) | {'year'}
+    return tuple(name for name in GROUPINGS if name in group_by)
+
+
+@functools.lru_cache(maxsize=None)
+def _year_month(day):
+    """Find the year and month of a number of whole days since 0001-01-01."""
+    date = datetime.date.fromordinal(day + 1)
+    return date.year, date.month
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""Benchmark the extraction of the NEO data set against simpler implementations.
+
+Each subcommand times one stage of the data pipeline on the real data files (or
+on the files given with `--neofile` and `--cadfile`), and prints the throughput
+of the current implementation next to that of the implementation it replaced:
+
+    $ python3 bench.py load-neos
+    $ python3 bench.py parse-dates
+    $ python3 bench.py memory
+    $ python3 bench.py box-query
+    $ python3 bench.py --neofile tests/test-neos-2020.csv --repeat 10 load-neos
+
+Every timing is the best of `--repeat` runs, to smooth out noise.
+"""
+import argparse
+import csv
+import datetime
+import json
+import pathlib
+import time
+import tracemalloc
+
+from columnar import ColumnarNEODatabase
+from database import NEODatabase, BOX_KINDS
+from extract import load_neos, load_approaches, iter_approaches
+from helpers import cd_to_datetime, cds_to_minutes
+from models import NearEarthObject
+
+
+# Paths to the root of the project and the `data` subfolder.
+PROJECT_ROOT = pathlib.Path(__file__).parent.resolve()
+DATA_ROOT = PROJECT_ROOT / 'data'
+
+
+def best_time(function, *args, repeat=3):
+    """Call a function several times, and report its fastest run.
+
+    :param function: The function to time.
+    :param args: The positional arguments to call `function` with.
+    :param repeat: How many times to call `function`.
+    :return: A tuple of the fastest time in seconds, and the result of the last call.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def report(label, seconds, rows):
+    """Print the throughput of one implementation."""
+    print(f"{label:>32}: {rows / seconds:>12,.0f} rows/s  ({seconds * 1000:.1f} ms for {rows:,} rows)")
+
+
+def load_neos_all_columns(neo_csv_path):
+    """Load NEOs the way `load_neos` used to, splitting every column of every row."""
+    data = []
+    with open(neo_csv_path, 'r') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        designation_index = header.index('pdes')
+        name_index = header.index('name')
+        pha_index = header.index('pha')
+        diameter_index = header.index('diameter')
+        for row in reader:
+            data.append(NearEarthObject(designation=row[designation_index],
+                                        name=row[name_index],
+                                        diameter=row[diameter_index],
+                                        hazardous=row[pha_index] == 'Y'))
+    return data
+
+
+def bench_load_neos(args):
+    """Compare loading NEOs with every column parsed to loading only the needed ones."""
+    for label, function in (('csv.reader, all columns', load_neos_all_columns),
+                            ('load_neos, projected columns', load_neos)):
+        seconds, neos = best_time(function, args.neofile, repeat=args.repeat)
+        report(label, seconds, len(neos))
+
+
+def bench_parse_dates(args):
+    """Compare parsing the close approach dates with `strptime` to the fixed-layout parsers."""
+    with open(args.cadfile) as file:
+        document = json.load(file)
+    cd_index = document['fields'].index('cd')
+    calendar_dates = [row[cd_index] for row in document['data']]
+
+    def strptime_all(cds):
+        return [datetime.datetime.strptime(cd, "%Y-%b-%d %H:%M") for cd in cds]
+
+    def cd_to_datetime_all(cds):
+        return [cd_to_datetime(cd) for cd in cds]
+
+    for label, function in (('strptime', strptime_all),
+                            ('cd_to_datetime', cd_to_datetime_all),
+                            ('cds_to_minutes', cds_to_minutes)):
+        seconds, _ = best_time(function, calendar_dates, repeat=args.repeat)
+        report(label, seconds, len(calendar_dates))
+
+
+def retained_memory(function, *args):
+    """Call a function, and measure how much memory its result holds on to.
+
+    :param function: The function to measure.
+    :param args: The positional arguments to call `function` with.
+    :return: A tuple of the number of bytes still allocated after the call, and its result.
+    """
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        retained, _peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return retained, result
+
+
+class PlainCloseApproach:
+    """A close approach as `models.CloseApproach` used to be: decoded eagerly, with a `__dict__`."""
+    def __init__(self, time, distance, velocity, designation=None, neo=None):
+        self._designation = designation
+        self.time = cd_to_datetime(time)
+        self.distance = float(distance)
+        self.velocity = float(velocity)
+        self.neo = neo
+
+
+def load_plain_approaches(cad_json_path):
+    """Load close approaches the way `load_approaches` used to, into `PlainCloseApproach`es."""
+    with open(cad_json_path) as file:
+        document = json.load(file)
+    fields = document['fields']
+    des_index, cd_index = fields.index('des'), fields.index('cd')
+    dist_index, v_rel_index = fields.index('dist'), fields.index('v_rel')
+    return [PlainCloseApproach(time=row[cd_index], distance=row[dist_index],
+                               velocity=row[v_rel_index], designation=row[des_index])
+            for row in document['data']]
+
+
+def load_indexed_approaches(cad_json_path):
+    """Load close approaches, and then decode their time keys, as `NEODatabase` does."""
+    approaches = load_approaches(cad_json_path)
+    for approach in approaches:
+        approach.time_key
+    return approaches
+
+
+def load_decoded_approaches(cad_json_path):
+    """Load close approaches, and then decode every one of their lazy attributes."""
+    approaches = load_approaches(cad_json_path)
+    for approach in approaches:
+        approach.time, approach.time_key, approach.distance, approach.velocity
+    return approaches
+
+
+def bench_memory(args):
+    """Compare the memory held per close approach by each way of holding them."""
+    neos = load_neos(args.neofile)
+
+    def load_objects(cad_json_path):
+        return NEODatabase(neos, load_approaches(cad_json_path))
+
+    def load_columnar(cad_json_path):
+        return ColumnarNEODatabase(neos, iter_approaches(cad_json_path))
+
+    # The engines also hold their indexes, their statistics and a link from each
+    # NEO to its approaches, so compare them with each other rather than with the
+    # bare lists of approaches.
+    for label, function in (('dict-based, eagerly decoded', load_plain_approaches),
+                            ('slotted, undecoded', load_approaches),
+                            ('slotted, time keys decoded', load_indexed_approaches),
+                            ('slotted, fully decoded', load_decoded_approaches),
+                            ('object engine', load_objects),
+                            ('columnar engine', load_columnar)):
+        retained, result = retained_memory(function, args.cadfile)
+        count = len(result.columns) if isinstance(result, ColumnarNEODatabase) else \
+            len(result.approaches) if isinstance(result, NEODatabase) else len(result)
+        print(f"{label:>32}: {retained / count:>8,.1f} bytes/approach  "
+              f"({retained / 2 ** 20:,.1f} MiB for {count:,} approaches)")
+        del result
+
+
+def bench_box_query(args):
+    """Compare answering date, distance and velocity boxes by linear scan and by range index.
+
+    Each box spans the middle of every attribute's distribution, sized so that
+    it holds roughly the given fraction of the close approaches.
+    """
+    database = NEODatabase(load_neos(args.neofile), load_approaches(args.cadfile))
+    approaches = database.approaches
+    seconds, _ = best_time(database._range_index, repeat=1)
+    print(f"{'range index build':>32}: {seconds * 1000:.1f} ms for {len(approaches):,} approaches")
+
+    sorted_keys = {kind: sorted(map(kind.key, approaches)) for kind in BOX_KINDS}
+    for fraction in (0.0001, 0.001, 0.01, 0.1, 0.5):
+        # Independent attributes each keeping the cube root of the fraction keep the fraction.
+        side = fraction ** (1 / len(BOX_KINDS))
+        bounds = {}
+        for kind, keys in sorted_keys.items():
+            lo = int(len(keys) * (1 - side) / 2)
+            hi = min(int(len(keys) * (1 + side) / 2), len(keys) - 1)
+            bounds[kind] = (keys[lo], keys[hi])
+        checks = [(kind.key, low, high) for kind, (low, high) in bounds.items()]
+
+        def linear_scan():
+            return [approach for approach in approaches
+                    if all(low <= key(approach) <= high for key, low, high in checks)]
+
+        def range_index():
+            return database._range_index().search(bounds)
+
+        print(f"box for ~{fraction:.2%} of approaches:")
+        for label, function in (('linear scan', linear_scan), ('range index', range_index)):
+            seconds, found = best_time(function, repeat=args.repeat)
+            print(f"{label:>32}: {seconds * 1000:>9.2f} ms ({len(found):,} matches)")
+
+
+def make_parser():
+    """Create an ArgumentParser for this script."""
+    parser = argparse.ArgumentParser(description="Benchmark the NEO data pipeline.")
+    parser.add_argument('--neofile', default=(DATA_ROOT / 'neos.csv'), type=pathlib.Path,
+                        help="Path to CSV file of near-Earth objects.")
+    parser.add_argument('--cadfile', default=(DATA_ROOT / 'cad.json'), type=pathlib.Path,
+                        help="Path to JSON file of close approach data.")
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help="How many times to run each implementation.")
+    subparsers = parser.add_subparsers(dest='cmd', required=True)
+
+    load = subparsers.add_parser('load-neos', description=bench_load_neos.__doc__)
+    load.set_defaults(bench=bench_load_neos)
+
+    dates = subparsers.add_parser('parse-dates', description=bench_parse_dates.__doc__)
+    dates.set_defaults(bench=bench_parse_dates)
+
+    memory = subparsers.add_parser('memory', description=bench_memory.__doc__)
+    memory.set_defaults(bench=bench_memory)
+
+    box = subparsers.add_parser('box-query', description=bench_box_query.__doc__)
+    box.set_defaults(bench=bench_box_query)
+    return parser
+
+
+def main():
+    """Run the chosen benchmark."""
+    args = make_parser().parse_args()
+    args.bench(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,528 @@
+"""A columnar engine for the database of near-Earth objects and their close approaches.
+
+The `ColumnarNEODatabase` is an alternative to `NEODatabase` that doesn't keep
+one `CloseApproach` object per close approach. Instead, it stores the approach
+times, distances and velocities - along with the diameter and hazardous flag of
+each approach's NEO - in contiguous typed arrays, held by an `ApproachColumns`.
+
+To query the database, each filter compiles itself into a mask over those
+columns (see `AttributeFilter.mask`), the masks are intersected, and only the
+surviving rows are materialized as `CloseApproach` objects.
+
+The rows of each NEO's close approaches are found through two flat arrays
+rather than a collection per NEO: `_neo_rows` lists every row grouped by NEO,
+and `_neo_offsets` holds where each NEO's group starts (and the previous one
+ends) in it.
+
+Regrouping every row whenever an approach is added, or moving every later row
+whenever one is removed, would take time in proportion to the whole database.
+Instead, added rows are appended to the columns and listed by NEO on the side,
+and removed rows are only marked as such, in a mask of the live rows. Once
+enough rows have been added, they are grouped with the rest; once enough have
+been removed, the columns are compacted. Either way, that's after at least as
+many added or removed rows as the work takes, so each row costs a bounded
+amount of time on average.
+
+The main module builds a `ColumnarNEODatabase` instead of an `NEODatabase` when
+it is run with `--engine columnar`.
+"""
+import array
+import collections.abc
+from itertools import compress, islice
+
+from aggregate import Summary, check_grouping, summarize
+from database import NEODatabase, ORDER_KEYS
+from filters import top
+from models import CloseApproach, NearEarthObject
+from planner import gather_statistics, plan_query, update_statistics
+
+
+# The column to sort by for each of the `ORDER_KEYS` that query results can be ordered by.
+ORDER_COLUMNS = {
+    'time': 'times',
+    'distance': 'distances',
+    'velocity': 'velocities',
+    'diameter': 'diameters',
+}
+
+
+class ApproachColumns:
+    """The attributes of a collection of close approaches, stored column by column.
+
+    Row `i` of every column describes the same close approach: `times` holds its
+    time in minutes since 0001-01-01 (see `helpers.datetime_to_minutes`),
+    `distances` and `velocities` hold its nominal approach distance and relative
+    velocity, `neo_indices` holds the position of its NEO in the database's
+    `neos`, and `diameters` and `hazardous` hold that NEO's diameter and flag.
+    """
+    def __init__(self):
+        """Create a new, empty `ApproachColumns`."""
+        self.times = array.array('q')
+        self.distances = array.array('d')
+        self.velocities = array.array('d')
+        self.neo_indices = array.array('l')
+        self.diameters = array.array('d')
+        self.hazardous = array.array('b')
+
+    def append(self, time_key, distance, velocity, neo_index, neo):
+        """Add a row for a single close approach to the end of the columns.
+
+        :param time_key: The approach time, in minutes since 0001-01-01.
+        :param distance: The nominal approach distance, in astronomical units.
+        :param velocity: The relative approach velocity, in kilometers per second.
+        :param neo_index: The position of the approaching NEO in the database's `neos`.
+        :param neo: The approaching `NearEarthObject`.
+        """
+        self.times.append(time_key)
+        self.distances.append(distance)
+        self.velocities.append(velocity)
+        self.neo_indices.append(neo_index)
+        self.diameters.append(neo.diameter)
+        self.hazardous.append(neo.hazardous)
+
+    def __len__(self):
+        """Return `len(self)`, the number of rows in the columns."""
+        return len(self.times)
+
+
+def neos_to_columns(neos):
+    """Flatten a sequence of NEOs into a dictionary of columns of their attributes.
+
+    The columns are plain lists, which pickle far more compactly and quickly
+    than the `NearEarthObject`s themselves.
+
+    :param neos: A sequence of `NearEarthObject`s.
+    :return: A dictionary of the designations, names, diameters and hazardous flags of the NEOs.
+    """
+    return {
+        'designations': [neo.designation for neo in neos],
+        'names': [neo.name for neo in neos],
+        'diameters': [neo.diameter for neo in neos],
+        'hazardous': [neo.hazardous for neo in neos],
+    }
+
+
+def neos_from_columns(columns):
+    """Rebuild the NEOs flattened by `neos_to_columns`.
+
+    :param columns: A dictionary of columns, as produced by `neos_to_columns`.
+    :return: A list of (unlinked) `NearEarthObject`s.
+    """
+    return [
+        NearEarthObject(designation=designation, name=name, diameter=diameter,
+                        hazardous=bool(hazardous))
+        for designation, name, diameter, hazardous in zip(
+            columns['designations'], columns['names'], columns['diameters'], columns['hazardous'])
+    ]
+
+
+class ColumnarNEODatabase(NEODatabase):
+    """A database of near-Earth objects and their close approaches, stored by column.
+
+    A `ColumnarNEODatabase` answers the same requests as an `NEODatabase`, but
+    keeps its close approaches in an `ApproachColumns` and builds `CloseApproach`
+    objects only for the rows that it generates.
+
+    Those objects aren't kept: every query, and every access to an NEO's
+    `.approaches`, builds new ones. Two accesses to the same close approach
+    therefore give two distinct (and, as `CloseApproach` compares by identity,
+    unequal) objects, so compare them by their attributes instead.
+    """
+    def __init__(self, neos, approaches):
+        """Create a new `ColumnarNEODatabase`.
+
+        The close approaches are copied into columns and then dropped, so
+        `approaches` may just as well be a one-shot stream. Every NEO's
+        `.approaches` attribute becomes a sequence that materializes that NEO's
+        close approaches on demand.
+
+        :param neos: A collection of `NearEarthObject`s.
+        :param approaches: An iterable of unlinked `CloseApproach`es.
+        """
+        self._index_neos(neos)
+        columns = ApproachColumns()
+        for approach in approaches:
+            index = self._neo_indices[approach._designation]
+            columns.append(approach.time_key, approach.distance, approach.velocity,
+                           index, self.neos[index])
+        self._link(columns)
+
+    @classmethod
+    def from_columns(cls, neos, columns, indexes=None):
+        """Create a new `ColumnarNEODatabase` directly from close approach columns.
+
+        :param neos: A sequence of `NearEarthObject`s, in the order of `columns.neo_indices`.
+        :param columns: An `ApproachColumns` of the close approaches of those NEOs.
+        :param indexes: The indexes and statistics of a database of the same NEOs and
+                        columns, from `export_indexes`, to restore rather than rebuild.
+        :return: A `ColumnarNEODatabase` holding the NEOs and the columns.
+        """
+        database = cls.__new__(cls)
+        database._index_neos(neos)
+        database._link(columns, indexes)
+        return database
+
+    def export_indexes(self):
+        """Return the grouping of the rows by NEO and the statistics, to restore with `from_columns`.
+
+        They're only valid for the columns as they are, so no row may have been
+        removed since they were linked (see `remove_approaches`).
+
+        :return: A dictionary of the statistics and the rows grouped by NEO.
+        """
+        if self._added:
+            self._index_rows()
+        return {'statistics': self.statistics, 'neo_rows': self._neo_rows,
+                'neo_offsets': self._neo_offsets}
+
+    def _index_neos(self, neos):
+        """Hold a collection of NEOs and index them by designation, by name and by position."""
+        self.neos = list(neos)
+        self.designation_to_neos = {}
+        self.name_to_neo = {}
+        self._neo_indices = {}
+        for index, neo in enumerate(self.neos):
+            self.designation_to_neos[neo.designation] = neo
+            self._neo_indices[neo.designation] = index
+            if neo.name:
+                self.name_to_neo[neo.name] = neo
+
+    def _link(self, columns, indexes=None):
+        """Hold close approach columns and point each NEO at its rows of them.
+
+        :param columns: An `ApproachColumns` of the close approaches of the NEOs.
+        :param indexes: The indexes and statistics to restore (see `from_columns`), or None to build them.
+        """
+        self.columns = columns
+        # A 0/1 byte per row, 0 where the row has been removed - or None if none has.
+        self._live = None
+        self._removed = 0
+        if indexes is None:
+            self._index_rows()
+        else:
+            self._neo_rows, self._neo_offsets = indexes['neo_rows'], indexes['neo_offsets']
+            self._added_rows = {}
+            self._added = 0
+        for neo in self.neos:
+            # Share the boxed positions with `_neo_indices`, rather than boxing them again.
+            neo.approaches = _NEOApproaches(self, self._neo_indices[neo.designation])
+        self.statistics = gather_statistics(self.approaches) if indexes is None \
+            else indexes['statistics']
+
+    def _index_rows(self):
+        """Group the rows of the columns by NEO, into `_neo_rows` and `_neo_offsets`.
+
+        The rows are counting-sorted by their NEO's position, so each NEO's rows
+        stay in the order of the columns. Removed rows are left out.
+        """
+        indices = self.columns.neo_indices
+        if self._live is not None:
+            indices = compress(indices, self._live)
+        offsets = array.array('l', [0]) * (len(self.neos) + 1)
+        for index in indices:
+            offsets[index + 1] += 1
+        for index in range(len(self.neos)):
+            offsets[index + 1] += offsets[index]
+        ends = offsets[:-1]
+        rows = array.array('l', [0]) * offsets[-1]
+        for row, index in enumerate(self.columns.neo_indices):
+            if self._live is None or self._live[row]:
+                rows[ends[index]] = row
+                ends[index] += 1
+        self._neo_offsets = offsets
+        self._neo_rows = rows
+        # The rows added since, by NEO position, and how many there are.
+        self._added_rows = {}
+        self._added = 0
+
+    def _rows_of(self, neo_index):
+        """Return the live rows of an NEO's close approaches, by the NEO's position."""
+        offsets = self._neo_offsets
+        rows = self._neo_rows[offsets[neo_index]:offsets[neo_index + 1]]
+        if neo_index in self._added_rows:
+            rows += self._added_rows[neo_index]
+        if self._live is not None:
+            rows = array.array('l', (row for row in rows if self._live[row]))
+        return rows
+
+    def add_neos(self, neos):
+        """Add near-Earth objects to the database (see `NEODatabase.add_neos`).
+
+        :param neos: A collection of `NearEarthObject`s, not yet in any database.
+        :raises ValueError: If an NEO's designation is already taken.
+        """
+        neos = list(neos)
+        self._check_new_neos(neos)
+        for neo in neos:
+            self._neo_indices[neo.designation] = len(self.neos)
+            self.neos.append(neo)
+            self.designation_to_neos[neo.designation] = neo
+            if neo.name:
+                self.name_to_neo[neo.name] = neo
+            neo.approaches = _NEOApproaches(self, len(self.neos) - 1)
+            self._neo_offsets.append(self._neo_offsets[-1])
+
+    def add_approaches(self, approaches):
+        """Add close approaches, of NEOs already in the database, to the database.
+
+        Each approach becomes a new row at the end of the columns, and is listed
+        among its NEO's added rows, in time proportional to the number of new
+        approaches. The added rows are grouped with the rest once there are a
+        quarter as many of them.
+
+        :param approaches: A collection of unlinked `CloseApproach`es.
+        :raises ValueError: If an approach's NEO isn't in the database.
+        """
+        approaches = list(approaches)
+        neos = [self._neo_of(approach) for approach in approaches]
+        columns = self.columns
+        start = len(columns)
+        for approach, neo in zip(approaches, neos):
+            index = self._neo_indices[neo.designation]
+            self._added_rows.setdefault(index, array.array('l')).append(len(columns))
+            columns.append(approach.time_key, approach.distance, approach.velocity, index, neo)
+        if self._live is not None:
+            self._live.extend(b'\x01' * len(approaches))
+        self._added += len(approaches)
+        update_statistics(self.statistics, added=_ApproachRows(self, range(start, len(columns))))
+        if self._added > len(self._neo_rows) // 4:
+            self._index_rows()
+
+    def remove_approaches(self, approaches):
+        """Remove close approaches from the database (see `NEODatabase.remove_approaches`).
+
+        The rows to remove are found through their NEOs and marked as removed,
+        in time proportional to the number of removed approaches. Once half of
+        the rows have been removed, the columns are rewritten - and relinked -
+        without them.
+
+        :param approaches: A collection of `CloseApproach`es.
+        :raises ValueError: If an approach isn't in the database.
+        """
+        columns = self.columns
+        removed = array.array('l')
+        for designation, time_key in set(map(self._identify, approaches)):
+            neo = self.designation_to_neos.get(designation)
+            rows = [row for row in (neo.approaches.rows if neo is not None else ())
+                    if columns.times[row] == time_key]
+            if not rows:
+                raise ValueError(f"No close approach of {designation!r} at {time_key} minutes "
+                                 f"is in the database.")
+            removed.extend(rows)
+
+        update_statistics(self.statistics, removed=_ApproachRows(self, removed))
+        if self._live is None:
+            self._live = bytearray(b'\x01') * len(columns)
+        for row in removed:
+            self._live[row] = 0
+        self._removed += len(removed)
+        if self._removed > len(columns) // 2:
+            compacted = ApproachColumns()
+            for name, column in vars(columns).items():
+                setattr(compacted, name, array.array(column.typecode, compress(column, self._live)))
+            self._link(compacted)
+
+    @property
+    def approaches(self):
+        """Return a sequence of every close approach in the database, in internal order."""
+        rows = range(len(self.columns))
+        if self._live is not None:
+            rows = array.array('l', compress(rows, self._live))
+        return _ApproachRows(self, rows)
+
+    def query(self, filters=(), order_by=None, descending=False, limit=None):
+        """Query close approaches to generate those that match a collection of filters.
+
+        Each filter is evaluated over whole columns at once; `CloseApproach`
+        objects are only built for the rows that match all of them. They are
+        generated in internal order, or sorted as for `NEODatabase.query` - in
+        which case the matching rows are sorted by their column, and only the
+        rows that make the cut are materialized.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param order_by: The name of an attribute in `ORDER_KEYS` to sort by, or None.
+        :param descending: Whether to sort by decreasing rather than increasing attribute.
+        :param limit: The maximum number of approaches to generate, or 0 or None for all of them.
+        :return: A stream of matching `CloseApproach` objects.
+        """
+        if order_by is not None and order_by not in ORDER_KEYS:
+            raise ValueError(f"Can't order close approaches by {order_by!r}.")
+        plan = self.plan(filters)
+        if plan.empty:
+            return iter(())
+        rows = range(len(self.columns))
+        mask = self._mask(plan)
+        if mask is not None:
+            rows = compress(rows, mask)
+        if order_by is not None:
+            column = getattr(self.columns, ORDER_COLUMNS[order_by])
+            rows = top(rows, column.__getitem__, descending, limit)
+        return map(self._materialize, islice(rows, limit or None))
+
+    def match_rows(self, filters=(), within=None):
+        """Find the rows of the close approaches that match a collection of filters.
+
+        Unlike `query`, this doesn't build any `CloseApproach` objects; see
+        `approaches_at` to build them later.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param within: A time-sorted sequence of rows to look among, or None to look among every row.
+        :return: An `array` of the matching rows, sorted by approach time.
+        """
+        plan = self.plan(filters)
+        if plan.empty:
+            return array.array('l')
+        mask = self._mask(plan)
+        if within is not None:
+            return array.array('l', within if mask is None else (row for row in within if mask[row]))
+        rows = range(len(self.columns))
+        if mask is not None:
+            rows = compress(rows, mask)
+        return array.array('l', sorted(rows, key=self.columns.times.__getitem__))
+
+    def approaches_at(self, rows):
+        """Return a sequence of the close approaches at some rows, materialized on access.
+
+        :param rows: A sequence of rows, such as from `match_rows`.
+        :return: A sequence of linked `CloseApproach` objects, built anew on each access.
+        """
+        return _ApproachRows(self, rows)
+
+    def _mask(self, plan):
+        """Intersect the masks of a plan's filters, and of the live rows.
+
+        :param plan: A `planner.QueryPlan`.
+        :return: A 0/1 mask over the rows, or None if every row matches.
+        """
+        masks = [f.mask(self.columns) for f in plan.filters]
+        if self._live is not None:
+            masks.append(self._live)
+        return _intersect_masks(masks) if masks else None
+
+    def summarize(self, filters=(), group_by=()):
+        """Aggregate the close approaches that match a collection of filters.
+
+        Without grouping, or grouped only by the hazardous flag, the matching
+        rows of the distance and velocity columns are summarized whole, without
+        a Python step per row; otherwise each row is folded into its group.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param group_by: A collection of names from `aggregate.GROUPINGS` to group by.
+        :return: A dictionary mapping each group's key to its `aggregate.Summary`, sorted by key.
+        """
+        group_by = check_grouping(group_by)
+        columns = self.columns
+        plan = self.plan(filters)
+        if plan.empty:
+            return summarize((), group_by)
+        mask = self._mask(plan)
+        if mask is None:
+            mask = b'\x01' * len(columns)
+
+        if group_by in ((), ('hazardous',)):
+            groups = {(): mask}
+            if group_by:
+                hazardous = _intersect_masks([mask, columns.hazardous.tobytes()])
+                # Every matching row that isn't hazardous: the bits set in one mask but not the other.
+                not_hazardous = (int.from_bytes(mask, 'little') ^ int.from_bytes(hazardous, 'little'))
+                groups = {(False,): not_hazardous.to_bytes(len(mask), 'little'), (True,): hazardous}
+            summaries = {}
+            for key, rows in groups.items():
+                summary = Summary.from_columns(array.array('d', compress(columns.distances, rows)),
+                                               array.array('d', compress(columns.velocities, rows)))
+                if summary.count or not group_by:
+                    summaries[key] = summary
+            return summaries
+
+        rows = compress(zip(columns.times, columns.hazardous, columns.distances, columns.velocities),
+                        mask)
+        return summarize(rows, group_by)
+
+    def plan(self, filters=()):
+        """Choose how `query` evaluates a collection of filters.
+
+        There is no time index to take candidates from, so every filter -
+        merged with the others on its attribute - is evaluated over its column.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A `planner.QueryPlan`, which prints as a summary of its choices.
+        """
+        return plan_query(filters, self.statistics, len(self.columns) - self._removed)
+
+    def _materialize(self, row):
+        """Build a linked `CloseApproach` from one row of the columns.
+
+        :param row: The position of the close approach in the columns.
+        :return: A `CloseApproach` referencing its `NearEarthObject`.
+        """
+        columns = self.columns
+        neo = self.neos[columns.neo_indices[row]]
+        return CloseApproach(time=columns.times[row],
+                             distance=columns.distances[row],
+                             velocity=columns.velocities[row],
+                             designation=neo.designation,
+                             neo=neo)
+
+
+class _ApproachRows(collections.abc.Sequence):
+    """A sequence of close approaches, materialized from database rows on each access."""
+    __slots__ = ('database', 'rows')
+
+    def __init__(self, database, rows):
+        self.database = database
+        self.rows = rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return _ApproachRows(self.database, self.rows[index])
+        return self.database._materialize(self.rows[index])
+
+    def __iter__(self):
+        return map(self.database._materialize, self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class _NEOApproaches(collections.abc.Sequence):
+    """The close approaches of one NEO, materialized from its rows on each access.
+
+    There's one of these per NEO, so it holds no more than the NEO's position;
+    its rows are looked up in the database's `_neo_rows` and `_neo_offsets`.
+    """
+    __slots__ = ('database', 'neo_index')
+
+    def __init__(self, database, neo_index):
+        self.database = database
+        self.neo_index = neo_index
+
+    @property
+    def rows(self):
+        """Return the rows of the NEO's close approaches in the database's columns."""
+        return self.database._rows_of(self.neo_index)
+
+    def __getitem__(self, index):
+        return _ApproachRows(self.database, self.rows)[index]
+
+    def __iter__(self):
+        return iter(_ApproachRows(self.database, self.rows))
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def _intersect_masks(masks):
+    """Combine several equal-length 0/1 `bytes` masks with a logical AND.
+
+    Each mask is reinterpreted as one big integer, so the intersection runs as a
+    handful of bitwise operations instead of a loop over the rows.
+
+    :param masks: A non-empty collection of `bytes` masks.
+    :return: A `bytes` mask holding 1 exactly where every mask holds 1.
+    """
+    masks = iter(masks)
+    first = next(masks)
+    combined = int.from_bytes(first, 'little')
+    for mask in masks:
+        combined &= int.from_bytes(mask, 'little')
+    return combined.to_bytes(len(first), 'little')
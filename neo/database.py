@@ -9,8 +9,36 @@ Under normal circumstances, the main module creates one NEODatabase from the
 data on NEOs and close approaches extracted by `extract.load_neos` and
 `extract.load_approaches`.
 
+A long-lived process can keep a database up to date with `add_neos`,
+`add_approaches` and `remove_approaches`, which maintain its links, indexes and
+statistics batch by batch, in time proportional to the batch rather than to
+the whole database.
+
 You'll edit this file in Tasks 2 and 3.
 """
+import array
+import itertools
+import math
+from operator import attrgetter
+
+from aggregate import check_grouping, summarize
+from filters import DateFilter, DistanceFilter, VelocityFilter, DiameterFilter, HazardousFilter, top
+from models import CloseApproach
+from planner import gather_statistics, plan_query, update_statistics
+from rangeindex import GridIndex
+from sortedindex import SortedIndex
+
+
+# The filter classes spanned by the range index, which queries can bound all at once.
+BOX_KINDS = (DateFilter, DistanceFilter, VelocityFilter)
+
+# The attributes that query results can be ordered by, and how to fetch each from an approach.
+ORDER_KEYS = {
+    'time': attrgetter('time_key'),
+    'distance': attrgetter('distance'),
+    'velocity': attrgetter('velocity'),
+    'diameter': attrgetter('neo.diameter'),
+}
 
 
 class NEODatabase:
@@ -21,7 +49,7 @@ class NEODatabase:
     help fetch NEOs by primary designation or by name and to help speed up
     querying for close approaches that match criteria.
     """
-    def __init__(self, neos, approaches): # near earth object class and close approach class
+    def __init__(self, neos, approaches, indexes=None): # near earth object class and close approach class
         """Create a new `NEODatabase`.
 
         As a precondition, this constructor assumes that the collections of NEOs
@@ -38,10 +66,12 @@ class NEODatabase:
 
         :param neos: A collection of `NearEarthObject`s.
         :param approaches: A collection of `CloseApproach`es.
+        :param indexes: The indexes and statistics of a database of the same NEOs
+                        and approaches, from `export_indexes`, to restore rather
+                        than rebuild - in which case the approaches must be sorted
+                        by time.
         """
         self.neos = neos
-        self.approaches = approaches
-
 
         # What additional auxiliary data structures will be useful?
         self.designation_to_approaches = {}
@@ -49,7 +79,7 @@ class NEODatabase:
         self.name_to_neo = {}
 
         # Add all of the approaches to the dictionary
-        for approach in self.approaches:
+        for approach in approaches:
             if approach._designation in self.designation_to_approaches:
                 self.designation_to_approaches[approach._designation].append(approach)
             else:
@@ -57,17 +87,62 @@ class NEODatabase:
         
         # Link NEOs with their corresponding close approaches
         for neo in self.neos:
-            neo.approaches = self.designation_to_approaches.get(neo.designation, None)
+            neo.approaches = self.designation_to_approaches.get(neo.designation, [])
             self.designation_to_neos[neo.designation] = neo
             if neo.name:
                 self.name_to_neo[neo.name] = neo
         
         # Assign the NEO object to the CloseApproach object
-        for approach in self.approaches:
+        for approach in approaches:
             approach.neo = self.designation_to_neos[approach._designation]
-        
 
-        # Link together the NEOs and their close approaches.
+        # Index the approaches by time, so date-bounded queries can bisect
+        # straight to the matching slice instead of scanning every approach.
+        self._time_index = SortedIndex(approaches, attrgetter('time_key'),
+                                       presorted=indexes is not None)
+        if indexes is None:
+            self.statistics = gather_statistics(self._time_index)
+            self._index_neo_attributes()
+        else:
+            self.statistics = indexes['statistics']
+            self._index_neo_attributes(indexes['diameters'], indexes['hazardous'])
+        self._grid = None
+
+    @property
+    def approaches(self):
+        """Return a sequence of every close approach in the database, sorted by time."""
+        return self._time_index
+
+    @classmethod
+    def from_columns(cls, neos, columns, indexes=None):
+        """Create a new database from NEOs and the columns of their close approaches.
+
+        This is the inverse of what a `ColumnarNEODatabase` does with its close
+        approaches: one `CloseApproach` is built per row of the columns.
+
+        :param neos: A sequence of `NearEarthObject`s, in the order of `columns.neo_indices`.
+        :param columns: A `columnar.ApproachColumns` of the close approaches of those NEOs.
+        :param indexes: The indexes and statistics to restore (see `__init__`), or None to build them.
+        :return: A database holding the NEOs and their linked close approaches.
+        """
+        approaches = [
+            CloseApproach(time=minutes, distance=distance,
+                          velocity=velocity, designation=neos[index].designation)
+            for minutes, distance, velocity, index in zip(
+                columns.times, columns.distances, columns.velocities, columns.neo_indices)
+        ]
+        return cls(neos, approaches, indexes)
+
+    def export_indexes(self):
+        """Return the indexes and statistics of the database, to restore with `from_columns`.
+
+        They hold no NEOs or close approaches, only their positions and keys,
+        so they can be saved next to the columns of the approaches in time order.
+
+        :return: A dictionary of the statistics and the NEO indexes.
+        """
+        return {'statistics': self.statistics, 'diameters': array.array('l', self._diameter_index),
+                'hazardous': bytes(self._hazardous_bitmap)}
 
     def get_neo_by_designation(self, designation):
         """Find and return an NEO by its primary designation.
@@ -103,7 +178,109 @@ class NEODatabase:
         # Fetch an NEO by its name.
         return self.name_to_neo.get(name, None)
 
-    def query(self, filters=()):
+    def add_neos(self, neos):
+        """Add near-Earth objects to the database.
+
+        The new NEOs are linked and indexed just as those given to the
+        constructor, without revisiting the rest of the database.
+
+        :param neos: A collection of `NearEarthObject`s, not yet in any database.
+        :raises ValueError: If an NEO's designation is already taken.
+        """
+        neos = list(neos)
+        self._check_new_neos(neos)
+        for neo in neos:
+            index = len(self.neos)
+            self.neos.append(neo)
+            self.designation_to_neos[neo.designation] = neo
+            if neo.name:
+                self.name_to_neo[neo.name] = neo
+            neo.approaches = []
+            if neo.diameter == neo.diameter:
+                self._diameter_index.add(index)
+            self._hazardous_bitmap.append(bool(neo.hazardous))
+
+    def add_approaches(self, approaches):
+        """Add close approaches, of NEOs already in the database, to the database.
+
+        Each approach is linked to its NEO, inserted into the time index (and the
+        range index, if it's been built) and sampled into the statistics, in time
+        proportional to the number of new approaches.
+
+        :param approaches: A collection of unlinked `CloseApproach`es.
+        :raises ValueError: If an approach's NEO isn't in the database.
+        """
+        approaches = list(approaches)
+        neos = [self._neo_of(approach) for approach in approaches]
+        for approach, neo in zip(approaches, neos):
+            approach.neo = neo
+            self.designation_to_approaches.setdefault(neo.designation, neo.approaches).append(approach)
+            self._time_index.add(approach)
+            if self._grid is not None:
+                self._grid.add(approach)
+        update_statistics(self.statistics, added=approaches)
+
+    def remove_approaches(self, approaches):
+        """Remove close approaches from the database.
+
+        Each approach is identified by the designation of its NEO and its time,
+        so the approaches to remove needn't be the database's own objects - they
+        may just as well have been extracted from a list of retracted approaches.
+
+        The approaches are unlinked from their NEOs, removed from the time index
+        (and the range index, if it's been built) and unsampled from the
+        statistics, in time proportional to the number of removed approaches.
+
+        :param approaches: A collection of `CloseApproach`es.
+        :raises ValueError: If an approach isn't in the database.
+        """
+        removed = {}
+        for designation, time_key in set(map(self._identify, approaches)):
+            matches = [approach for approach in self.designation_to_approaches.get(designation, ())
+                       if approach.time_key == time_key]
+            if not matches:
+                raise ValueError(f"No close approach of {designation!r} at {time_key} minutes "
+                                 f"is in the database.")
+            removed.update((id(approach), approach) for approach in matches)
+
+        for approach in removed.values():
+            neo = approach.neo
+            neo.approaches[:] = [a for a in neo.approaches if a is not approach]
+            self._time_index.remove(approach)
+            if self._grid is not None:
+                self._grid.remove(approach)
+        update_statistics(self.statistics, removed=list(removed.values()))
+
+    def _check_new_neos(self, neos):
+        """Check that new NEOs can be added to the database.
+
+        :raises ValueError: If a designation is already taken, in the database or among the NEOs.
+        """
+        seen = set()
+        for neo in neos:
+            if neo.designation in self.designation_to_neos or neo.designation in seen:
+                raise ValueError(f"An NEO with designation {neo.designation!r} "
+                                 f"is already in the database.")
+            seen.add(neo.designation)
+
+    def _neo_of(self, approach):
+        """Find the NEO of a new close approach.
+
+        :raises ValueError: If the approach's NEO isn't in the database.
+        """
+        designation, _ = self._identify(approach)
+        neo = self.designation_to_neos.get(designation)
+        if neo is None:
+            raise ValueError(f"No NEO with designation {designation!r} is in the database.")
+        return neo
+
+    @staticmethod
+    def _identify(approach):
+        """Identify a close approach by the designation of its NEO and its time key."""
+        designation = approach.neo.designation if approach.neo is not None else approach._designation
+        return designation, approach.time_key
+
+    def query(self, filters=(), order_by=None, descending=False, limit=None):
         """Query close approaches to generate those that match a collection of filters.
 
         This generates a stream of `CloseApproach` objects that match all of the
@@ -111,13 +288,149 @@ class NEODatabase:
 
         If no arguments are provided, generate all known close approaches.
 
-        The `CloseApproach` objects are generated in internal order, which isn't
-        guaranteed to be sorted meaningfully, although is often sorted by time.
+        The `CloseApproach` objects are generated sorted by time: whether the
+        candidates come from the time index itself or - if any of the filters
+        bound the approach date, distance or velocity, or the NEO's diameter or
+        hazardous flag - from the range index or the approaches of the matching
+        NEOs, they are taken in time order.
+
+        The filters are evaluated in the order chosen by `plan`.
+
+        To generate the approaches sorted by one of `ORDER_KEYS` instead, give
+        `order_by`. Approaches ordered by time are streamed straight from the
+        time index; any other order keeps only the first `limit` matches seen
+        so far in a bounded heap, or sorts every match if there's no limit.
 
         :param filters: A collection of filters capturing user-specified criteria.
+        :param order_by: The name of an attribute in `ORDER_KEYS` to sort by, or None.
+        :param descending: Whether to sort by decreasing rather than increasing attribute.
+        :param limit: The maximum number of approaches to generate, or 0 or None for all of them.
         :return: A stream of matching `CloseApproach` objects.
         """
+        if order_by is not None and order_by not in ORDER_KEYS:
+            raise ValueError(f"Can't order close approaches by {order_by!r}.")
+        plan = self.plan(filters)
+        if plan.empty:
+            return iter(())
+        candidates = self._candidates(plan)
+        if order_by == 'time' and descending:
+            candidates = reversed(candidates)
+
         # Generate `CloseApproach` objects that match all of the filters.
-        for approach in self.approaches:
-            if all(f(approach) for f in filters):
-                yield approach
+        filters = plan.filters
+        matches = (approach for approach in candidates if all(f(approach) for f in filters))
+        if order_by not in (None, 'time'):
+            matches = top(matches, ORDER_KEYS[order_by], descending, limit)
+        return itertools.islice(matches, limit or None)
+
+    def summarize(self, filters=(), group_by=()):
+        """Aggregate the close approaches that match a collection of filters.
+
+        The matches are found just as `query` finds them, but are folded into
+        one `aggregate.Summary` per group as they're found, rather than generated.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param group_by: A collection of names from `aggregate.GROUPINGS` to group by.
+        :return: A dictionary mapping each group's key to its `aggregate.Summary`, sorted by key.
+        """
+        check_grouping(group_by)
+        rows = ((approach.time_key, approach.neo.hazardous, approach.distance, approach.velocity)
+                for approach in self.query(filters))
+        return summarize(rows, group_by)
+
+    def _candidates(self, plan):
+        """Collect the close approaches to evaluate a plan's filters on.
+
+        :param plan: A `planner.QueryPlan`, whose access path decides the candidates.
+        :return: A sequence of `CloseApproach`es, sorted by time.
+        """
+        if plan.access == 'time':
+            (_, first_day, last_day), = plan.access_bounds
+            return self._approaches_in_days(first_day, last_day)
+        if plan.access == 'neos':
+            return self._approaches_of_neos(plan.access_bounds)
+        if plan.access == 'box':
+            bounds = {kind: (low, high) for kind, low, high in plan.access_bounds}
+            return sorted(self._range_index().search(bounds), key=attrgetter('time_key'))
+        return self.approaches
+
+    def plan(self, filters=()):
+        """Choose how `query` evaluates a collection of filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A `planner.QueryPlan`, which prints as a summary of its choices.
+        """
+        return plan_query(filters, self.statistics, len(self._time_index), time_index=True,
+                          neo_index=(DiameterFilter, HazardousFilter), box_index=BOX_KINDS)
+
+    def _range_index(self):
+        """Get the range index over `BOX_KINDS`, building it on first use.
+
+        Most queries are answered as well by the time index, so the range index
+        doesn't slow down building the database.
+
+        :return: A `rangeindex.GridIndex` of every close approach.
+        """
+        if self._grid is None:
+            self._grid = GridIndex(self._time_index, BOX_KINDS)
+        return self._grid
+
+    def _index_neo_attributes(self, diameters=None, hazardous=None):
+        """Index the NEOs by diameter and by hazardous flag, for `_approaches_of_neos`.
+
+        The diameter index holds the positions in `neos` of the NEOs with a
+        known diameter, sorted by diameter; the hazardous bitmap holds one byte
+        per NEO, 1 if it's potentially hazardous and 0 otherwise.
+
+        :param diameters: The sorted positions of the diameter index, to restore rather than sort.
+        :param hazardous: The bytes of the hazardous bitmap, to restore rather than gather.
+        """
+        self.neos = list(self.neos)
+        presorted = diameters is not None
+        if not presorted:
+            diameters = (index for index, neo in enumerate(self.neos) if neo.diameter == neo.diameter)
+        self._diameter_index = SortedIndex(diameters, key=lambda index: self.neos[index].diameter,
+                                           presorted=presorted)
+        if hazardous is None:
+            hazardous = (bool(neo.hazardous) for neo in self.neos)
+        self._hazardous_bitmap = bytearray(hazardous)
+
+    def _approaches_of_neos(self, neo_bounds):
+        """Collect the close approaches of the NEOs within some bounds on their attributes.
+
+        Each bound picks out a set of NEOs through the diameter index or the
+        hazardous bitmap, as a 0/1 byte per NEO; only the NEOs in every set
+        contribute their approaches.
+
+        :param neo_bounds: A collection of `(kind, low_key, high_key)` inclusive bounds,
+                           each on `DiameterFilter` or `HazardousFilter` keys.
+        :return: A time-sorted list of the close approaches of the matching NEOs.
+        """
+        picked = int.from_bytes(b'\x01' * len(self.neos), 'little')
+        for kind, low, high in neo_bounds:
+            if kind is DiameterFilter:
+                mask = bytearray(len(self.neos))
+                for index in self._diameter_index.between(low, high):
+                    mask[index] = 1
+            else:
+                # A range of booleans admits either flag, or both.
+                admit_true, admit_false = low <= True <= high, low <= False <= high
+                if admit_true and admit_false:
+                    continue
+                if not admit_true and not admit_false:
+                    return []
+                mask = self._hazardous_bitmap if admit_true else \
+                    bytes(flag ^ 1 for flag in self._hazardous_bitmap)
+            picked &= int.from_bytes(mask, 'little')
+        neos = itertools.compress(self.neos, picked.to_bytes(len(self.neos), 'little'))
+        approaches = itertools.chain.from_iterable(neo.approaches for neo in neos)
+        return sorted(approaches, key=attrgetter('time_key'))
+
+    def _approaches_in_days(self, first_day=-math.inf, last_day=math.inf):
+        """Slice the time index down to the approaches between two days, inclusive.
+
+        :param first_day: The first day of the approaches, in whole days since 0001-01-01.
+        :param last_day: The last day of the approaches, in whole days since 0001-01-01.
+        :return: A time-sorted list of the `CloseApproach`es within the days.
+        """
+        return self._time_index.between(first_day * 24 * 60, (last_day + 1) * 24 * 60 - 1)
@@ -5,7 +5,9 @@ described in the project instructions, into a collection of `NearEarthObject`s.
 
 The `load_approaches` function extracts close approach data from a JSON file,
 formatted as described in the project instructions, into a collection of
-`CloseApproach` objects.
+`CloseApproach` objects. The JSON file is read incrementally, and the
+`iter_approaches` function produces the same close approaches as a stream, so
+that a caller who doesn't need them all at once can keep memory bounded.
 
 The main module calls these functions with the arguments provided at the command
 line, and uses the resulting collections to build an `NEODatabase`.
@@ -13,7 +15,11 @@ line, and uses the resulting collections to build an `NEODatabase`.
 You'll edit this file in Task 2.
 """
 import csv
+import io
+import itertools
 import json
+import os
+import re
 
 from models import NearEarthObject, CloseApproach
 
@@ -25,23 +31,82 @@ def load_neos(neo_csv_path):
     :return: A collection of `NearEarthObject`s.
     """
     # Load NEO data from the given CSV file.
-    data=[]
-    with open(neo_csv_path, 'r') as file:
-        reader = csv.reader(file)
-        for i, lines in enumerate(reader):
-            if i==0:
-                designation_index = lines.index('pdes')
-                name_index = lines.index('name')
-                pha_index = lines.index('pha')
-                diameter_index = lines.index('diameter')
-            else:
-                data.append(NearEarthObject(
-                    designation=lines[designation_index],
-                    name=lines[name_index],
-                    diameter=lines[diameter_index],
-                    hazardous=True if lines[pha_index] == 'Y' else False
-                ))
-    return data
+    with open(neo_csv_path, 'r', newline='') as file:
+        header = next(csv.reader(file))
+        return list(iter_neos(file, header))
+
+
+def iter_neos(lines, header):
+    """Parse the records of an NEO CSV file into `NearEarthObject`s, one at a time.
+
+    :param lines: An iterator of the lines of a CSV file, positioned after its header.
+    :param header: The list of column names from the file's header.
+    :yield: A `NearEarthObject` for each record.
+    """
+    columns = [header.index(name) for name in ('pdes', 'name', 'pha', 'diameter')]
+    for designation, name, pha, diameter in _project_csv(lines, columns):
+        yield NearEarthObject(
+            designation=designation,
+            name=name,
+            diameter=diameter,
+            hazardous=True if pha == 'Y' else False
+        )
+
+
+def _project_csv(lines, columns):
+    """Parse only some columns of each record of a CSV file.
+
+    The NEO CSV file has 75 columns, but only a handful of the leading ones are
+    of interest. Rather than splitting every field of every record, a record is
+    only split up to the last column of interest, and the rest of the line is
+    left as one unparsed string. Records with quoted fields - which might hold
+    commas or newlines - are parsed by the `csv` module instead.
+
+    :param lines: An iterator of the lines of a CSV file, positioned after its header.
+    :param columns: The indices of the columns to keep, in the order to produce them.
+    :yield: A list of the values of the chosen columns, for each record.
+    """
+    maxsplit = max(columns) + 1
+    for line in lines:
+        if '"' in line:
+            fields = next(csv.reader(itertools.chain((line,), lines)))
+        elif line.strip():
+            fields = line.rstrip('\r\n').split(',', maxsplit)
+        else:
+            continue
+        yield [fields[column] for column in columns]
+
+
+def iter_approaches(cad_json_path):
+    """Stream close approach data from a JSON file, one `CloseApproach` at a time.
+
+    The JSON document is never held in memory as a whole: its `data` rows are
+    decoded one by one as they are read, so memory stays bounded however large
+    the file is.
+
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :yield: The `CloseApproach`es in the file, in file order.
+    """
+    fields, rows = _stream_cad(cad_json_path)
+    yield from approaches_from_rows(fields, rows)
+
+
+def approaches_from_rows(fields, rows):
+    """Build a `CloseApproach` from each decoded `data` row of a close approach JSON file.
+
+    :param fields: The list of field names from the file's `fields` header.
+    :param rows: An iterable of rows, each a list of values in the order of `fields`.
+    :yield: The `CloseApproach` of each row, in order.
+    """
+    des_index = fields.index('des')
+    cd_index = fields.index('cd')
+    dist_index = fields.index('dist')
+    v_rel_index = fields.index('v_rel')
+    for row in rows:
+        yield CloseApproach(time=row[cd_index],
+                            distance=row[dist_index],
+                            velocity=row[v_rel_index],
+                            designation=row[des_index])
 
 
 def load_approaches(cad_json_path):
@@ -50,21 +115,253 @@ def load_approaches(cad_json_path):
     :param cad_json_path: A path to a JSON file containing data about close approaches.
     :return: A collection of `CloseApproach`es.
     """
-    # Load close approach data from the given JSON file.
+    return list(iter_approaches(cad_json_path))
+
+
+class _JSONStream:
+    """An incremental reader of the tokens and values of a JSON document in a text file.
+
+    The file is read in chunks, and only the chunk being decoded is buffered.
+    Arrays and objects can be walked one element or member at a time with
+    `elements` and `members`, while any other value is decoded whole by `value`.
+    """
+    _WHITESPACE = re.compile(r'\s*')
+
+    def __init__(self, file, chunk_size=1 << 16, offset=0):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.offset = offset
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Append the next chunk of the file to the buffer, dropping what's been consumed."""
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def tell(self):
+        """Return the position of the next unconsumed character in the file."""
+        return self.offset + self.pos
+
+    def peek(self):
+        """Skip whitespace and return the next character, or '' at the end of the file."""
+        while True:
+            self.pos = self._WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, chars):
+        """Consume the next character, which must be one of `chars`, and return it."""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} in JSON, not {char!r}.")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode and return the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number that runs into the end of the buffer may continue in the next chunk.
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def members(self):
+        """Walk a JSON object, generating each key and leaving its value to be consumed."""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def elements(self):
+        """Walk a JSON array, generating each of its elements in turn."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+
+def _stream_cad(cad_json_path):
+    """Find the field names of a close approach JSON file, and stream its data rows.
+
+    The `fields` header may come before or after the `data` rows, so the header
+    is found in a first pass (skipping over any rows in the way, one by one)
+    and the rows are streamed in a second one. Only if the file can't be walked
+    that way is it loaded whole with `json.load`.
+
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :return: A tuple of the list of field names and an iterator of data rows.
+    """
+    with open(cad_json_path, 'r') as file:
+        try:
+            fields = _find_cad_fields(_JSONStream(file))
+        except ValueError:
+            fields = None
+
+    if fields is None:
+        with open(cad_json_path, 'r') as file:
+            data = json.load(file)
+        return data['fields'], iter(data['data'])
+    return fields, _iter_cad_data(cad_json_path)
 
-    cad=[]
 
+def _find_cad_fields(stream):
+    """Return the `fields` list of a close approach JSON document, or None if it has none."""
+    for key in stream.members():
+        if key == 'fields':
+            return stream.value()
+        if key == 'data':
+            for _row in stream.elements():
+                pass
+        else:
+            stream.value()
+    return None
+
+
+def _iter_cad_data(cad_json_path):
+    """Generate the `data` rows of a close approach JSON document, one at a time."""
     with open(cad_json_path, 'r') as file:
-        data = json.load(file)
-        des_index = data['fields'].index('des')
-        cd_index = data['fields'].index('cd')
-        dist_index = data['fields'].index('dist')
-        v_rel_index = data['fields'].index('v_rel')
-        for i in data['data']:
-            cad.append(CloseApproach(time=i[cd_index],
-                                    distance=i[dist_index],
-                                    velocity=i[v_rel_index],
-                                    designation=i[des_index]
-                                    ))
-
-    return cad
\ No newline at end of file
+        stream = _JSONStream(file)
+        for key in stream.members():
+            if key == 'data':
+                yield from stream.elements()
+                return
+            stream.value()
+
+
+# The boundary between two rows of the `data` array of a close approach JSON
+# file. Rows only hold strings and numbers, and CAD's strings are designations,
+# numbers and dates, so this doesn't occur within a row - but nothing stops a
+# string from holding "], [", so the rows that a split yields must be counted.
+_CAD_ROW_BOUNDARY = re.compile(rb'\]\s*,\s*\[')
+
+
+def split_cad(cad_json_path, shards):
+    """Divide the `data` rows of a close approach JSON file into byte ranges.
+
+    The file is walked (as Latin-1, so that character offsets are byte offsets)
+    only as far as the start of its `data` array, so splitting is cheap - but
+    that also means the `fields` header has to come before the `data` rows.
+
+    The ranges are cut wherever a row seems to end, by `_CAD_ROW_BOUNDARY`,
+    which a string holding "], [" would fool into cutting within a row. The
+    `count` header, if it comes before the `data` rows too, tells how many rows
+    the ranges must yield between them, so a bad split can be noticed.
+
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :param shards: How many byte ranges to divide the rows into.
+    :return: A tuple of the list of field names, the `count` header (or None if
+             it doesn't come first) and a list of (start, stop) byte ranges for
+             `iter_cad_shard`, or None if the file can't be split.
+    """
+    fields = count = None
+    with open(cad_json_path, 'r', encoding='latin-1') as file:
+        stream = _JSONStream(file)
+        try:
+            for key in stream.members():
+                if key == 'data':
+                    if fields is None:
+                        return None
+                    stream.expect('[')
+                    stream.peek()
+                    start = stream.tell()
+                    break
+                value = stream.value()
+                if key == 'fields':
+                    fields = value
+                elif key == 'count':
+                    count = value
+            else:
+                return None
+        except ValueError:
+            return None
+        end = os.fstat(file.fileno()).st_size
+
+    bounds = [start + (end - start) * shard // shards for shard in range(shards + 1)]
+    return fields, count, list(zip(bounds, bounds[1:]))
+
+
+def iter_cad_shard(cad_json_path, start, stop):
+    """Generate the `data` rows of a close approach JSON file that begin in a byte range.
+
+    Rows that begin before `stop` are generated whole, even where they end after
+    it, so the ranges from `split_cad` produce every row exactly once.
+
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :param start: The byte offset of the start of the range; the first row's, for the first range.
+    :param stop: The byte offset of the end of the range.
+    :yield: Each row beginning in the range, as a list of values.
+    """
+    with open(cad_json_path, 'rb') as file:
+        row_start = _find_cad_row(file, start, stop)
+        if row_start is None:
+            return
+        file.seek(row_start)
+        stream = _JSONStream(io.TextIOWrapper(file, encoding='latin-1'), offset=row_start)
+        while stream.peek() == '[' and stream.tell() < stop:
+            row_start = stream.tell()
+            row = stream.value()
+            text = stream.buffer[row_start - stream.offset:stream.pos]
+            if not text.isascii():
+                # The row was read as Latin-1, so decode it again as the UTF-8 it really is.
+                row = json.loads(text.encode('latin-1').decode('utf-8'))
+            yield row
+            if stream.expect(',]') == ']':
+                return
+
+
+def _find_cad_row(file, start, stop):
+    """Find the byte offset of the first `data` row that begins within a byte range.
+
+    :param file: A close approach JSON file, opened in binary mode.
+    :param start: The byte offset of the start of the range.
+    :param stop: The byte offset of the end of the range.
+    :return: The byte offset of the row's opening bracket, or None if no row begins in the range.
+    """
+    file.seek(start)
+    if file.read(1) == b'[':
+        return start
+
+    # Step back a little, in case the range starts between a row and its separator.
+    offset = max(start - 4096, 0)
+    file.seek(offset)
+    window = b''
+    while True:
+        chunk = file.read(1 << 16)
+        window += chunk
+        for match in _CAD_ROW_BOUNDARY.finditer(window):
+            row_start = offset + match.end() - 1
+            if row_start >= start:
+                return row_start if row_start < stop else None
+        if not chunk:
+            return None
+        # Keep the tail of the window, in case a boundary straddles two chunks.
+        keep = min(len(window), 4096)
+        offset += len(window) - keep
+        window = window[len(window) - keep:]
@@ -11,12 +11,24 @@ from a comparator (from the `operator` module), a reference value, and a class
 method `get` that subclasses can override to fetch an attribute of interest from
 the supplied `CloseApproach`.
 
+Each `AttributeFilter` can also compile itself into a mask over the typed
+columns of a `columnar.ApproachColumns`, so that the columnar engine can
+evaluate a filter over every close approach in a few passes instead of one
+Python call per approach.
+
 The `limit` function simply limits the maximum number of values produced by an
-iterator.
+iterator, and the `top` function sorts them, or picks out the first few of them
+in sorted order.
 
 You'll edit this file in Tasks 3a and 3c.
 """
-from operator import eq, le, ge
+import datetime
+import heapq
+import math
+from itertools import repeat
+from operator import and_, eq, le, ge
+
+from helpers import datetime_to_minutes
 
 
 class UnsupportedCriterionError(NotImplementedError):
@@ -36,8 +48,17 @@ class AttributeFilter:
     infix notation).
 
     Concrete subclasses can override the `get` classmethod to provide custom
-    behavior to fetch a desired attribute from the given `CloseApproach`.
+    behavior to fetch a desired attribute from the given `CloseApproach`, and
+    name the matching column of an `ApproachColumns` in `column`.
+
+    For the query planner (see `planner.py`), `cost` is the relative cost of
+    evaluating the filter on one approach, and the `key` and `key_of`
+    classmethods map an approach and a reference value to cheap sort keys that
+    compare just like `get(approach)` and `value` do.
     """
+    column = None
+    cost = 1
+
     def __init__(self, op, value):
         """Construct a new `AttributeFilter` from an binary predicate and a reference value.
 
@@ -68,43 +89,201 @@ class AttributeFilter:
         """
         raise UnsupportedCriterionError
 
+    @classmethod
+    def key(cls, approach):
+        """Get a sort key for the attribute of interest of a close approach.
+
+        :param approach: A `CloseApproach` on which to evaluate this filter.
+        :return: A value that orders approaches just like `get(approach)` does.
+        """
+        return cls.get(approach)
+
+    @classmethod
+    def key_of(cls, value):
+        """Convert a reference value into the terms of `key`.
+
+        :param value: A reference value, as given to the constructor.
+        :return: A value that compares with `key(approach)` as `value` does with `get(approach)`.
+        """
+        return value
+
+    def mask(self, columns):
+        """Evaluate this filter over every row of some close approach columns at once.
+
+        :param columns: An `ApproachColumns` holding the close approaches to filter.
+        :return: A `bytes` mask holding 1 for each row that matches and 0 otherwise.
+        """
+        if self.column is None:
+            raise UnsupportedCriterionError
+        return bytes(map(self.op, getattr(columns, self.column), repeat(self.value)))
+
     def __repr__(self):
         return f"{self.__class__.__name__}(op=operator.{self.op.__name__}, value={self.value})"
 
 
 # Specific filter subclasses
 class DateFilter(AttributeFilter):
+    column = 'times'
+
+    def __init__(self, op, value):
+        super().__init__(op, value)
+        self._day = self.key_of(value)
+
+    def __call__(self, approach):
+        return self.op(self.key(approach), self._day)
+
     @classmethod
     def get(cls, approach):
         return approach.time.date()
 
+    @classmethod
+    def key(cls, approach):
+        # Compare whole days since 0001-01-01, taken from each approach's cheap
+        # integer `time_key`, rather than decoding the `datetime` of every approach.
+        return approach.time_key // (24 * 60)
+
+    @classmethod
+    def key_of(cls, value):
+        return value.toordinal() - 1
+
+    def mask(self, columns):
+        # The time column holds minutes, so compare against the first and the
+        # last minute of the reference date rather than decoding every row.
+        first = datetime_to_minutes(datetime.datetime.combine(self.value, datetime.time.min))
+        last = first + 24 * 60 - 1
+        times = columns.times
+        if self.op is ge:
+            return bytes(map(ge, times, repeat(first)))
+        if self.op is le:
+            return bytes(map(le, times, repeat(last)))
+        if self.op is eq:
+            return bytes(map(and_, map(ge, times, repeat(first)), map(le, times, repeat(last))))
+        return bytes(self.op(datetime.date.fromordinal(minutes // (24 * 60) + 1), self.value)
+                     for minutes in times)
+
 class DistanceFilter(AttributeFilter):
+    column = 'distances'
+
     @classmethod
     def get(cls, approach):
         return approach.distance
 
 class VelocityFilter(AttributeFilter):
+    column = 'velocities'
+
     @classmethod
     def get(cls, approach):
         return approach.velocity
 
 class DiameterFilter(AttributeFilter):
+    column = 'diameters'
+    # Reaching the diameter goes through the approach's NEO.
+    cost = 2
+
     @classmethod
     def get(cls, approach):
         return approach.neo.diameter
 
 class HazardousFilter(AttributeFilter):
+    column = 'hazardous'
+    cost = 2
+
     @classmethod
     def get(cls, approach):
         return approach.neo.hazardous
 
 
+class RangeFilter(AttributeFilter):
+    """A lower and an upper bound on the same attribute, merged into a single check.
+
+    A `RangeFilter` matches the approaches that both `kind(ge, low)` and
+    `kind(le, high)` would match, but fetches the attribute only once. Either
+    bound may be None, if unbounded. The query planner builds these out of the
+    filters made by `create_filters`.
+    """
+    def __init__(self, kind, low=None, high=None):
+        """Construct a new `RangeFilter` from a filter class and inclusive bounds.
+
+        :param kind: The `AttributeFilter` subclass whose attribute to bound.
+        :param low: The smallest matching reference value, or None if unbounded.
+        :param high: The largest matching reference value, or None if unbounded.
+        """
+        super().__init__(None, (low, high))
+        self.kind = kind
+        self.column = kind.column
+        self.cost = kind.cost
+        self.low = low
+        self.high = high
+        # Missing bounds become infinite, so that every call is a single chained comparison.
+        self._low = -math.inf if low is None else kind.key_of(low)
+        self._high = math.inf if high is None else kind.key_of(high)
+
+    def __call__(self, approach):
+        return self._low <= self.kind.key(approach) <= self._high
+
+    def get(self, approach):
+        return self.kind.get(approach)
+
+    def key(self, approach):
+        return self.kind.key(approach)
+
+    def key_of(self, value):
+        return self.kind.key_of(value)
+
+    def mask(self, columns):
+        masks = []
+        if self.low is not None:
+            masks.append(self.kind(ge, self.low).mask(columns))
+        if self.high is not None:
+            masks.append(self.kind(le, self.high).mask(columns))
+        if not masks:
+            return b'\x01' * len(columns)
+        if len(masks) == 1:
+            return masks[0]
+        return bytes(map(and_, *masks))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.kind.__name__}, low={self.low}, high={self.high})"
+
+
+class BoxFilter:
+    """Inclusive ranges on several attributes of a close approach, all of which must hold.
+
+    A `BoxFilter` describes a box in the space of those attributes - such as
+    date, distance and velocity - which the query planner can hand whole to a
+    database's range index (see `rangeindex.py`). Evaluated on its own, it
+    checks each of its ranges in turn.
+    """
+    def __init__(self, ranges):
+        """Construct a new `BoxFilter` from one `RangeFilter` per attribute.
+
+        :param ranges: A collection of `RangeFilter`s, on different attributes.
+        """
+        self.ranges = list(ranges)
+        self.cost = sum(r.cost for r in self.ranges)
+
+    def __call__(self, approach):
+        return all(r(approach) for r in self.ranges)
+
+    def mask(self, columns):
+        masks = [r.mask(columns) for r in self.ranges]
+        if not masks:
+            return b'\x01' * len(columns)
+        combined = int.from_bytes(masks[0], 'little')
+        for mask in masks[1:]:
+            combined &= int.from_bytes(mask, 'little')
+        return combined.to_bytes(len(columns), 'little')
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.ranges!r})"
+
+
 def create_filters(
         date=None, start_date=None, end_date=None,
         distance_min=None, distance_max=None,
         velocity_min=None, velocity_max=None,
         diameter_min=None, diameter_max=None,
-        hazardous=None
+        hazardous=None, box=False
 ):
     """Create a collection of filters from user-specified criteria.
 
@@ -133,9 +312,23 @@ def create_filters(
     :param diameter_min: A minimum diameter of the NEO of a matching `CloseApproach`.
     :param diameter_max: A maximum diameter of the NEO of a matching `CloseApproach`.
     :param hazardous: Whether the NEO of a matching `CloseApproach` is potentially hazardous.
+    :param box: Whether to combine the date, distance and velocity criteria into a single `BoxFilter`.
     :return: A collection of filters for use with `query`.
     """
     # Representing the filters
+    if box:
+        filters = create_filters(diameter_min=diameter_min, diameter_max=diameter_max,
+                                 hazardous=hazardous)
+        first = max(filter(None, (date, start_date)), default=None)
+        last = min(filter(None, (date, end_date)), default=None)
+        ranges = [RangeFilter(kind, low or None, high or None) for kind, low, high in (
+            (DateFilter, first, last),
+            (DistanceFilter, distance_min, distance_max),
+            (VelocityFilter, velocity_min, velocity_max),
+        ) if low or high]
+        if ranges:
+            filters.append(BoxFilter(ranges))
+        return filters
 
     filters = []
     if date:
@@ -185,3 +378,35 @@ def limit(iterator, n=None):
                 count += 1
             else:
                 break
+
+
+def top(iterator, key, descending=False, n=None):
+    """Produce the values from an iterator in sorted order, or only the first `n` of them.
+
+    With a limit, only the best `n` values seen so far are held, in a bounded
+    heap, which takes O(N log n) time for N values rather than sorting them all.
+    Values whose key is NaN (such as an unknown diameter) sort last either way.
+
+    If `n` is 0 or None, sort every value.
+
+    :param iterator: An iterator of values.
+    :param key: A function from a value to the key to sort it by.
+    :param descending: Whether to produce the values with the largest keys first.
+    :param n: The maximum number of values to produce.
+    :return: A list of the (at most) `n` first values, in sorted order.
+    """
+    unknown = []
+
+    def known():
+        for item in iterator:
+            value = key(item)
+            if value != value:
+                if not n or len(unknown) < n:
+                    unknown.append(item)
+            else:
+                yield item
+
+    if n:
+        best = (heapq.nlargest if descending else heapq.nsmallest)(n, known(), key=key)
+        return best + unknown[:n - len(best)]
+    return sorted(known(), key=key, reverse=descending) + unknown
@@ -3,14 +3,28 @@
 NASA's dataset provides timestamps as naive datetimes (corresponding to UTC).
 
 The `cd_to_datetime` function converts a string, formatted as the `cd` field of
-NASA's close approach data, into a Python `datetime`
+NASA's close approach data, into a Python `datetime`, and the `cd_to_minutes`
+function converts it into a plain integer count of minutes instead. The
+`cds_to_datetimes` and `cds_to_minutes` functions convert a whole column of
+such strings at once.
 
 The `datetime_to_str` function converts a Python `datetime` into a string.
 Although `datetime`s already have human-readable string representations, those
 representations display seconds, but NASA's data (and our datetimes!) don't
 provide that level of resolution, so the output format also will not.
+
+The `datetime_to_minutes` and `minutes_to_datetime` functions convert between a
+Python `datetime` and a plain integer count of minutes, which is all the
+resolution NASA's data has and which packs into a typed array.
 """
+import array
 import datetime
+import functools
+
+
+# The month abbreviations in NASA's calendar dates, by month number.
+_MONTHS = {abbreviation: number for number, abbreviation in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), start=1)}
 
 
 def cd_to_datetime(calendar_date):
@@ -23,10 +37,94 @@ def cd_to_datetime(calendar_date):
 
     This will become the Python object `datetime.datetime(2020, 12, 31, 12, 0)`.
 
+    Since the format has fixed widths, the fields are sliced out directly rather
+    than with `strptime`, which is far slower. Anything not in exactly this
+    layout is still handed to `strptime`, to be parsed or rejected as before.
+
     :param calendar_date: A calendar date in YYYY-bb-DD hh:mm format.
     :return: A naive `datetime` corresponding to the given calendar date and time.
     """
-    return datetime.datetime.strptime(calendar_date, "%Y-%b-%d %H:%M")
+    parts = _split_cd(calendar_date)
+    if parts is None:
+        return datetime.datetime.strptime(calendar_date, "%Y-%b-%d %H:%M")
+    date, hour, minute = parts
+    return datetime.datetime(*date, hour, minute)
+
+
+def cds_to_datetimes(calendar_dates):
+    """Convert a column of NASA-formatted calendar dates into datetimes, all at once.
+
+    :param calendar_dates: An iterable of calendar dates in YYYY-bb-DD hh:mm format.
+    :return: A list of the corresponding naive `datetime`s.
+    """
+    return [cd_to_datetime(calendar_date) for calendar_date in calendar_dates]
+
+
+def cds_to_minutes(calendar_dates):
+    """Convert a column of NASA-formatted calendar dates straight into minutes.
+
+    This produces the same values as `datetime_to_minutes(cd_to_datetime(cd))`
+    for each calendar date, without building any `datetime`s, in the typed
+    array that the columnar engine stores approach times in.
+
+    :param calendar_dates: An iterable of calendar dates in YYYY-bb-DD hh:mm format.
+    :return: An `array.array` of the minutes since 0001-01-01 of each calendar date.
+    """
+    return array.array('q', map(cd_to_minutes, calendar_dates))
+
+
+def cd_to_minutes(calendar_date):
+    """Convert a NASA-formatted calendar date into minutes, without building a `datetime`.
+
+    :param calendar_date: A calendar date in YYYY-bb-DD hh:mm format.
+    :return: The same value as `datetime_to_minutes(cd_to_datetime(calendar_date))`.
+    """
+    parts = _split_cd(calendar_date)
+    if parts is None:
+        return datetime_to_minutes(cd_to_datetime(calendar_date))
+    date, hour, minute = parts
+    return _date_to_minutes(date) + hour * 60 + minute
+
+
+def _split_cd(calendar_date):
+    """Slice a NASA calendar date into its date, hour and minute.
+
+    :param calendar_date: A calendar date, presumably in YYYY-bb-DD hh:mm format.
+    :return: A ((year, month, day), hour, minute) tuple, or None if the calendar
+             date isn't laid out exactly that way.
+    """
+    date = _parse_cd_date(calendar_date[:11])
+    if date is None or len(calendar_date) != 17 or calendar_date[11] != ' ' \
+            or calendar_date[14] != ':':
+        return None
+    hour, minute = calendar_date[12:14], calendar_date[15:]
+    if not hour.isdecimal() or not minute.isdecimal() or hour > '23' or minute > '59':
+        return None
+    return date, int(hour), int(minute)
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _parse_cd_date(prefix):
+    """Parse the YYYY-bb-DD date prefix of a NASA calendar date.
+
+    Many close approaches share a date, so the parsed prefixes are memoized -
+    up to some 180 years' worth of days, so arbitrary input can't grow the memo
+    without bound.
+
+    :param prefix: The first 11 characters of a calendar date.
+    :return: A (year, month, day) tuple, or None if the prefix isn't in that layout.
+    """
+    month = _MONTHS.get(prefix[5:8])
+    if len(prefix) != 11 or month is None or prefix[4] != '-' or prefix[8] != '-' \
+            or not prefix[:4].isdecimal() or not prefix[9:].isdecimal():
+        return None
+    return int(prefix[:4]), month, int(prefix[9:])
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _date_to_minutes(date):
+    """Return the minutes since 0001-01-01 at the start of a (year, month, day) date."""
+    return (datetime.date(*date).toordinal() - 1) * 1440
 
 
 def datetime_to_str(dt):
@@ -42,3 +140,42 @@ def datetime_to_str(dt):
     :return: That datetime, as a human-readable string without seconds.
     """
     return datetime.datetime.strftime(dt, "%Y-%m-%d %H:%M")
+
+
+def datetime_to_minutes(dt):
+    """Convert a naive Python datetime into the number of minutes since 0001-01-01.
+
+    Seconds and microseconds are dropped, matching the resolution of NASA's data.
+
+    :param dt: A naive Python datetime.
+    :return: The whole number of minutes between 0001-01-01 00:00 and that datetime.
+    """
+    return (dt.toordinal() - 1) * 1440 + dt.hour * 60 + dt.minute
+
+
+def minutes_to_str(minutes):
+    """Format a number of minutes since 0001-01-01 as `datetime_to_str` would its datetime.
+
+    The date part is formatted once per distinct day and cached, so formatting
+    many approach times doesn't call `strftime` for each of them.
+
+    :param minutes: A whole number of minutes, as from `datetime_to_minutes`.
+    :return: That time, as a 'YYYY-MM-DD HH:MM' string.
+    """
+    day, minute = divmod(minutes, 24 * 60)
+    return f"{_day_to_str(day)} {minute // 60:02d}:{minute % 60:02d}"
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _day_to_str(day):
+    """Format a number of whole days since 0001-01-01 as a 'YYYY-MM-DD' string."""
+    return datetime.date.fromordinal(day + 1).isoformat()
+
+
+def minutes_to_datetime(minutes):
+    """Convert a number of minutes since 0001-01-01 back into a naive Python datetime.
+
+    :param minutes: A whole number of minutes, as from `datetime_to_minutes`.
+    :return: The corresponding naive `datetime`.
+    """
+    return datetime.datetime.min + datetime.timedelta(minutes=minutes)
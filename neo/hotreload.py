@@ -0,0 +1,361 @@
+"""Reload the data files of an interactive session when they change, while it runs.
+
+An interactive session (see `main.NEOShell`) loads its database once. When a
+new NEO CSV file or close approach JSON file is dropped in place, a `Reloader`
+notices and reads it in a background thread, while the database keeps
+answering queries.
+
+Data files are usually only ever extended, so the `Reloader` remembers enough
+about each file to tell whether its old records are still there, unchanged:
+
+- for the NEO CSV file, a hash of its contents; new records can only follow
+  the old ones, so the old contents must be a prefix of the new ones; and
+- for the close approach JSON file, a hash of the `data` rows. The header
+  around them (such as the `count`) may change, but the old rows must come
+  first, byte for byte, in the new `data` array.
+
+If so, only the new records are parsed, and added to the database in use with
+`add_neos` and `add_approaches` - in time proportional to the number of new
+records. That happens while holding the `Reloader`'s `lock`, which the session
+holds for each command, so no query ever sees a half-added batch. Otherwise,
+the data files are loaded from scratch into a new database, which the session
+swaps in between two commands.
+
+Finding the `data` rows without parsing them relies on rows holding only strings
+and numbers, just as `extract.split_cad` does.
+"""
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import threading
+
+from extract import approaches_from_rows, iter_neos
+from snapshot import load_database
+
+
+# The start of the `data` array of a close approach JSON file.
+_CAD_DATA = re.compile(rb'"data"\s*:\s*\[')
+# The end of the last row of a `data` array, and of the array itself.
+_CAD_DATA_END = re.compile(rb'\]\s*\]')
+# An empty `data` array.
+_CAD_NO_DATA = re.compile(rb'\s*\]')
+# The `fields` header of a close approach JSON file.
+_CAD_FIELDS = re.compile(rb'"fields"\s*:\s*(\[[^\]]*\])')
+
+
+class Reloader:
+    """A watcher of the data files of a database, which rebuilds it when they change.
+
+    :ivar lock: A lock to hold while using the database, which is held while records are added to it.
+    :ivar reloads: How many times the database has been loaded from scratch.
+    :ivar deltas: How many times only the new records of the data files have been added.
+    """
+    def __init__(self, neo_csv_path, cad_json_path, engine, snapshot_path=None, workers=1):
+        """Create a new `Reloader`, and start taking stock of the data files in the background.
+
+        :param neo_csv_path: A path to a CSV file containing data about near-Earth objects.
+        :param cad_json_path: A path to a JSON file containing data about close approaches.
+        :param engine: The database class to build, such as `NEODatabase` or `ColumnarNEODatabase`.
+        :param snapshot_path: A path to the snapshot file, or None to always parse the data files.
+        :param workers: How many processes to parse the data files with, if they must be parsed.
+        """
+        self.neo_csv_path = neo_csv_path
+        self.cad_json_path = cad_json_path
+        self.engine = engine
+        self.snapshot_path = snapshot_path
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.reloads = self.deltas = 0
+        self._files = None
+        self._thread = None
+        self._outcome = None
+        self._start(self._take_stock)
+
+    def poll(self, database):
+        """Check on the data files, and on any rebuild of the database in progress.
+
+        This is cheap enough to call before every command: the data files are only
+        `stat`ed, and any reading and parsing happens in a background thread.
+
+        If the data files couldn't be described when the `Reloader` was created
+        (say, one was being replaced), that's tried again.
+
+        :param database: The database that is currently in use.
+        :return: A tuple of the database and a message describing the reload,
+                 once a rebuild has finished; otherwise, None. The database is
+                 the one in use if the new records were added to it, or None if
+                 the rebuild failed.
+        """
+        if self._thread is not None:
+            if self._thread.is_alive():
+                return None
+            self._thread = None
+            outcome, self._outcome = self._outcome, None
+            if outcome is not None:
+                return outcome
+
+        if self._files is None:
+            self._start(self._take_stock)
+        elif self._changed():
+            self._start(self._rebuild, database)
+        return None
+
+    def wait(self):
+        """Wait for any work in the background to finish."""
+        if self._thread is not None:
+            self._thread.join()
+
+    def _start(self, target, *args):
+        """Run a method in a background thread, keeping its outcome for `poll`."""
+        def run():
+            try:
+                self._outcome = target(*args)
+            except Exception as err:
+                self._outcome = (None, f"Couldn't reload the data files: {err}")
+        self._thread = threading.Thread(target=run, name='neo-reload', daemon=True)
+        self._thread.start()
+
+    def _changed(self):
+        """Check whether either data file has been touched since it was last read.
+
+        A data file that's missing is probably being replaced, so it counts as
+        unchanged until it's back.
+        """
+        try:
+            return _stat(self.neo_csv_path) != self._files[0]['stat'] or \
+                _stat(self.cad_json_path) != self._files[1]['stat']
+        except OSError:
+            return False
+
+    def _take_stock(self):
+        """Describe the current contents of the data files, unless they can't be read yet."""
+        try:
+            self._files = (_neo_file(self.neo_csv_path), _cad_file(self.cad_json_path))
+        except (OSError, ValueError):
+            # A data file is missing, or half-written; `poll` tries again.
+            pass
+        return None
+
+    def _rebuild(self, database):
+        """Build a new database from the data files, adding to the old one if possible.
+
+        If that fails, the data files are left alone until they change again,
+        rather than being reloaded (and failing again) before every command.
+
+        :param database: The database that is currently in use.
+        :return: A tuple of the new database and a message describing the reload,
+                 or None if nothing really changed.
+        """
+        stats = _stat(self.neo_csv_path), _stat(self.cad_json_path)
+        try:
+            return self._reload(database)
+        except Exception:
+            # The old descriptions still describe the database in use, so keep them.
+            self._files = tuple(dict(file, stat=stat) for file, stat in zip(self._files, stats))
+            raise
+
+    def _reload(self, database):
+        """Build a new database from the data files (see `_rebuild`)."""
+        neo_file, cad_file = self._files
+        neos = _appended_neos(self.neo_csv_path, neo_file)
+        approaches = _appended_approaches(self.cad_json_path, cad_file)
+        if neos is not None and approaches is not None:
+            (neos, neo_file), (approaches, cad_file) = neos, approaches
+            try:
+                extended = _extend(database, neos, approaches, self.lock)
+            except ValueError:
+                # A new close approach of an unknown NEO, say; let a full load report it.
+                pass
+            else:
+                self._files = (neo_file, cad_file)
+                if not extended:
+                    return None
+                self.deltas += 1
+                return database, f"Added {len(neos):,} NEOs and {len(approaches):,} " \
+                                 f"close approaches from the data files."
+
+        files = (_neo_file(self.neo_csv_path), _cad_file(self.cad_json_path))
+        database = load_database(self.neo_csv_path, self.cad_json_path, self.engine,
+                                 self.snapshot_path, workers=self.workers)
+        self._files = files
+        self.reloads += 1
+        return database, "Reloaded the data files."
+
+
+def _stat(path):
+    """Describe a data file by its size and modification time."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _neo_file(path, digest=None, size=0):
+    """Describe the contents of an NEO CSV file.
+
+    :param path: A path to a CSV file containing data about near-Earth objects.
+    :param digest: A hash of the first `size` bytes of the file, if already known.
+    :param size: How many bytes of the file `digest` has hashed.
+    :return: A dictionary of the file's `stat`, size, whether it ends with a line
+             break, and a hash of its contents.
+    """
+    stat = _stat(path)
+    digest = digest or hashlib.sha256()
+    with open(path, 'rb') as file:
+        file.seek(size)
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+            size += len(chunk)
+        file.seek(max(size - 1, 0))
+        newline = file.read(1) in (b'', b'\n')
+    return {'stat': stat, 'size': size, 'newline': newline, 'digest': digest}
+
+
+def _appended_neos(path, old):
+    """Parse the NEOs appended to an NEO CSV file since it was described by `_neo_file`.
+
+    :param path: A path to a CSV file containing data about near-Earth objects.
+    :param old: The file's description, from `_neo_file`.
+    :return: A tuple of a list of the new `NearEarthObject`s and the file's new
+             description, or None if the old records have changed.
+    """
+    if not old['size'] or not old['newline']:
+        return None
+    with open(path, 'rb') as file:
+        header = next(csv.reader([file.readline().decode('utf-8')]))
+        file.seek(0)
+        digest = hashlib.sha256()
+        remaining = old['size']
+        while remaining:
+            chunk = file.read(min(remaining, 1 << 20))
+            if not chunk:
+                return None
+            digest.update(chunk)
+            remaining -= len(chunk)
+        if digest.digest() != old['digest'].digest():
+            return None
+        appended = file.read()
+
+    neos = list(iter_neos(io.StringIO(appended.decode('utf-8'), newline=''), header))
+    digest.update(appended)
+    return neos, _neo_file(path, digest, old['size'] + len(appended))
+
+
+def _cad_file(path):
+    """Describe the contents of a close approach JSON file.
+
+    :param path: A path to a JSON file containing data about close approaches.
+    :return: A dictionary of the file's `stat`, its field names, and the length
+             and a hash of the text of its `data` rows - or None for the latter
+             three, if the rows can't be found.
+    """
+    stat = _stat(path)
+    with open(path, 'rb') as file, _mapped(file) as data:
+        fields, start, end = _cad_extent(data)
+        digest = hashlib.sha256()
+        if fields is not None:
+            with memoryview(data) as view:
+                digest.update(view[start:end])
+    return {'stat': stat, 'fields': fields, 'length': end - start, 'digest': digest}
+
+
+def _appended_approaches(path, old):
+    """Parse the close approaches appended to a JSON file since it was described by `_cad_file`.
+
+    :param path: A path to a JSON file containing data about close approaches.
+    :param old: The file's description, from `_cad_file`.
+    :return: A tuple of a list of the new (unlinked) `CloseApproach`es and the
+             file's new description, or None if the old rows have changed.
+    """
+    if old['fields'] is None:
+        return None
+    stat = _stat(path)
+    with open(path, 'rb') as file, _mapped(file) as data:
+        fields, start, end = _cad_extent(data)
+        if fields != old['fields'] or end - start < old['length']:
+            return None
+        digest = hashlib.sha256()
+        with memoryview(data) as view:
+            digest.update(view[start:start + old['length']])
+            if digest.digest() != old['digest'].digest():
+                return None
+            digest.update(view[start + old['length']:end])
+        appended = data[start + old['length']:end].strip()
+
+    if old['length'] and appended:
+        # The new rows follow the old ones, after a separating comma.
+        if not appended.startswith(b','):
+            return None
+        appended = appended[1:]
+    rows = json.loads(b'[' + appended + b']')
+    new = {'stat': stat, 'fields': fields, 'length': end - start, 'digest': digest}
+    return list(approaches_from_rows(fields, rows)), new
+
+
+def _cad_extent(data):
+    """Find the field names and the byte range of the `data` rows of a close approach JSON file.
+
+    :param data: The contents of the file, as a bytes-like object.
+    :return: A tuple of the list of field names and the start and end offsets of
+             the text of the rows (without the array's brackets), or of None, 0, 0
+             if either can't be found.
+    """
+    fields = _CAD_FIELDS.search(data)
+    array = _CAD_DATA.search(data)
+    if fields is None or array is None:
+        return None, 0, 0
+    start = array.end()
+    if _CAD_NO_DATA.match(data, start):
+        return json.loads(fields.group(1)), start, start
+    end = _CAD_DATA_END.search(data, start)
+    if end is None:
+        return None, 0, 0
+    return json.loads(fields.group(1)), start, end.start() + 1
+
+
+class _mapped:
+    """Map a file into memory read-only, for as long as a `with` block lasts."""
+    def __init__(self, file):
+        self.file = file
+        self.data = None
+
+    def __enter__(self):
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file can't be mapped.
+            return b''
+        return self.data
+
+    def __exit__(self, *exc_info):
+        if self.data is not None:
+            self.data.close()
+
+
+def _extend(database, neos, approaches, lock):
+    """Add some more NEOs and close approaches to a database, in place.
+
+    The new records are checked before the database is touched, and then added
+    while holding `lock`, so that a command never sees only some of them, and
+    a bad batch leaves the database as it was.
+
+    :param database: An `NEODatabase` or `ColumnarNEODatabase`.
+    :param neos: A list of new `NearEarthObject`s.
+    :param approaches: A list of new, unlinked `CloseApproach`es.
+    :param lock: The lock that commands hold while they use the database.
+    :return: Whether there was anything to add.
+    :raises ValueError: If a new NEO is already in the database, or a new close approach's NEO is unknown.
+    """
+    if not neos and not approaches:
+        return False
+    designations = {neo.designation for neo in neos}
+    for approach in approaches:
+        if approach._designation not in designations and \
+                database.get_neo_by_designation(approach._designation) is None:
+            raise ValueError(f"No NEO with designation {approach._designation!r} is in the database.")
+    with lock:
+        database.add_neos(neos)
+        database.add_approaches(approaches)
+    return True
@@ -5,7 +5,7 @@ See `README.md` for a detailed discussion of this project.
 
 This script can be invoked from the command line::
 
-    $ python3 main.py {inspect,query,interactive} [args]
+    $ python3 main.py {inspect,query,stats,interactive} [args]
 
 The `inspect` subcommand looks up an NEO by name or by primary designation, and
 optionally lists all of that NEO's known close approaches:
@@ -28,13 +28,60 @@ or JSON format:
 
     $ python3 main.py query --limit 5 --outfile results.csv
     $ python3 main.py query --limit 15 --outfile results.json
+    $ python3 main.py query --compact --outfile results.json
+
+Results can also be saved as newline-delimited JSON (`.ndjson`) and, if the
+`pyarrow` package is installed, as Parquet (`.parquet`) or Arrow IPC (`.arrow`)
+files of typed columns:
+
+    $ python3 main.py query --start-date 2020-01-01 --outfile results.parquet
+
+The matches can be sorted by time, distance, velocity or diameter, in increasing
+order or (with `--desc`) decreasing order. With `--limit`, only the first few
+are kept while sorting:
+
+    $ python3 main.py query --start-date 2020-01-01 --order-by distance --limit 20
+    $ python3 main.py query --hazardous --order-by velocity --desc --limit 50
+
+The `stats` subcommand takes the same filters as `query`, but rather than list
+the matching close approaches, it counts them and summarizes their distances and
+velocities - overall, or per year, month and/or hazardous flag:
+
+    $ python3 main.py stats --start-date 2020-01-01 --max-distance 0.05
+    $ python3 main.py stats --group-by year hazardous
+
+To see how the filters will be evaluated - in which order, and with what
+estimated selectivity - add `--explain`:
+
+    $ python3 main.py query --start-date 2020-01-01 --hazardous --max-distance 0.05 --explain
 
 The `interactive` subcommand loads the NEO database and spawns an interactive
 command shell that can repeatedly execute `inspect` and `query` commands without
-having to wait to reload the database each time. However, it doesn't hot-reload.
+having to wait to reload the database each time. It doesn't hot-reload changes
+to the code, but it does watch the data files: when either changes, the shell
+loads it again in the background and switches over once it's done - and if the
+data files were only appended to, only the new records are loaded. Use
+`--no-reload` to keep the data loaded at startup instead.
+The shell keeps the matches of its recent queries, so that repeating a query or
+narrowing it with more filters doesn't search the whole database again; its
+`cache` command shows how often that happened, and `cache clear` empties it.
 
 If needed, the script can load data from data files other than the default with
 `--neofile` or `--cadfile`.
+
+The data files are parsed once and then cached in a snapshot file (by default,
+`data/snapshot.bin`) that later runs load instead, for as long as the data
+files are unchanged. Use `--snapshot` to move the snapshot elsewhere, or
+`--no-snapshot` to always parse the data files. When the data files do have to
+be parsed, `--workers` spreads the work across several processes:
+
+    $ python3 main.py --no-snapshot --workers 8 query --date 2020-03-14
+
+By default, close approaches are held in memory as individual objects. With
+`--engine columnar`, they are instead held in typed columns and filtered by
+whole columns at a time, which uses far less memory on the full data set:
+
+    $ python3 main.py --engine columnar query --start-date 2020-01-01 --hazardous
 """
 import argparse
 import cmd
@@ -44,10 +91,14 @@ import shlex
 import sys
 import time
 
-from extract import load_neos, load_approaches
-from database import NEODatabase
-from filters import create_filters, limit
-from write import write_to_csv, write_to_json
+from aggregate import GROUPINGS, check_grouping
+from database import NEODatabase, ORDER_KEYS
+from columnar import ColumnarNEODatabase
+from filters import create_filters
+from hotreload import Reloader
+from querycache import QueryCache
+from snapshot import load_database
+from write import WRITERS, write_to_csv, write_to_json, write_to_ndjson
 
 
 # Paths to the root of the project and the `data` subfolder.
@@ -57,6 +108,12 @@ DATA_ROOT = PROJECT_ROOT / 'data'
 # The current time, for use with the kill-on-change feature of the interactive shell.
 _START = time.time()
 
+# The database engines that can hold the extracted data, by `--engine` choice.
+ENGINES = {
+    'objects': NEODatabase,
+    'columnar': ColumnarNEODatabase,
+}
+
 
 def date_fromisoformat(date_string):
     """Return a `datetime.date` corresponding to a string in YYYY-MM-DD format.
@@ -73,6 +130,36 @@ def date_fromisoformat(date_string):
         raise argparse.ArgumentTypeError(f"'{date_string}' is not a valid date. Use YYYY-MM-DD.")
 
 
+def nonnegative_int(count_string):
+    """Return the integer in a string, which must not be negative.
+
+    :param count_string: A count, such as the maximum number of matches to return.
+    :return: The count, as an `int`.
+    """
+    try:
+        count = int(count_string)
+    except ValueError:
+        count = -1
+    if count < 0:
+        raise argparse.ArgumentTypeError(f"'{count_string}' is not a non-negative integer.")
+    return count
+
+
+def positive_int(count_string):
+    """Return the integer in a string, which must be positive.
+
+    :param count_string: A count, such as the number of processes to parse the data files with.
+    :return: The count, as an `int`.
+    """
+    try:
+        count = int(count_string)
+    except ValueError:
+        count = 0
+    if count < 1:
+        raise argparse.ArgumentTypeError(f"'{count_string}' is not a positive integer.")
+    return count
+
+
 def make_parser():
     """Create an ArgumentParser for this script.
 
@@ -89,6 +176,18 @@ def make_parser():
     parser.add_argument('--cadfile', default=(DATA_ROOT / 'cad.json'),
                         type=pathlib.Path,
                         help="Path to JSON file of close approach data.")
+    parser.add_argument('--snapshot', default=(DATA_ROOT / 'snapshot.bin'),
+                        type=pathlib.Path,
+                        help="Path to a snapshot of the parsed data files, "
+                             "rebuilt whenever the data files change.")
+    parser.add_argument('--no-snapshot', dest='snapshot', action='store_const', const=None,
+                        help="Always parse the data files, without reading or writing a snapshot.")
+    parser.add_argument('-w', '--workers', type=positive_int, default=1,
+                        help="How many processes to parse the data files with, "
+                             "when they can't be loaded from a snapshot.")
+    parser.add_argument('--engine', choices=tuple(ENGINES), default='objects',
+                        help="How to hold close approaches in memory: as individual objects, "
+                             "or in typed columns that are filtered a column at a time.")
     subparsers = parser.add_subparsers(dest='cmd')
 
     # Add the `inspect` subcommand parser.
@@ -102,13 +201,11 @@ def make_parser():
     inspect_id.add_argument('-n', '--name',
                             help="The IAU name of the NEO to inspect (e.g. 'Halley').")
 
-    # Add the `query` subcommand parser.
-    query = subparsers.add_parser('query',
-                                  description="Query for close approaches that "
-                                              "match a collection of filters.")
-    filters = query.add_argument_group('Filters',
-                                       description="Filter close approaches by their attributes "
-                                                   "or the attributes of their NEOs.")
+    # Add the filters shared by the `query` and `stats` subcommand parsers.
+    filtering = argparse.ArgumentParser(add_help=False)
+    filters = filtering.add_argument_group('Filters',
+                                           description="Filter close approaches by their attributes "
+                                                       "or the attributes of their NEOs.")
     filters.add_argument('-d', '--date', type=date_fromisoformat,
                          help="Only return close approaches on the given date, "
                               "in YYYY-MM-DD format (e.g. 2020-12-31).")
@@ -144,18 +241,46 @@ def make_parser():
     filters.add_argument('--not-hazardous', dest='hazardous', default=None, action='store_false',
                          help="If specified, only return close approaches of NEOs that "
                               "are not potentially hazardous.")
-    query.add_argument('-l', '--limit', type=int,
+
+    # Add the `query` subcommand parser.
+    query = subparsers.add_parser('query', parents=[filtering],
+                                  description="Query for close approaches that "
+                                              "match a collection of filters.")
+    query.add_argument('-l', '--limit', type=nonnegative_int,
                        help="The maximum number of matches to return. "
                             "Defaults to 10 if no --outfile is given.")
     query.add_argument('-o', '--outfile', type=pathlib.Path,
-                       help="File in which to save structured results. "
+                       help="File in which to save structured results, in the format given "
+                            f"by its extension ({', '.join(WRITERS)}). "
                             "If omitted, results are printed to standard output.")
+    query.add_argument('--compact', action='store_true',
+                       help="If specified with a .json --outfile, write the JSON without "
+                            "indentation or spaces.")
+    query.add_argument('--order-by', choices=tuple(ORDER_KEYS),
+                       help="Sort the matches by the given attribute, rather than returning "
+                            "them in the database's internal order.")
+    query.add_argument('--desc', action='store_true',
+                       help="If specified with --order-by, sort the matches from the largest "
+                            "attribute to the smallest.")
+    query.add_argument('--explain', action='store_true',
+                       help="If specified, print how the filters will be evaluated "
+                            "before the results.")
+
+    # Add the `stats` subcommand parser.
+    stats = subparsers.add_parser('stats', parents=[filtering],
+                                  description="Summarize the close approaches that "
+                                              "match a collection of filters.")
+    stats.add_argument('-g', '--group-by', nargs='+', choices=GROUPINGS, default=(),
+                       help="Summarize the matches separately for each year, month "
+                            "and/or hazardous flag.")
 
     repl = subparsers.add_parser('interactive',
                                  description="Start an interactive command session "
                                              "to repeatedly run `interact` and `query` commands.")
     repl.add_argument('-a', '--aggressive', action='store_true',
                       help="If specified, kill the session whenever a project file is modified.")
+    repl.add_argument('--no-reload', dest='reload', action='store_false',
+                      help="Don't reload the data files when they change during the session.")
     return parser, inspect, query
 
 
@@ -195,7 +320,7 @@ def inspect(database, pdes=None, name=None, verbose=False):
     return neo
 
 
-def query(database, args):
+def query(database, args, cache=False):
     """Perform the `query` subcommand.
 
     Create a collection of filters with `create_filters` and supply them to the
@@ -208,30 +333,75 @@ def query(database, args):
 
     :param database: The `NEODatabase` containing data on NEOs and their close approaches.
     :param args: All arguments from the command line, as parsed by the top-level parser.
+    :param cache: Whether to keep the rendered results for later exports (see `write`).
     """
     # Construct a collection of filters from arguments supplied at the command line.
-    filters = create_filters(
+    filters = filters_from_args(args)
+    if args.explain:
+        print(database.plan(filters))
+
+    # Query the database with the collection of filters, limiting to 10 entries
+    # if not specified and the results are written to stdout.
+    count = args.limit if args.outfile else (args.limit or 10)
+    results = database.query(filters, order_by=args.order_by, descending=args.desc, limit=count)
+
+    if not args.outfile:
+        # Write the results to stdout.
+        for result in results:
+            print(result)
+    else:
+        # Write the results to a file, in the format given by its extension.
+        writer = WRITERS.get(args.outfile.suffix)
+        if writer is None:
+            extensions = ', '.join(f"`{extension}`" for extension in WRITERS)
+            print(f"Please use an output file that ends with one of {extensions}.", file=sys.stderr)
+        elif writer is write_to_json:
+            write_to_json(results, args.outfile, indent=None if args.compact else 4, cache=cache)
+        elif writer in (write_to_csv, write_to_ndjson):
+            writer(results, args.outfile, cache=cache)
+        else:
+            writer(results, args.outfile)
+
+
+def stats(database, args):
+    """Perform the `stats` subcommand.
+
+    Create a collection of filters with `create_filters`, and print a table of
+    the number of matching close approaches, and the range and mean of their
+    distances and velocities - overall, or for each group of them.
+
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    """
+    group_by = check_grouping(args.group_by)
+    summaries = database.summarize(filters_from_args(args), group_by)
+
+    headings = [*group_by, 'count', 'min au', 'max au', 'mean au',
+                'min km/s', 'max km/s', 'mean km/s']
+    print(' '.join(f"{heading:>9}" for heading in headings))
+    for key, summary in summaries.items():
+        cells = [f"{value!s:>9}" for value in key] + [f"{summary.count:>9,}"]
+        if summary.count:
+            cells += [f"{value:>9.4f}" for value in (
+                summary.distance_min, summary.distance_max, summary.distance_mean)]
+            cells += [f"{value:>9.2f}" for value in (
+                summary.velocity_min, summary.velocity_max, summary.velocity_mean)]
+        print(' '.join(cells))
+
+
+def filters_from_args(args):
+    """Create a collection of filters from the arguments of the `query` or `stats` subcommands.
+
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    :return: A collection of filters, as returned by `create_filters`.
+    """
+    return create_filters(
         date=args.date, start_date=args.start_date, end_date=args.end_date,
         distance_min=args.distance_min, distance_max=args.distance_max,
         velocity_min=args.velocity_min, velocity_max=args.velocity_max,
         diameter_min=args.diameter_min, diameter_max=args.diameter_max,
         hazardous=args.hazardous
     )
-    # Query the database with the collection of filters.
-    results = database.query(filters)
-
-    if not args.outfile:
-        # Write the results to stdout, limiting to 10 entries if not specified.
-        for result in limit(results, args.limit or 10):
-            print(result)
-    else:
-        # Write the results to a file.
-        if args.outfile.suffix == '.csv':
-            write_to_csv(limit(results, args.limit), args.outfile)
-        elif args.outfile.suffix == '.json':
-            write_to_json(limit(results, args.limit), args.outfile)
-        else:
-            print("Please use an output file that ends with `.csv` or `.json`.", file=sys.stderr)
 
 
 class NEOShell(cmd.Cmd):
@@ -250,7 +420,8 @@ class NEOShell(cmd.Cmd):
              "Type `help` or `?` to list commands and `exit` to exit.\n")
     prompt = '(neo) '
 
-    def __init__(self, database, inspect_parser, query_parser, aggressive=False, **kwargs):
+    def __init__(self, database, inspect_parser, query_parser, aggressive=False, reloader=None,
+                 **kwargs):
         """Create a new `NEOShell`.
 
         Creating this object doesn't start the session - for that, use `.cmdloop()`.
@@ -259,13 +430,16 @@ class NEOShell(cmd.Cmd):
         :param inspect_parser: The subparser for the `inspect` subcommand.
         :param query_parser: The subparser for the `query` subcommand.
         :param aggressive: Whether to kill the session whenever a project file is changed.
+        :param reloader: A `hotreload.Reloader` watching the data files, or None to never reload them.
         :param kwargs: A dictionary of excess keyword arguments passed to the superclass.
         """
         super().__init__(**kwargs)
         self.db = database
+        self.results = QueryCache(database)
         self.inspect = inspect_parser
         self.query = query_parser
         self.aggressive = aggressive
+        self.reloader = reloader
 
     @classmethod
     def parse_arg_with(cls, arg, parser):
@@ -339,6 +513,11 @@ class NEOShell(cmd.Cmd):
 
             (neo) query --limit 2
 
+        The results can be sorted by an attribute with `--order-by`, and in
+        decreasing order with `--desc`:
+
+            (neo) query --hazardous --order-by velocity --desc --limit 5
+
         The results can be saved to a file (instead of displayed to stdout) with
         `--outfile`:
 
@@ -349,8 +528,28 @@ class NEOShell(cmd.Cmd):
         if not args:
             return
 
-        # Run the `inspect` subcommand.
-        query(self.db, args)
+        # Run the `query` subcommand, keeping the matches and the exported results'
+        # renderings for next time.
+        query(self.results, args, cache=True)
+
+    def do_cache(self, arg):
+        """Show how often queries were answered from the cache of recent queries.
+
+        A query that was run before is a hit, and a query that only adds to, or
+        tightens, the filters of a cached query is a refinement:
+
+            (neo) cache
+
+        To forget every cached query:
+
+            (neo) cache clear
+        """
+        if arg.strip() == 'clear':
+            self.results.clear()
+        elif arg.strip():
+            print("Usage: cache [clear]", file=sys.stderr)
+            return
+        print(self.results)
 
     def do_EOF(self, _arg):
         """Exit the interactive session."""
@@ -360,6 +559,25 @@ class NEOShell(cmd.Cmd):
     do_exit = do_EOF
     do_quit = do_EOF
 
+    def onecmd(self, line):
+        """Run a command, holding the database still while it runs.
+
+        The data files are checked on first: new records are only ever added
+        to the database in use while the reloader's lock isn't held.
+        """
+        if self.reloader is None:
+            return super().onecmd(line)
+        with self.reloader.lock:
+            reloaded = self.reloader.poll(self.db)
+            if reloaded is not None:
+                database, message = reloaded
+                if database is not None:
+                    # Either a new database or new records; the cached matches are out of date.
+                    self.db = database
+                    self.results = QueryCache(database)
+                print(message, file=sys.stderr)
+            return super().onecmd(line)
+
     def precmd(self, line):
         """Watch for changes to the files in this project."""
         changed = [f for f in PROJECT_ROOT.glob('*.py') if f.stat().st_mtime > _START]
@@ -382,15 +600,21 @@ def main():
     args = parser.parse_args()
 
     # Extract data from the data files into structured Python objects.
-    database = NEODatabase(load_neos(args.neofile), load_approaches(args.cadfile))
+    database = load_database(args.neofile, args.cadfile, ENGINES[args.engine], args.snapshot,
+                             workers=args.workers)
 
     # Run the chosen subcommand.
     if args.cmd == 'inspect':
         inspect(database, pdes=args.pdes, name=args.name, verbose=args.verbose)
     elif args.cmd == 'query':
         query(database, args)
+    elif args.cmd == 'stats':
+        stats(database, args)
     elif args.cmd == 'interactive':
-        NEOShell(database, inspect_parser, query_parser, aggressive=args.aggressive).cmdloop()
+        reloader = Reloader(args.neofile, args.cadfile, ENGINES[args.engine], args.snapshot,
+                            workers=args.workers) if args.reload else None
+        NEOShell(database, inspect_parser, query_parser, aggressive=args.aggressive,
+                 reloader=reloader).cmdloop()
 
 
 if __name__ == '__main__':
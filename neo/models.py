@@ -17,7 +17,12 @@ quirks of the data set, such as missing names and unknown diameters.
 
 You'll edit this file in Task 1.
 """
-from helpers import cd_to_datetime, datetime_to_str
+import datetime
+import operator
+import sys
+
+from helpers import (cd_to_datetime, cd_to_minutes, datetime_to_minutes, datetime_to_str,
+                     minutes_to_datetime, minutes_to_str)
 
 
 class NearEarthObject:
@@ -29,25 +34,33 @@ class NearEarthObject:
     potentially hazardous to Earth.
 
     A `NearEarthObject` also maintains a collection of its close approaches -
-    initialized to an empty collection, but eventually populated in the
+    initialized to an empty list, but eventually populated in the
     `NEODatabase` constructor.
+
+    There is one `NearEarthObject` per NEO in the data set, so its attributes
+    are held in slots rather than a per-instance `__dict__`, and its designation
+    is interned to be shared with the designations of its close approaches.
     """
+    __slots__ = ('designation', 'name', 'diameter', 'hazardous', 'approaches')
+
     def __init__(self, designation:str, hazardous:bool,
                  name:str=None, diameter:float=float('nan'),
-                 approaches=set()):
-        
-
+                 approaches=None):
         """Create a new `NearEarthObject`.
 
-        :param info: A dictionary of excess keyword arguments supplied to the constructor.
+        :param designation: The primary designation of the NEO.
+        :param hazardous: Whether NASA marks the NEO as potentially hazardous.
+        :param name: The IAU name of the NEO, if it has one.
+        :param diameter: The diameter of the NEO in kilometers, if known.
+        :param approaches: The close approaches of the NEO, if already known.
         """
         # Assign information from the arguments passed to the constructor
         # onto attributes named `designation`, `name`, `diameter`, and `hazardous`.
-        self.designation = designation
+        self.designation = sys.intern(designation)
         self.name = name if name else None
         self.diameter = float(diameter) if diameter else float('nan')
         self.hazardous = hazardous
-        self.approaches = approaches
+        self.approaches = list(approaches) if approaches else []
 
     def serialize(self):
         return {
@@ -64,8 +77,8 @@ class NearEarthObject:
 
     def __str__(self):
         """Return `str(self)`."""
-        return f"A NearEarthObject {self.fullname} has a diameter of {self.diameter:.3f} km
-                and is {'potentially hazardous' if self.hazardous else 'not potentially hazardous'}."
+        return f"A NearEarthObject {self.fullname} has a diameter of {self.diameter:.3f} km " \
+               f"and is {'potentially hazardous' if self.hazardous else 'not potentially hazardous'}."
 
     def __repr__(self):
         """Return `repr(self)`, a computer-readable string representation of this object."""
@@ -85,30 +98,109 @@ class CloseApproach:
     initially, this information (the NEO's primary designation) is saved in a
     private attribute, but the referenced NEO is eventually replaced in the
     `NEODatabase` constructor.
+
+    The time is kept exactly as it was extracted from the data file, and only
+    decoded (and cached) the first time it is accessed - most close approaches
+    are only ever looked at by a filter, if at all. Filters on the date can use
+    `time_key`, which is cheaper to decode than the full `time`.
+
+    There are hundreds of thousands of close approaches in the data set, so their
+    attributes are held in slots rather than a per-instance `__dict__`.
+
+    An approach that's written out again and again - say, by overlapping exports
+    in an interactive session - can keep its rendering in each format (see `render`).
     """
+    __slots__ = ('_designation', '_time', '_time_key', 'distance', 'velocity', 'neo', '_rendered')
+
     def __init__(self, time, distance, velocity, designation=None, neo=None):
         """Create a new `CloseApproach`.
 
-        :param info: A dictionary of excess keyword arguments supplied to the constructor.
+        :param time: The approach time, as a NASA-formatted calendar date, a naive `datetime`,
+                     or a whole number of minutes since 0001-01-01 (see `time_key`).
+        :param distance: The nominal approach distance in astronomical units, as a string or float.
+        :param velocity: The relative approach velocity in km/s, as a string or float.
+        :param designation: The primary designation of the approaching NEO.
+        :param neo: The approaching `NearEarthObject`, if already known.
         """
         # Assign information from the arguments passed to the constructor
-        # onto attributes named `_designation`, `time`, `distance`, and `velocity`.
-        self._designation = designation 
-        self.time = cd_to_datetime(time)  # Use the cd_to_datetime function for this attribute.
+        # onto attributes named `_designation`, `distance`, and `velocity`, and
+        # keep the raw time for the `time` and `time_key` properties to decode.
+        self._designation = sys.intern(designation) if designation is not None else None
+        self._time = time
+        self._time_key = time if isinstance(time, int) else None
+        # Converting these eagerly is cheap, and a float is much smaller than its string.
         self.distance = float(distance)
         self.velocity = float(velocity)
 
         # Create an attribute for the referenced NEO, originally None.
         self.neo = neo
+        self._rendered = None
+
+    @property
+    def time(self):
+        """Return the approach time as a naive `datetime`, decoding it on first access."""
+        time = self._time
+        if isinstance(time, int):
+            time = self._time = minutes_to_datetime(time)
+        elif not isinstance(time, datetime.datetime):
+            # Use the cd_to_datetime function for this attribute.
+            time = self._time = cd_to_datetime(time)
+        return time
+
+    @property
+    def time_key(self):
+        """Return the approach time as a whole number of minutes since 0001-01-01.
+
+        The key orders and compares exactly like `time`, but is an integer that
+        can be decoded straight from the calendar date without a `datetime`.
+        """
+        key = self._time_key
+        if key is None:
+            time = self._time
+            if isinstance(time, datetime.datetime):
+                key = datetime_to_minutes(time)
+            else:
+                # The key holds everything the calendar date did, so drop the string.
+                key = self._time = cd_to_minutes(time)
+            self._time_key = key
+        return key
 
     def serialize(self):
         return {
-            'datetime_utc': self.time.strftime('%Y-%m-%d %H:%M'),
+            'datetime_utc': minutes_to_str(self.time_key),
             'distance_au': self.distance,
             'velocity_km_s': self.velocity,
             'neo': self.neo.serialize() if self.neo else None
         }
 
+    def render(self, form, renderer):
+        """Render this `CloseApproach` in an output format, reusing an earlier rendering if possible.
+
+        One rendering per format is kept, along with the attributes - of this
+        approach and of its NEO - that they were all rendered from. A rendering
+        is reused for as long as none of those attributes has been reassigned
+        since; otherwise, every format's rendering is dropped and the approach is
+        rendered again.
+
+        :param form: A hashable name for the output format, such as 'csv'.
+        :param renderer: A function that renders a `CloseApproach` in that format.
+        :return: The rendering of this approach, as returned by `renderer`.
+        """
+        neo = self.neo
+        state = (self.time_key, self.distance, self.velocity, neo)
+        if neo is not None:
+            state += (neo.designation, neo.name, neo.diameter, neo.hazardous)
+        rendered = self._rendered
+        # Compare by identity: it's cheaper, and an unknown diameter is NaN, which isn't equal to itself.
+        if rendered is None or len(rendered[0]) != len(state) \
+                or not all(map(operator.is_, rendered[0], state)):
+            rendered = self._rendered = (state, {})
+        renderings = rendered[1]
+        rendering = renderings.get(form)
+        if rendering is None:
+            rendering = renderings[form] = renderer(self)
+        return rendering
+
     @property
     def time_str(self):
         """Return a formatted representation of this `CloseApproach`'s approach time.
@@ -127,12 +219,12 @@ class CloseApproach:
 
     def __str__(self):
         """Return `str(self)`."""
-        return f"A CloseApproach of {self.neo.fullname if self.neo else self._designation} 
-                at {self.time_str} has a distance of {self.distance:.2f} au 
-                and a velocity of {self.velocity:.2f} km/s."
+        return f"A CloseApproach of {self.neo.fullname if self.neo else self._designation} " \
+               f"at {self.time_str} has a distance of {self.distance:.2f} au " \
+               f"and a velocity of {self.velocity:.2f} km/s."
 
     def __repr__(self):
         """Return `repr(self)`, a computer-readable string representation of this object."""
-        return f"CloseApproach(designation={self._designation!r}, 
-                time={self.time_str!r}, distance={self.distance:.2f}, 
-                velocity={self.velocity:.2f}, neo={self.neo!r})"
+        return f"CloseApproach(designation={self._designation!r}, " \
+               f"time={self.time_str!r}, distance={self.distance:.2f}, " \
+               f"velocity={self.velocity:.2f}, neo={self.neo!r})"
@@ -0,0 +1,115 @@
+"""Extract the data files in parallel, across a pool of worker processes.
+
+The NEO CSV file and the close approach JSON file are independent, so they can
+be parsed at the same time - and the `data` rows of the JSON file can be split
+into byte ranges (see `extract.split_cad`) that are parsed at the same time too.
+
+Rather than shipping `NearEarthObject` and `CloseApproach` objects back from
+the workers, which would be slow to pickle and unpickle, every worker returns
+plain columns: lists of strings and typed `array.array`s of numbers, which
+pickle as little more than their raw bytes. The main process then only has to
+concatenate the columns and look up each approach's NEO.
+
+The main module parses the data files this way when run with `--workers N` for
+some N greater than 1.
+"""
+import array
+import concurrent.futures
+
+from columnar import ApproachColumns, neos_from_columns, neos_to_columns
+from extract import load_neos, iter_approaches, iter_cad_shard, split_cad
+from helpers import cds_to_minutes
+
+
+def load_columns(neo_csv_path, cad_json_path, workers):
+    """Extract NEOs and the columns of their close approaches, in parallel.
+
+    The JSON file is split into one byte range per worker, and the NEO file is
+    parsed alongside them. If the JSON file can't be split - when its `fields`
+    header comes after its `data` rows - it is parsed whole by a single worker.
+    So it is, too, if the byte ranges turn out not to hold exactly the `count`
+    rows that the file's header promises, or to hold something that isn't a row
+    (see `extract.split_cad`).
+
+    :param neo_csv_path: A path to a CSV file containing data about near-Earth objects.
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :param workers: How many worker processes to parse the files with.
+    :return: A tuple of a list of `NearEarthObject`s and an `ApproachColumns` of their approaches.
+    """
+    split = split_cad(cad_json_path, workers)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        neo_future = pool.submit(_load_neo_columns, neo_csv_path)
+        if split is None:
+            shards = [pool.submit(_load_cad_columns, cad_json_path).result()]
+        else:
+            fields, count, ranges = split
+            shard_futures = [pool.submit(_load_cad_shard_columns, cad_json_path, fields, start, stop)
+                             for start, stop in ranges]
+            try:
+                shards = [future.result() for future in shard_futures]
+            except (ValueError, IndexError, TypeError):
+                # A range was cut within a row, and began with something that isn't one.
+                shards = None
+            if shards is None or \
+                    count is not None and sum(len(shard['times']) for shard in shards) != count:
+                shards = [pool.submit(_load_cad_columns, cad_json_path).result()]
+
+        neos = neos_from_columns(neo_future.result())
+        designation_to_index = {neo.designation: index for index, neo in enumerate(neos)}
+        diameters = [neo.diameter for neo in neos]
+        hazardous = [neo.hazardous for neo in neos]
+
+        columns = ApproachColumns()
+        for shard in shards:
+            indices = array.array('l', map(designation_to_index.__getitem__, shard['designations']))
+            columns.times.extend(shard['times'])
+            columns.distances.extend(shard['distances'])
+            columns.velocities.extend(shard['velocities'])
+            columns.neo_indices.extend(indices)
+            columns.diameters.extend(map(diameters.__getitem__, indices))
+            columns.hazardous.extend(map(hazardous.__getitem__, indices))
+    return neos, columns
+
+
+def _load_neo_columns(neo_csv_path):
+    """Parse the NEO file, in a worker process."""
+    return neos_to_columns(load_neos(neo_csv_path))
+
+
+def _load_cad_shard_columns(cad_json_path, fields, start, stop):
+    """Parse the close approaches that begin in a byte range of the JSON file, in a worker process."""
+    des_index = fields.index('des')
+    cd_index = fields.index('cd')
+    dist_index = fields.index('dist')
+    v_rel_index = fields.index('v_rel')
+    designations, calendar_dates = [], []
+    distances, velocities = array.array('d'), array.array('d')
+    for row in iter_cad_shard(cad_json_path, start, stop):
+        designations.append(row[des_index])
+        calendar_dates.append(row[cd_index])
+        distances.append(float(row[dist_index]))
+        velocities.append(float(row[v_rel_index]))
+    return {
+        'designations': designations,
+        'times': cds_to_minutes(calendar_dates),
+        'distances': distances,
+        'velocities': velocities,
+    }
+
+
+def _load_cad_columns(cad_json_path):
+    """Parse the whole JSON file, in a worker process."""
+    designations = []
+    times = array.array('q')
+    distances, velocities = array.array('d'), array.array('d')
+    for approach in iter_approaches(cad_json_path):
+        designations.append(approach._designation)
+        times.append(approach.time_key)
+        distances.append(approach.distance)
+        velocities.append(approach.velocity)
+    return {
+        'designations': designations,
+        'times': times,
+        'distances': distances,
+        'velocities': velocities,
+    }
@@ -0,0 +1,340 @@
+"""Plan the evaluation of a query's filters over a database's close approaches.
+
+`create_filters` appends one filter per command-line option, in a fixed order,
+and a database that evaluates them in that order can waste most of its time:
+the first filters may match almost everything, and the filters on the NEO
+(`DiameterFilter` and `HazardousFilter`) have to follow a reference from every
+approach. The planner instead:
+
+- merges the lower and upper bounds on each attribute (say, `--min-distance`
+  and `--max-distance`) into a single `RangeFilter`, and notices when they
+  contradict each other, in which case nothing can match;
+- hands the date range to the database's time index, the bounds on the NEOs'
+  attributes to its NEO indexes, or the bounds on several attributes at once
+  to its range index - whichever is estimated to yield the fewest candidate
+  approaches;
+- estimates the fraction of approaches that each remaining filter lets through
+  (its selectivity) from a sorted sample of each attribute, gathered once when
+  the database is built and updated with each batch of approaches added to or
+  removed from it; and
+- orders the filters so that the cheapest and most selective ones run first,
+  and the rest are skipped for most approaches.
+
+A `QueryPlan` prints as a summary of these choices, which the main module shows
+with `query --explain`.
+"""
+import bisect
+import math
+from operator import eq, ge, le
+
+from filters import AttributeFilter, BoxFilter, DateFilter, DistanceFilter, VelocityFilter, \
+    DiameterFilter, HazardousFilter, RangeFilter
+
+
+# The filter classes whose attributes are sampled for statistics.
+FILTER_KINDS = (DateFilter, DistanceFilter, VelocityFilter, DiameterFilter, HazardousFilter)
+
+# How many close approaches to sample when gathering statistics.
+SAMPLE_SIZE = 4096
+
+# The selectivity assumed for filters that the statistics can't estimate.
+DEFAULT_SELECTIVITY = 0.5
+
+
+class ColumnStatistics:
+    """A sorted sample of the values of one attribute of the close approaches.
+
+    The sample is stored as the `key`s of its filter class, so that the bounds
+    of a filter can be bisected into it directly. Missing values (NaN) never
+    match a bound, so they count towards the size of the sample but aren't kept.
+
+    One in every `stride` approaches is sampled. Approaches added to or removed
+    from the database later are sampled at the same rate (see `add` and
+    `remove`), so the sample keeps describing the database without being
+    gathered again.
+    """
+    def __init__(self, keys, stride=1):
+        """Create a new `ColumnStatistics` from a sample of keys.
+
+        :param keys: An iterable of the sampled approaches' keys for one filter class.
+        :param stride: How many approaches each sampled key stands for.
+        """
+        keys = list(keys)
+        self.count = len(keys)
+        self.keys = sorted(key for key in keys if key == key)
+        self.stride = stride
+        # How many approaches have been added, and removed, since the sample was gathered.
+        self._added = self._removed = 0
+
+    def add(self, approaches, key):
+        """Sample a batch of close approaches added to the database.
+
+        :param approaches: A sequence of the added `CloseApproach`es.
+        :param key: The `key` of this attribute's filter class.
+        """
+        for value in map(key, approaches[-self._added % self.stride::self.stride]):
+            self.count += 1
+            if value == value:
+                bisect.insort(self.keys, value)
+        self._added += len(approaches)
+
+    def remove(self, approaches, key):
+        """Unsample a batch of close approaches removed from the database.
+
+        The removed approaches were probably not sampled themselves, so for one
+        in every `stride` of them, the closest sampled key is dropped instead.
+
+        :param approaches: A sequence of the removed `CloseApproach`es.
+        :param key: The `key` of this attribute's filter class.
+        """
+        for value in map(key, approaches[-self._removed % self.stride::self.stride]):
+            if not self.count:
+                break
+            self.count -= 1
+            if value == value and self.keys:
+                position = bisect.bisect_left(self.keys, value)
+                if position == len(self.keys) or \
+                        position and value - self.keys[position - 1] < self.keys[position] - value:
+                    position -= 1
+                del self.keys[position]
+        self._removed += len(approaches)
+
+    def selectivity(self, low=-math.inf, high=math.inf):
+        """Estimate the fraction of approaches whose key lies within inclusive bounds.
+
+        :param low: The smallest matching key.
+        :param high: The largest matching key.
+        :return: The estimated fraction, between 0 and 1.
+        """
+        if not self.count:
+            return DEFAULT_SELECTIVITY
+        matches = bisect.bisect_right(self.keys, high) - bisect.bisect_left(self.keys, low)
+        return max(matches, 0) / self.count
+
+
+def gather_statistics(approaches):
+    """Sample every filterable attribute of a sequence of close approaches.
+
+    The sample is spread evenly across the sequence.
+
+    :param approaches: A sequence of linked `CloseApproach`es that supports slicing.
+    :return: A dictionary mapping each class of `FILTER_KINDS` to a `ColumnStatistics`.
+    """
+    stride = max(1, len(approaches) // SAMPLE_SIZE)
+    sample = approaches[::stride]
+    return {kind: ColumnStatistics(map(kind.key, sample), stride) for kind in FILTER_KINDS}
+
+
+def statistics_to_dict(statistics):
+    """Flatten statistics into plain numbers and lists, which can be saved as JSON.
+
+    :param statistics: A dictionary of `ColumnStatistics` by filter class, from `gather_statistics`.
+    :return: A dictionary of the sample and counts of each filter class, by the class's name.
+    """
+    return {kind.__name__: {'keys': column.keys, 'count': column.count, 'stride': column.stride,
+                            'added': column._added, 'removed': column._removed}
+            for kind, column in statistics.items()}
+
+
+def statistics_from_dict(flattened):
+    """Rebuild the statistics flattened by `statistics_to_dict`.
+
+    :param flattened: A dictionary of flattened statistics, as produced by `statistics_to_dict`.
+    :return: A dictionary mapping each class of `FILTER_KINDS` to a `ColumnStatistics`.
+    :raises KeyError: If the statistics of a filter class are missing.
+    """
+    statistics = {}
+    for kind in FILTER_KINDS:
+        saved = flattened[kind.__name__]
+        column = statistics[kind] = ColumnStatistics(saved['keys'], saved['stride'])
+        column.count, column._added, column._removed = saved['count'], saved['added'], saved['removed']
+    return statistics
+
+
+def update_statistics(statistics, added=(), removed=()):
+    """Update the statistics of a database with a batch of added and removed close approaches.
+
+    This takes time in proportion to the size of the batch, not of the database.
+
+    :param statistics: A dictionary of `ColumnStatistics` by filter class, from `gather_statistics`.
+    :param added: A sequence of the linked `CloseApproach`es added to the database.
+    :param removed: A sequence of the linked `CloseApproach`es removed from the database.
+    """
+    for kind, column in statistics.items():
+        column.add(added, kind.key)
+        column.remove(removed, kind.key)
+
+
+class QueryPlan:
+    """The chosen way to evaluate a collection of filters over a database.
+
+    The candidate approaches come from the `access` path: `'scan'` for every
+    close approach, `'time'` for the slice of the database's time index within
+    some dates, `'neos'` for the approaches of the NEOs picked out by the
+    database's NEO indexes, or `'box'` for the approaches within a box of its
+    range index. The filters that the access path already enforces are kept
+    in `access_filters`, and their bounds in `access_bounds`.
+
+    :ivar filters: The filters to evaluate on each candidate approach, in order.
+    :ivar access: The access path, one of `'scan'`, `'time'`, `'neos'` or `'box'`.
+    :ivar access_filters: The filters enforced by the access path.
+    :ivar access_bounds: A list of a `(kind, low_key, high_key)` tuple of inclusive
+                         key bounds for each of `access_filters`.
+    :ivar empty: Whether the filters contradict each other, so that nothing can match.
+    :ivar estimates: The estimated selectivity of each of `filters`.
+    :ivar scan_estimate: The estimated fraction of approaches that are candidates.
+    :ivar total: The number of close approaches in the database.
+    """
+    def __init__(self, filters, access='scan', access_filters=(), access_bounds=(),
+                 empty=False, estimates=(), scan_estimate=1.0, total=0):
+        self.filters = filters
+        self.access = access
+        self.access_filters = list(access_filters)
+        self.access_bounds = list(access_bounds)
+        self.empty = empty
+        self.estimates = list(estimates)
+        self.scan_estimate = scan_estimate
+        self.total = total
+
+    def __str__(self):
+        """Return `str(self)`, a human-readable summary of the plan."""
+        if self.empty:
+            return "Plan: the filters contradict each other, so no close approach can match."
+        lines = [f"Plan over {self.total:,} close approaches:"]
+        enforced = ', '.join(map(repr, self.access_filters))
+        if self.access == 'scan':
+            lines.append("  scan every close approach")
+        else:
+            source = {
+                'time': "the time index",
+                'neos': "the approaches of the NEOs picked by the NEO indexes",
+                'box': "the range index",
+            }[self.access]
+            lines.append(f"  scan {source} for {enforced} "
+                         f"(est. {self.scan_estimate:.1%} of approaches)")
+        for step, (f, estimate) in enumerate(zip(self.filters, self.estimates), start=1):
+            lines.append(f"  {step}. {f!r}: est. {estimate:.1%} pass, cost {f.cost}")
+        matches = self.scan_estimate * _product(self.estimates) * self.total
+        lines.append(f"  est. {matches:,.0f} matching close approaches")
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f"QueryPlan(filters={self.filters!r}, access={self.access!r}, " \
+               f"access_filters={self.access_filters!r}, empty={self.empty!r})"
+
+
+def plan_query(filters, statistics, total, time_index=False, neo_index=(), box_index=()):
+    """Choose how to evaluate a collection of filters.
+
+    The `eq`, `ge` and `le` filters of each `AttributeFilter` class are merged
+    into a single inclusive range, which becomes a `RangeFilter` if more than one
+    filter went into it. A `BoxFilter` counts as each of its ranges. Every other
+    filter is kept as it is.
+
+    If the database has a time index, indexes its NEOs by some filter classes,
+    or has a range index over several filter classes, the candidates come from
+    whichever of those is estimated to yield the fewest approaches.
+
+    :param filters: A collection of filters capturing user-specified criteria.
+    :param statistics: A dictionary of `ColumnStatistics` by filter class, from `gather_statistics`.
+    :param total: The number of close approaches in the database.
+    :param time_index: Whether the database can take its candidates from a time index.
+    :param neo_index: The filter classes by which the database can pick out NEOs.
+    :param box_index: The filter classes that the database's range index spans.
+    :return: A `QueryPlan`.
+    """
+    bounds, residual = merge_bounds(filters)
+
+    # Each bounded filter is a tuple of (filter, selectivity, kind, low key, high key).
+    planned = []
+    for kind, ((low_key, low), (high_key, high), merged) in bounds.items():
+        if low_key > high_key:
+            return QueryPlan([], empty=True, scan_estimate=0.0, total=total)
+        f = merged[0] if len(merged) == 1 else RangeFilter(kind, low, high)
+        planned.append((f, _estimate(statistics, kind, low_key, high_key), kind, low_key, high_key))
+
+    # Take the candidates from whichever index is estimated to yield the fewest;
+    # the filters it enforces needn't be evaluated again. A range index over a
+    # single dimension is no better than a scan, so it needs at least two.
+    paths = {'neos': [item for item in planned if item[2] in neo_index]}
+    if time_index:
+        paths['time'] = [item for item in planned if issubclass(item[2], DateFilter)]
+    boxed = [item for item in planned if item[2] in box_index]
+    if len(boxed) >= 2:
+        paths['box'] = boxed
+    access, scan_estimate, enforced = 'scan', 1.0, []
+    for name in ('time', 'neos', 'box'):
+        items = paths.get(name)
+        if items and _product(item[1] for item in items) < scan_estimate:
+            access, scan_estimate, enforced = name, _product(item[1] for item in items), items
+    planned = [(f, estimate) for f, estimate, *_ in planned
+               if not any(f is item[0] for item in enforced)]
+    planned.extend((f, DEFAULT_SELECTIVITY) for f in residual)
+
+    # Evaluating a filter costs `cost`, and saves evaluating the rest for the
+    # fraction `1 - selectivity` of approaches it rejects: run the filters that
+    # reject the most per unit of cost first.
+    planned.sort(key=lambda pair: (pair[1] - 1) / pair[0].cost)
+    return QueryPlan([f for f, _ in planned], access,
+                     [item[0] for item in enforced], [item[2:] for item in enforced],
+                     estimates=[estimate for _, estimate in planned],
+                     scan_estimate=scan_estimate, total=total)
+
+
+def merge_bounds(filters):
+    """Merge the bounds that a collection of filters puts on each attribute.
+
+    The `eq`, `ge` and `le` filters of each `AttributeFilter` class, and each
+    `RangeFilter` (including those of a `BoxFilter`), narrow an inclusive range
+    of that class's keys. The bounds don't depend on the order of the filters,
+    nor on how they were combined, so they also describe the query itself.
+
+    :param filters: A collection of filters capturing user-specified criteria.
+    :return: A tuple of a dictionary and a list. The dictionary maps each bounded
+             filter class to its lowest and highest bound - each a `(key, value)`
+             tuple, with infinite keys and None values where unbounded - and its
+             filters. The list holds every other filter.
+    """
+    bounds = {}
+    residual = []
+    for f in _flatten(filters):
+        if isinstance(f, RangeFilter):
+            kind, low, high = f.kind, f.low, f.high
+        elif isinstance(f, AttributeFilter) and f.op in (eq, ge, le):
+            kind = type(f)
+            low = f.value if f.op in (eq, ge) else None
+            high = f.value if f.op in (eq, le) else None
+        else:
+            residual.append(f)
+            continue
+        bound = bounds.setdefault(kind, [(-math.inf, None), (math.inf, None), []])
+        if low is not None and kind.key_of(low) > bound[0][0]:
+            bound[0] = (kind.key_of(low), low)
+        if high is not None and kind.key_of(high) < bound[1][0]:
+            bound[1] = (kind.key_of(high), high)
+        bound[2].append(f)
+    return bounds, residual
+
+
+def _flatten(filters):
+    """Generate the filters of a collection, with each `BoxFilter` expanded into its ranges."""
+    for f in filters:
+        if isinstance(f, BoxFilter):
+            yield from f.ranges
+        else:
+            yield f
+
+
+def _product(estimates):
+    """Combine the selectivities of independent filters."""
+    combined = 1.0
+    for estimate in estimates:
+        combined *= estimate
+    return combined
+
+
+def _estimate(statistics, kind, low_key, high_key):
+    """Estimate the selectivity of an inclusive range of keys of one filter class."""
+    if kind not in statistics:
+        return DEFAULT_SELECTIVITY
+    return statistics[kind].selectivity(low_key, high_key)
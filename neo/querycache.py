@@ -0,0 +1,254 @@
+"""Cache the results of recent queries, for an interactive session.
+
+In an interactive session, the same query is often run again - to write its
+results to a file after looking at the first few, say - or narrowed by one more
+filter at a time. A `QueryCache` stands in front of a database and keeps the
+complete matches of its most recent queries, so that:
+
+- repeating a query, even with a different order or limit, takes its matches
+  straight from the cache; and
+- narrowing a cached query only evaluates the filters on that query's matches,
+  rather than on the whole database.
+
+A query is identified by the bounds that its filters put on each attribute (see
+`planner.merge_bounds`), so `--min-distance 0.1 --max-distance 0.2` is the same
+query as `--max-distance 0.2 --min-distance 0.1`, and a query *refines* a cached
+one if each of its bounds is at least as tight.
+
+The matches are kept sorted by time, as the database's own approaches or - for
+a `ColumnarNEODatabase` - as the numbers of their rows, which take up far less
+memory than the approaches that would be built from them. Only the approaches
+that a query actually generates are built.
+
+Finding every match of a query just to show the first ten of them can take far
+longer than streaming those ten from the database. A query with a limit that
+isn't cached is therefore streamed, and not cached, unless its plan estimates
+that finding every match is cheap (see `CHEAP_CANDIDATES`).
+
+The least recently used queries are evicted when the cache holds too many of
+them, or when their matches take up too much memory.
+"""
+import collections
+import sys
+from itertools import islice
+
+from columnar import ColumnarNEODatabase, ORDER_COLUMNS
+from database import ORDER_KEYS
+from filters import top
+from planner import merge_bounds, plan_query
+
+
+# How many queries to keep the matches of.
+MAX_ENTRIES = 32
+
+# How much memory the cached matches may take up, in bytes.
+MAX_BYTES = 64 * 1024 * 1024
+
+# How many candidate approaches a query with a limit may be estimated to have,
+# for every one of its matches to be found (and cached) rather than streamed.
+CHEAP_CANDIDATES = 50_000
+
+
+class QueryCache:
+    """A least-recently-used cache of the matches of queries to a database.
+
+    A `QueryCache` can be queried just like the database that it's created with.
+
+    :ivar hits: How many queries were answered with a cached query's matches.
+    :ivar refinements: How many queries were answered by narrowing a cached query's matches.
+    :ivar misses: How many queries had to be answered by the database.
+    :ivar evictions: How many queries have been evicted to make room for others.
+    """
+    def __init__(self, database, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        """Create a new, empty `QueryCache`.
+
+        :param database: The `NEODatabase` (or `ColumnarNEODatabase`) to query.
+        :param max_entries: How many queries to keep the matches of.
+        :param max_bytes: How much memory the cached matches may take up, in bytes.
+        """
+        self.database = database
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Each query's key maps to its bounds and its matches, least recently used first.
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        # Whether the matches are kept as rows of the database's columns, rather than approaches.
+        self._rows = isinstance(database, ColumnarNEODatabase)
+        self.hits = self.refinements = self.misses = self.evictions = 0
+
+    def plan(self, filters):
+        """Choose how the database would evaluate a collection of filters (see `NEODatabase.plan`)."""
+        return self.database.plan(filters)
+
+    def query(self, filters=(), order_by=None, descending=False, limit=None):
+        """Query close approaches to generate those that match a collection of filters.
+
+        This behaves like `NEODatabase.query`, but the matches are taken from
+        the cache if possible. Otherwise, they're found all at once and kept for
+        the next queries - unless there's a limit and that wouldn't be cheap, in
+        which case they're streamed from the database.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param order_by: The name of an attribute in `ORDER_KEYS` to sort by, or None.
+        :param descending: Whether to sort by decreasing rather than increasing attribute.
+        :param limit: The maximum number of approaches to generate, or 0 or None for all of them.
+        :return: A stream of matching `CloseApproach` objects.
+        """
+        if order_by is not None and order_by not in ORDER_KEYS:
+            raise ValueError(f"Can't order close approaches by {order_by!r}.")
+        key, bounds = _query_key(filters)
+        matches = self._lookup(key, bounds, filters)
+        if matches is None:
+            if limit and not self._cheap(filters):
+                self.misses += 1
+                return self.database.query(filters, order_by, descending, limit)
+            matches = self._find(key, bounds, filters)
+
+        # The matches are sorted by time already.
+        if order_by in (None, 'time'):
+            if descending and order_by is not None:
+                matches = reversed(matches)
+            return islice(self._approaches(matches), limit or None)
+        if self._rows:
+            column = getattr(self.database.columns, ORDER_COLUMNS[order_by])
+            return iter(self._approaches(top(iter(matches), column.__getitem__, descending, limit)))
+        return iter(top(iter(matches), ORDER_KEYS[order_by], descending, limit))
+
+    def matches(self, filters):
+        """Find every close approach that matches a collection of filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A sequence of the matching `CloseApproach` objects, sorted by time.
+        """
+        key, bounds = _query_key(filters)
+        matches = self._lookup(key, bounds, filters)
+        if matches is None:
+            matches = self._find(key, bounds, filters)
+        return self._approaches(matches)
+
+    def clear(self):
+        """Forget every cached query, but not the counters."""
+        self._entries.clear()
+        self._bytes = 0
+
+    def _lookup(self, key, bounds, filters):
+        """Find the matches of a query from the cache, by a cached query or by refining one.
+
+        :return: The query's time-sorted matches, or None if no cached query holds them.
+        """
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        # Narrow the smallest cached query that this one refines, if any.
+        parents = [matches for cached, matches in self._entries.values()
+                   if _refines(bounds, cached)]
+        if not parents:
+            return None
+        self.refinements += 1
+        parent = min(parents, key=len)
+        if self._rows:
+            matches = self.database.match_rows(filters, within=parent)
+        else:
+            plan = plan_query(filters, self.database.statistics, len(parent))
+            matches = () if plan.empty else tuple(
+                approach for approach in parent if all(f(approach) for f in plan.filters))
+        self._store(key, bounds, matches)
+        return matches
+
+    def _find(self, key, bounds, filters):
+        """Find every match of a query in the database, and cache them if the query has a key.
+
+        :return: The query's time-sorted matches.
+        """
+        self.misses += 1
+        if self._rows:
+            matches = self.database.match_rows(filters)
+        else:
+            matches = tuple(self.database.query(filters))
+        if key is not None:
+            # Filters that can't be described by their bounds can't be compared, so aren't kept.
+            self._store(key, bounds, matches)
+        return matches
+
+    def _cheap(self, filters):
+        """Estimate whether finding every match of a query is cheap.
+
+        The columns of a `ColumnarNEODatabase` are filtered whole, whether every
+        match is wanted or not, so finding the rows of every match always is.
+        """
+        if self._rows:
+            return True
+        plan = self.database.plan(filters)
+        return plan.empty or plan.scan_estimate * plan.total <= CHEAP_CANDIDATES
+
+    def _approaches(self, matches):
+        """Turn matches into close approaches, materializing rows as they're accessed."""
+        return self.database.approaches_at(matches) if self._rows else matches
+
+    def _store(self, key, bounds, matches):
+        """Keep the matches of a query, evicting the least recently used queries to make room."""
+        size = _size(matches)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (bounds, matches)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= _size(evicted)
+            self.evictions += 1
+
+    def __str__(self):
+        """Return `str(self)`, a human-readable summary of the cache's use."""
+        return f"{len(self._entries)} cached queries ({self._bytes / 1024 / 1024:.1f} MiB): " \
+               f"{self.hits} hits, {self.refinements} refinements, {self.misses} misses, " \
+               f"{self.evictions} evictions"
+
+    def __repr__(self):
+        return f"QueryCache(entries={len(self._entries)!r}, hits={self.hits!r}, " \
+               f"refinements={self.refinements!r}, misses={self.misses!r})"
+
+
+def _query_key(filters):
+    """Normalize a collection of filters into the key of their query.
+
+    :param filters: A collection of filters capturing user-specified criteria.
+    :return: A tuple of a hashable key and a dictionary mapping each bounded filter
+             class to its inclusive `(low_key, high_key)` bounds, or `(None, None)`
+             if some of the filters don't merely bound an attribute.
+    """
+    merged, residual = merge_bounds(filters)
+    if residual:
+        return None, None
+    bounds = {kind: (low[0], high[0]) for kind, (low, high, _) in merged.items()}
+    return frozenset(bounds.items()), bounds
+
+
+def _size(matches):
+    """Estimate the memory that a query's matches keep alive, in bytes.
+
+    Only the tuple or `array` of matches counts. An `NEODatabase`'s approaches,
+    and the NEOs and designations of either database's approaches, belong to
+    the database. The rows of a `ColumnarNEODatabase` are plain numbers in the
+    array, and the approaches built from them are only kept by whoever asked
+    for them. Neither do renderings count that are cached on the approaches
+    later, when they're written to a file (see `CloseApproach.render`).
+
+    :param matches: A tuple of `CloseApproach`es, or an `array` of rows.
+    :return: The estimated size of the matches, in bytes.
+    """
+    return sys.getsizeof(matches)
+
+
+def _refines(bounds, cached):
+    """Return whether every bound of a cached query is at least as loose as a query's bounds."""
+    for kind, (low, high) in cached.items():
+        if kind not in bounds:
+            return False
+        if bounds[kind][0] < low or bounds[kind][1] > high:
+            return False
+    return True
@@ -0,0 +1,141 @@
+"""A multi-dimensional range index over close approaches.
+
+A sorted index - such as the `NEODatabase` time index - answers a range on a
+single attribute. A query like `--start-date 2020-01-01 --max-distance 0.05
+--min-velocity 30` bounds three, though, and a sorted index on any one of them
+still leaves most of its candidates to be rejected by the other two.
+
+A `GridIndex` is a sorted grid over three attributes:
+
+- the approaches are sorted by the first attribute (say, time) and cut into
+  consecutive *slabs* of equal size;
+- each slab is sorted by the second attribute (say, distance) and cut into
+  consecutive *cells* of equal size; and
+- each cell is sorted by the third attribute (say, velocity).
+
+To answer a box, the slabs and then the cells that overlap it are found by
+bisection, and the third attribute's range is bisected within each of those
+cells. Only the approaches of slabs and cells that straddle the edges of the box
+have to be checked against it one by one; the rest are taken wholesale.
+
+Each attribute is described by a filter class, whose `key` classmethod fetches
+it from an approach, and the box's bounds are given in terms of those keys.
+
+Approaches can be added to and removed from a built index. A new approach joins
+the slab and the cell it falls in, widening their ranges if need be, so slabs
+and cells may grow and shrink - and their ranges may become looser than their
+approaches - but every search still finds exactly the approaches in its box.
+A range is only ever widened towards the approach that fell outside it, so the
+first and last keys of consecutive slabs, and of consecutive cells, stay sorted
+and can still be bisected.
+"""
+import bisect
+import math
+
+
+class GridIndex:
+    """A sorted grid of close approaches over three attributes."""
+    def __init__(self, approaches, kinds, slab_size=4096, cell_size=64):
+        """Create a new `GridIndex`.
+
+        :param approaches: A collection of `CloseApproach`es to index.
+        :param kinds: The filter classes of the three attributes to index by, in order.
+        :param slab_size: How many approaches to cut each slab into.
+        :param cell_size: How many approaches to cut each cell into.
+        """
+        self.kinds = tuple(kinds)
+        first, second, third = (kind.key for kind in self.kinds)
+        ordered = sorted(approaches, key=first)
+
+        # Each slab holds the first and last key of its approaches along the first
+        # attribute, its cells, and the first and last keys of its cells; each cell
+        # holds the same along the second attribute, the sorted keys of its
+        # approaches along the third, and the approaches themselves.
+        self.slabs = []
+        for start in range(0, len(ordered), slab_size):
+            slab = sorted(ordered[start:start + slab_size], key=second)
+            cells = []
+            for offset in range(0, len(slab), cell_size):
+                cell = sorted(slab[offset:offset + cell_size], key=third)
+                seconds = [second(approach) for approach in slab[offset:offset + cell_size]]
+                cells.append([seconds[0], seconds[-1], [third(approach) for approach in cell], cell])
+            self.slabs.append([first(ordered[start]),
+                               first(ordered[min(start + slab_size, len(ordered)) - 1]),
+                               cells, [cell[0] for cell in cells], [cell[1] for cell in cells]])
+        self._slab_lasts = [slab[1] for slab in self.slabs]
+        self._slab_firsts = [slab[0] for slab in self.slabs]
+
+    def search(self, bounds):
+        """Find the close approaches within a box.
+
+        :param bounds: A dictionary mapping some of `kinds` to an inclusive
+                       `(low_key, high_key)` range; the other attributes are unbounded.
+        :return: A list of the `CloseApproach`es within the box, in no particular order.
+        """
+        (low1, high1), (low2, high2), (low3, high3) = (
+            bounds.get(kind, (-math.inf, math.inf)) for kind in self.kinds)
+        first, second, _ = (kind.key for kind in self.kinds)
+
+        found = []
+        lo = bisect.bisect_left(self._slab_lasts, low1)
+        hi = bisect.bisect_right(self._slab_firsts, high1)
+        for slab_first, slab_last, cells, cell_firsts, cell_lasts in self.slabs[lo:hi]:
+            slab_inside = low1 <= slab_first and slab_last <= high1
+            cells = cells[bisect.bisect_left(cell_lasts, low2):bisect.bisect_right(cell_firsts, high2)]
+            for cell_first, cell_last, thirds, cell in cells:
+                matches = cell[bisect.bisect_left(thirds, low3):bisect.bisect_right(thirds, high3)]
+                if not slab_inside:
+                    matches = [a for a in matches if low1 <= first(a) <= high1]
+                if not (low2 <= cell_first and cell_last <= high2):
+                    matches = [a for a in matches if low2 <= second(a) <= high2]
+                found.extend(matches)
+        return found
+
+    def add(self, approach):
+        """Add a close approach to the index.
+
+        :param approach: A `CloseApproach` that isn't in the index yet.
+        """
+        first, second, third = (kind.key(approach) for kind in self.kinds)
+        if not self.slabs:
+            self.slabs.append([first, first, [[second, second, [third], [approach]]],
+                               [second], [second]])
+            self._slab_firsts.append(first)
+            self._slab_lasts.append(first)
+            return
+
+        # The first slab that reaches the approach, or else the last slab. Widening
+        # it to the approach keeps the slabs' ranges in order.
+        index = min(bisect.bisect_left(self._slab_lasts, first), len(self.slabs) - 1)
+        slab = self.slabs[index]
+        slab[0] = self._slab_firsts[index] = min(slab[0], first)
+        slab[1] = self._slab_lasts[index] = max(slab[1], first)
+
+        # Likewise, the first cell that reaches the approach, or else the last cell.
+        _, _, cells, cell_firsts, cell_lasts = slab
+        index = min(bisect.bisect_left(cell_lasts, second), len(cells) - 1)
+        cell = cells[index]
+        cell[0] = cell_firsts[index] = min(cell[0], second)
+        cell[1] = cell_lasts[index] = max(cell[1], second)
+        position = bisect.bisect_right(cell[2], third)
+        cell[2].insert(position, third)
+        cell[3].insert(position, approach)
+
+    def remove(self, approach):
+        """Remove a close approach from the index.
+
+        :param approach: A `CloseApproach` in the index.
+        :raises ValueError: If the approach isn't in the index.
+        """
+        first, second, third = (kind.key(approach) for kind in self.kinds)
+        lo = bisect.bisect_left(self._slab_lasts, first)
+        hi = bisect.bisect_right(self._slab_firsts, first)
+        for _, _, cells, cell_firsts, cell_lasts in self.slabs[lo:hi]:
+            cells = cells[bisect.bisect_left(cell_lasts, second):bisect.bisect_right(cell_firsts, second)]
+            for _, _, thirds, cell in cells:
+                for position in range(bisect.bisect_left(thirds, third),
+                                      bisect.bisect_right(thirds, third)):
+                    if cell[position] is approach:
+                        del thirds[position], cell[position]
+                        return
+        raise ValueError(f"{approach!r} isn't in the range index.")
@@ -0,0 +1,265 @@
+"""Save and restore the extracted data set as an on-disk snapshot.
+
+Parsing the NEO CSV file and the close approach JSON file from scratch takes far
+longer than anything the command-line tool does with the data afterwards. The
+`load_database` function therefore keeps a snapshot of the extracted data - the
+NEOs' attributes and the typed columns of their close approaches - in a single
+binary file next to the data, and restores the database from it whenever the
+snapshot is still fresh.
+
+The snapshot also holds the indexes and statistics that the database engine
+built (see `NEODatabase.export_indexes`), so that restoring the database
+doesn't sort or sample its close approaches again. Those are only restored by
+the engine that wrote the snapshot; the other one builds its own from the
+columns.
+
+A snapshot is fresh when it was written by the same `SNAPSHOT_VERSION` from the
+same data files. Each data file is fingerprinted by its size, its modification
+time and a hash of its contents, taken before it's parsed, so that a file that
+changes while it's being parsed leaves a stale snapshot behind rather than a
+fresh-looking one of old data. A file that has been touched but not changed
+(same size, same hash) doesn't invalidate the snapshot, whose header is then
+updated with the new modification time so the file isn't hashed again next
+time. A stale, missing or unreadable snapshot is silently rebuilt from the data
+files.
+
+A snapshot holds only data, never objects, so that reading one can't run any
+code: after a `MAGIC` line, a JSON header holds the version, the fingerprints
+and the size and hash of the body, so that checking for freshness doesn't read
+the rest of the file. The body is a JSON layout - the NEOs' designations and
+names, the statistics, and the name, type code and length of every array -
+followed by the raw bytes of those arrays, in order. A body that doesn't match
+its hash, or that can't be restored for any other reason, counts as stale.
+"""
+import array
+import contextlib
+import hashlib
+import json
+import os
+import struct
+import sys
+
+from columnar import ApproachColumns, ColumnarNEODatabase, neos_from_columns, neos_to_columns
+from extract import load_neos, load_approaches, iter_approaches
+from parallel import load_columns
+from planner import statistics_from_dict, statistics_to_dict
+
+
+# Bump whenever the layout of a snapshot changes, to invalidate older snapshots.
+SNAPSHOT_VERSION = 4
+
+# The first line of every snapshot file.
+MAGIC = b'NEO snapshot\n'
+
+# The length of the JSON header, and of the JSON layout at the start of the body.
+_LENGTH = struct.Struct('<Q')
+
+
+def load_database(neo_csv_path, cad_json_path, engine, snapshot_path=None, workers=1):
+    """Build a database from the data files, via a snapshot of them if possible.
+
+    :param neo_csv_path: A path to a CSV file containing data about near-Earth objects.
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :param engine: The database class to build, such as `NEODatabase` or `ColumnarNEODatabase`.
+    :param snapshot_path: A path to the snapshot file, or None to always parse the data files.
+    :param workers: How many processes to parse the data files with, if they must be parsed.
+    :return: A database of the NEOs and close approaches in the data files.
+    """
+    if snapshot_path is None:
+        return _parse(neo_csv_path, cad_json_path, engine, workers)
+
+    sources = [_stat_source(neo_csv_path), _stat_source(cad_json_path)]
+    database = _read_snapshot(snapshot_path, sources, engine)
+    if database is not None:
+        return database
+
+    # Hash the data files before parsing them, so the fingerprints can't describe newer contents.
+    sources = [_fingerprint(source) for source in sources]
+    database = _parse(neo_csv_path, cad_json_path, engine, workers)
+    _write_snapshot(snapshot_path, sources, database)
+    return database
+
+
+def _parse(neo_csv_path, cad_json_path, engine, workers=1):
+    """Build a database by parsing the data files themselves."""
+    if workers > 1:
+        return engine.from_columns(*load_columns(neo_csv_path, cad_json_path, workers))
+    if issubclass(engine, ColumnarNEODatabase):
+        # The columnar engine copies each close approach into its columns, so it
+        # can consume them as a stream rather than holding them all at once.
+        return engine(load_neos(neo_csv_path), iter_approaches(cad_json_path))
+    return engine(load_neos(neo_csv_path), load_approaches(cad_json_path))
+
+
+def _stat_source(path):
+    """Describe a data file by its path, size and modification time."""
+    stat = path.stat()
+    return {'path': str(path.resolve()), 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+
+def _fingerprint(source):
+    """Add a hash of the contents of a data file to its description."""
+    digest = hashlib.sha256()
+    with open(source['path'], 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return dict(source, sha256=digest.hexdigest())
+
+
+def _is_fresh(header, sources):
+    """Check whether a snapshot header matches the current state of the data files."""
+    if header.get('version') != SNAPSHOT_VERSION or len(header['sources']) != len(sources):
+        return False
+    for saved, current in zip(header['sources'], sources):
+        if saved['path'] != current['path'] or saved['size'] != current['size']:
+            return False
+        if saved['mtime'] != current['mtime'] and \
+                saved['sha256'] != _fingerprint(current)['sha256']:
+            return False
+    return True
+
+
+def _read_snapshot(snapshot_path, sources, engine):
+    """Restore a database from a snapshot, if it's fresh.
+
+    If a data file has only been touched since the snapshot was written, the
+    snapshot is rewritten with the file's new modification time.
+
+    :return: A database of the engine's class, or None.
+    """
+    # The snapshot is only a cache: however it's unreadable or garbled, parse the data files instead.
+    try:
+        with open(snapshot_path, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                return None
+            header = json.loads(_read_sized(file))
+            if not _is_fresh(header, sources):
+                return None
+            body = file.read()
+        if len(body) != header['body']['size'] or \
+                hashlib.sha256(body).hexdigest() != header['body']['sha256']:
+            return None
+        database = _restore(body, engine)
+    except Exception:
+        return None
+
+    if any(saved['mtime'] != current['mtime']
+           for saved, current in zip(header['sources'], sources)):
+        header['sources'] = [dict(saved, mtime=current['mtime'])
+                             for saved, current in zip(header['sources'], sources)]
+        _dump(snapshot_path, header, [body])
+    return database
+
+
+def _read_sized(file):
+    """Read a length-prefixed block of a snapshot file."""
+    (length,) = _LENGTH.unpack(file.read(_LENGTH.size))
+    block = file.read(length)
+    if len(block) != length:
+        raise EOFError("The snapshot file is truncated.")
+    return block
+
+
+def _restore(body, engine):
+    """Restore a database from the body of a snapshot.
+
+    :param body: The body of a snapshot, as written by `_write_snapshot`.
+    :param engine: The database class to build.
+    :return: A database of the engine's class.
+    :raises ValueError: If the body was written on a machine with other array types.
+    """
+    (length,) = _LENGTH.unpack_from(body)
+    layout = json.loads(body[_LENGTH.size:_LENGTH.size + length])
+    if layout['byteorder'] != sys.byteorder:
+        raise ValueError("The snapshot was written with another byte order.")
+    arrays = {}
+    offset = _LENGTH.size + length
+    with memoryview(body) as view:
+        for name, typecode, itemsize, count in layout['arrays']:
+            column = array.array(typecode)
+            if column.itemsize != itemsize:
+                raise ValueError(f"The snapshot's {name} array has another item size.")
+            column.frombytes(view[offset:offset + itemsize * count])
+            arrays[name] = column
+            offset += itemsize * count
+
+    neos = neos_from_columns(dict(layout['neos'], diameters=arrays['neos.diameters'],
+                                  hazardous=arrays['neos.hazardous']))
+    columns = ApproachColumns()
+    for name in vars(columns):
+        setattr(columns, name, arrays[f'columns.{name}'])
+    indexes = None
+    if layout['engine'] == engine.__name__:
+        indexes = {name[len('indexes.'):]: column for name, column in arrays.items()
+                   if name.startswith('indexes.')}
+        indexes['statistics'] = statistics_from_dict(layout['statistics'])
+    return engine.from_columns(neos, columns, indexes)
+
+
+def _write_snapshot(snapshot_path, sources, database):
+    """Write the NEOs, close approach columns and indexes of a database to a snapshot.
+
+    Failing to write the snapshot (for instance, into a read-only directory)
+    isn't an error - the data files will just be parsed again next time.
+    """
+    neos = database.neos
+    if isinstance(database, ColumnarNEODatabase):
+        columns = database.columns
+    else:
+        # In time order, so that the time index can be restored without sorting.
+        neo_indices = {id(neo): index for index, neo in enumerate(neos)}
+        columns = ApproachColumns()
+        for approach in database.approaches:
+            columns.append(approach.time_key, approach.distance, approach.velocity,
+                           neo_indices[id(approach.neo)], approach.neo)
+
+    flattened = neos_to_columns(neos)
+    arrays = {'neos.diameters': array.array('d', flattened['diameters']),
+              'neos.hazardous': array.array('b', flattened['hazardous'])}
+    arrays.update((f'columns.{name}', column) for name, column in vars(columns).items())
+    indexes = database.export_indexes()
+    for name, index in indexes.items():
+        if name != 'statistics':
+            arrays[f'indexes.{name}'] = index if isinstance(index, array.array) \
+                else array.array('B', index)
+
+    layout = json.dumps({
+        'byteorder': sys.byteorder,
+        'neos': {'designations': flattened['designations'], 'names': flattened['names']},
+        'engine': type(database).__name__,
+        'statistics': statistics_to_dict(indexes['statistics']),
+        'arrays': [(name, column.typecode, column.itemsize, len(column))
+                   for name, column in arrays.items()],
+    }).encode()
+    body = [_LENGTH.pack(len(layout)), layout, *arrays.values()]
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in body:
+        with memoryview(chunk) as view:
+            digest.update(view)
+            size += view.nbytes
+    header = {'version': SNAPSHOT_VERSION, 'sources': sources,
+              'body': {'size': size, 'sha256': digest.hexdigest()}}
+    _dump(snapshot_path, header, body)
+
+
+def _dump(snapshot_path, header, body):
+    """Write a snapshot's header and body, ignoring any failure to (see `_write_snapshot`).
+
+    :param header: The snapshot's header, as a dictionary.
+    :param body: A list of the bytes-like pieces of the snapshot's body.
+    """
+    # Write to a temporary file first, so a concurrent reader never sees half a snapshot.
+    partial_path = f"{snapshot_path}.{os.getpid()}.partial"
+    header = json.dumps(header).encode()
+    try:
+        with open(partial_path, 'wb') as file:
+            file.write(MAGIC)
+            file.write(_LENGTH.pack(len(header)))
+            file.write(header)
+            for chunk in body:
+                file.write(chunk)
+        os.replace(partial_path, snapshot_path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(partial_path)
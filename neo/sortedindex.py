@@ -0,0 +1,153 @@
+"""A sorted index that items can be added to and removed from one at a time.
+
+A sorted list answers a range of keys by bisection, but adding an item to it,
+or removing one, moves every later item along - so keeping a sorted list of
+every close approach up to date costs time in proportion to the whole database
+for each approach that's added or removed.
+
+A `SortedIndex` instead cuts its items into consecutive *blocks* of at most a
+few thousand items, each sorted by key, and keeps the first and last key of
+every block. Finding a block is a bisection of those keys, and adding or
+removing an item only moves the rest of its block. A block that grows too big
+is split in two, and one that empties is dropped.
+
+Like the slabs of a `rangeindex.GridIndex`, a block's range is only ever
+widened towards an item added to it, so the first and last keys of consecutive
+blocks stay sorted.
+"""
+import bisect
+import collections.abc
+import itertools
+
+
+class SortedIndex(collections.abc.Sequence):
+    """A sequence of items, sorted by a key, in blocks that can be updated cheaply.
+
+    Items with equal keys are kept in the order they were added. Items are
+    removed by identity, so the same item can't be in the index twice.
+    """
+    def __init__(self, items, key, block_size=2048, presorted=False):
+        """Create a new `SortedIndex`.
+
+        :param items: An iterable of items to index.
+        :param key: A function that fetches the key to sort an item by.
+        :param block_size: How many items to cut each block into; blocks are split at twice that.
+        :param presorted: Whether the items are sorted by key already, so needn't be sorted again.
+        """
+        self.key = key
+        self.block_size = block_size
+        ordered = list(items) if presorted else sorted(items, key=key)
+        self._blocks = [ordered[start:start + block_size]
+                        for start in range(0, len(ordered), block_size)]
+        self._keys = [list(map(key, block)) for block in self._blocks]
+        self._firsts = [keys[0] for keys in self._keys]
+        self._lasts = [keys[-1] for keys in self._keys]
+        self._length = len(ordered)
+
+    def __len__(self):
+        """Return `len(self)`, the number of items in the index."""
+        return self._length
+
+    def __iter__(self):
+        """Generate every item, sorted by key."""
+        return itertools.chain.from_iterable(self._blocks)
+
+    def __reversed__(self):
+        """Generate every item, sorted by decreasing key."""
+        return itertools.chain.from_iterable(map(reversed, reversed(self._blocks)))
+
+    def __getitem__(self, index):
+        """Return the item at a position, or a list of the items in a slice of positions.
+
+        A slice only slices the blocks that it spans, and only copies the items it takes.
+        """
+        if isinstance(index, slice):
+            positions = range(*index.indices(self._length))
+            if positions.step < 0:
+                # The same positions, taken in increasing order, and reversed.
+                return self[positions[-1]:positions[0] + 1:-positions.step][::-1] if positions else []
+            found = []
+            first = 0
+            wanted = positions.start
+            for block in self._blocks:
+                if wanted >= positions.stop:
+                    break
+                if wanted < first + len(block):
+                    taken = block[wanted - first:positions.stop - first:positions.step]
+                    found.extend(taken)
+                    wanted += len(taken) * positions.step
+                first += len(block)
+            return found
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("SortedIndex index out of range")
+        for block in self._blocks:
+            if index < len(block):
+                return block[index]
+            index -= len(block)
+
+    def between(self, low, high):
+        """Find the items whose key lies within inclusive bounds.
+
+        :param low: The smallest key to find.
+        :param high: The largest key to find.
+        :return: A list of the items within the bounds, sorted by key.
+        """
+        found = []
+        lo = bisect.bisect_left(self._lasts, low)
+        hi = bisect.bisect_right(self._firsts, high)
+        for block, keys in zip(self._blocks[lo:hi], self._keys[lo:hi]):
+            found.extend(block[bisect.bisect_left(keys, low):bisect.bisect_right(keys, high)])
+        return found
+
+    def add(self, item):
+        """Add an item to the index, after any others with the same key.
+
+        :param item: An item that isn't in the index yet.
+        """
+        key = self.key(item)
+        self._length += 1
+        if not self._blocks:
+            self._blocks.append([item])
+            self._keys.append([key])
+            self._firsts.append(key)
+            self._lasts.append(key)
+            return
+
+        # The first block that reaches past the key, or else the last block.
+        index = min(bisect.bisect_right(self._lasts, key), len(self._blocks) - 1)
+        block, keys = self._blocks[index], self._keys[index]
+        position = bisect.bisect_right(keys, key)
+        block.insert(position, item)
+        keys.insert(position, key)
+        self._firsts[index], self._lasts[index] = keys[0], keys[-1]
+        if len(block) > 2 * self.block_size:
+            half = len(block) // 2
+            self._blocks[index:index + 1] = [block[:half], block[half:]]
+            self._keys[index:index + 1] = [keys[:half], keys[half:]]
+            self._firsts[index:index + 1] = [keys[0], keys[half]]
+            self._lasts[index:index + 1] = [keys[half - 1], keys[-1]]
+
+    def remove(self, item):
+        """Remove an item from the index.
+
+        :param item: An item in the index.
+        :raises ValueError: If the item isn't in the index.
+        """
+        key = self.key(item)
+        index = bisect.bisect_left(self._lasts, key)
+        while index < len(self._blocks) and self._firsts[index] <= key:
+            block, keys = self._blocks[index], self._keys[index]
+            for position in range(bisect.bisect_left(keys, key), bisect.bisect_right(keys, key)):
+                if block[position] is item:
+                    del block[position], keys[position]
+                    self._length -= 1
+                    if block:
+                        self._firsts[index], self._lasts[index] = keys[0], keys[-1]
+                    else:
+                        del self._blocks[index], self._keys[index]
+                        del self._firsts[index], self._lasts[index]
+                    return
+            index += 1
+        raise ValueError(f"{item!r} isn't in the sorted index.")
@@ -0,0 +1,103 @@
+"""Check that summarizing a query agrees with aggregating its matches by hand.
+
+Both database engines are checked, with and without grouping.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_aggregate
+"""
+import collections
+import datetime
+import pathlib
+import statistics
+import unittest
+
+from aggregate import Summary, check_grouping, summarize
+from columnar import ColumnarNEODatabase
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestSummary(unittest.TestCase):
+    def test_add_matches_from_columns(self):
+        distances, velocities = [0.3, 0.1, 0.2], [10.0, 30.0, 20.0]
+        added = Summary()
+        for distance, velocity in zip(distances, velocities):
+            added.add(distance, velocity)
+        self.assertEqual(added.serialize(), Summary.from_columns(distances, velocities).serialize())
+        self.assertEqual(added.count, 3)
+        self.assertEqual((added.distance_min, added.distance_max), (0.1, 0.3))
+        self.assertAlmostEqual(added.velocity_mean, 20.0)
+
+    def test_empty_summary(self):
+        self.assertEqual(Summary().serialize(), {'count': 0})
+        self.assertEqual(Summary.from_columns([], []).count, 0)
+
+    def test_grouping_is_validated_and_ordered(self):
+        self.assertEqual(check_grouping(['hazardous', 'year']), ('year', 'hazardous'))
+        self.assertEqual(check_grouping(['month']), ('year', 'month'))
+        with self.assertRaises(ValueError):
+            check_grouping(['week'])
+
+    def test_summarize_without_rows(self):
+        self.assertEqual(list(summarize([])), [()])
+        self.assertEqual(summarize([], ['year']), {})
+
+
+class TestDatabaseSummarize(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.databases = (
+            NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE)),
+            ColumnarNEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE)),
+        )
+
+    def assertSummarizes(self, group_by=(), **criteria):
+        filters = create_filters(**criteria)
+        for database in self.databases:
+            with self.subTest(engine=type(database).__name__, group_by=group_by):
+                groups = collections.defaultdict(list)
+                for approach in database.query(filters):
+                    key = {'year': approach.time.year, 'month': approach.time.month,
+                           'hazardous': approach.neo.hazardous}
+                    groups[tuple(key[name] for name in check_grouping(group_by))].append(approach)
+                summaries = database.summarize(filters, group_by)
+                if not group_by and not groups:
+                    groups[()] = []
+                self.assertEqual(list(summaries), sorted(groups))
+                for key, approaches in groups.items():
+                    summary = summaries[key]
+                    self.assertEqual(summary.count, len(approaches))
+                    if approaches:
+                        distances = [approach.distance for approach in approaches]
+                        velocities = [approach.velocity for approach in approaches]
+                        self.assertEqual(summary.distance_min, min(distances))
+                        self.assertEqual(summary.velocity_max, max(velocities))
+                        self.assertAlmostEqual(summary.distance_mean, statistics.mean(distances))
+                        self.assertAlmostEqual(summary.velocity_mean, statistics.mean(velocities))
+
+    def test_summarize_everything(self):
+        self.assertSummarizes()
+
+    def test_summarize_with_filters(self):
+        self.assertSummarizes(start_date=datetime.date(2020, 6, 1), distance_max=0.1)
+        self.assertSummarizes(diameter_min=1.0)
+
+    def test_summarize_without_matches(self):
+        self.assertSummarizes(velocity_min=30, velocity_max=10)
+        self.assertSummarizes(group_by=('hazardous',), velocity_min=100)
+
+    def test_summarize_by_group(self):
+        self.assertSummarizes(group_by=('hazardous',))
+        self.assertSummarizes(group_by=('year',), hazardous=True)
+        self.assertSummarizes(group_by=('month', 'hazardous'), distance_max=0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
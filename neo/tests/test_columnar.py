@@ -0,0 +1,95 @@
+"""Check that a `ColumnarNEODatabase` answers queries just like an `NEODatabase`.
+
+Both engines are built from the same test data, and every query should produce
+the same close approaches - compared by their attributes, since the columnar
+engine builds fresh `CloseApproach` objects for each result.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_columnar
+"""
+import datetime
+import math
+import pathlib
+import unittest
+
+from columnar import ColumnarNEODatabase
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def as_rows(approaches):
+    return sorted((approach.time, approach.distance, approach.velocity, approach.neo.designation)
+                  for approach in approaches)
+
+
+class TestColumnarQuery(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        cls.columnar = ColumnarNEODatabase(load_neos(TEST_NEO_FILE),
+                                           iter(load_approaches(TEST_CAD_FILE)))
+
+    def assertSameResults(self, **criteria):
+        filters = create_filters(**criteria)
+        expected = as_rows(self.db.query(filters))
+        self.assertEqual(expected, as_rows(self.columnar.query(filters)))
+        return expected
+
+    def test_query_all(self):
+        self.assertEqual(len(self.assertSameResults()), 4700)
+
+    def test_query_on_date(self):
+        self.assertTrue(self.assertSameResults(date=datetime.date(2020, 3, 2)))
+
+    def test_query_in_date_range(self):
+        self.assertTrue(self.assertSameResults(start_date=datetime.date(2020, 3, 1),
+                                               end_date=datetime.date(2020, 3, 31)))
+
+    def test_query_distance_and_velocity(self):
+        self.assertTrue(self.assertSameResults(distance_max=0.05, velocity_min=20))
+
+    def test_query_diameter(self):
+        self.assertTrue(self.assertSameResults(diameter_min=0.5))
+        self.assertTrue(self.assertSameResults(diameter_max=1.0))
+
+    def test_query_hazardous_combination(self):
+        self.assertTrue(self.assertSameResults(start_date=datetime.date(2020, 6, 1),
+                                               diameter_max=1.5, hazardous=True))
+        self.assertTrue(self.assertSameResults(hazardous=False, velocity_max=10))
+
+    def test_neo_approaches_are_materialized(self):
+        neo = self.columnar.get_neo_by_designation('2101')
+        self.assertIsNotNone(neo)
+        self.assertEqual(as_rows(neo.approaches),
+                         as_rows(self.db.get_neo_by_designation('2101').approaches))
+        for approach in neo.approaches:
+            self.assertIs(approach.neo, neo)
+
+    def test_every_row_belongs_to_its_neo(self):
+        rows = sorted(row for neo in self.columnar.neos for row in neo.approaches.rows)
+        self.assertEqual(rows, list(range(len(self.columnar.columns))))
+        for index, neo in enumerate(self.columnar.neos):
+            for row in neo.approaches.rows:
+                self.assertEqual(self.columnar.columns.neo_indices[row], index)
+
+    def test_materialized_approaches_are_new_objects(self):
+        neo = self.columnar.get_neo_by_designation('2101')
+        # Each access builds new objects, which only compare equal by their attributes.
+        self.assertIsNot(neo.approaches[0], neo.approaches[0])
+        self.assertEqual(as_rows(neo.approaches[:1]), as_rows([neo.approaches[0]]))
+
+    def test_columns_store_unknown_diameter_as_nan(self):
+        neo = self.columnar.get_neo_by_designation('2020 BS')
+        row = neo.approaches.rows[0]
+        self.assertTrue(math.isnan(self.columnar.columns.diameters[row]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,11 +12,13 @@ These tests should pass when Task 2 is complete.
 """
 import collections.abc
 import datetime
+import json
 import pathlib
 import math
+import tempfile
 import unittest
 
-from extract import load_neos, load_approaches
+from extract import load_neos, load_approaches, iter_approaches
 from models import NearEarthObject, CloseApproach
 
 
@@ -77,6 +79,22 @@ class TestLoadNEOs(unittest.TestCase):
         self.assertEqual(neo.diameter, 0.6)
         self.assertEqual(neo.hazardous, True)
 
+    def test_neos_with_quoted_fields(self):
+        with open(TEST_NEO_FILE) as file:
+            header, first, *_ = file.read().splitlines()
+        quoted = first.replace(',Toro,', ',"Toro, the bull",')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write('\n'.join([header, quoted, first, '']))
+        self.addCleanup(pathlib.Path(file.name).unlink)
+
+        toro_quoted, toro = load_neos(file.name)
+        self.assertEqual(toro_quoted.name, 'Toro, the bull')
+        self.assertEqual(toro.name, 'Toro')
+        for neo in (toro_quoted, toro):
+            self.assertEqual(neo.designation, '1685')
+            self.assertEqual(neo.diameter, 3.4)
+            self.assertEqual(neo.hazardous, False)
+
 
 class TestLoadApproaches(unittest.TestCase):
     @classmethod
@@ -118,5 +136,57 @@ class TestLoadApproaches(unittest.TestCase):
         self.assertIsInstance(approach.velocity, float)
 
 
+class TestIterApproaches(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(TEST_CAD_FILE) as file:
+            cls.document = json.load(file)
+        cls.expected = [(approach.time, approach.distance, approach.velocity, approach._designation)
+                        for approach in load_approaches(TEST_CAD_FILE)]
+
+    def write_document(self, document):
+        file = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        self.addCleanup(pathlib.Path(file.name).unlink)
+        with file:
+            json.dump(document, file)
+        return file.name
+
+    def as_rows(self, approaches):
+        return [(approach.time, approach.distance, approach.velocity, approach._designation)
+                for approach in approaches]
+
+    def test_approaches_are_stream(self):
+        approaches = iter_approaches(TEST_CAD_FILE)
+        self.assertIsInstance(approaches, collections.abc.Iterator)
+        self.assertEqual(self.as_rows(approaches), self.expected)
+
+    def test_approaches_are_decoded_lazily(self):
+        approach = next(iter_approaches(TEST_CAD_FILE))
+        self.assertIsInstance(approach._time, str)
+
+        self.assertEqual(approach.time_key // (24 * 60), approach.time.date().toordinal() - 1)
+        self.assertIsInstance(approach._time, datetime.datetime)
+
+    def test_fields_before_data(self):
+        document = {
+            'signature': {'source': 'test', 'version': '1.1'},
+            'count': self.document['count'],
+            'fields': self.document['fields'],
+            'data': self.document['data'],
+        }
+        path = self.write_document(document)
+        self.assertEqual(self.as_rows(iter_approaches(path)), self.expected)
+
+    def test_reordered_fields(self):
+        fields = self.document['fields'][::-1]
+        data = [row[::-1] for row in self.document['data'][:10]]
+        path = self.write_document({'fields': fields, 'data': data})
+        self.assertEqual(self.as_rows(iter_approaches(path)), self.expected[:10])
+
+    def test_empty_data(self):
+        path = self.write_document({'fields': self.document['fields'], 'count': 0, 'data': []})
+        self.assertEqual(list(iter_approaches(path)), [])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,66 @@
+"""Check that NASA's calendar dates are converted just as `strptime` would convert them.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_helpers
+"""
+import datetime
+import json
+import pathlib
+import unittest
+
+import helpers
+from helpers import cd_to_datetime, cds_to_datetimes, cds_to_minutes, datetime_to_minutes
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def strptime(calendar_date):
+    return datetime.datetime.strptime(calendar_date, "%Y-%b-%d %H:%M")
+
+
+class TestCalendarDates(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(TEST_CAD_FILE) as file:
+            document = json.load(file)
+        cd_index = document['fields'].index('cd')
+        cls.calendar_dates = [row[cd_index] for row in document['data']]
+
+    def test_cd_to_datetime_matches_strptime(self):
+        for calendar_date in self.calendar_dates:
+            self.assertEqual(cd_to_datetime(calendar_date), strptime(calendar_date))
+
+    def test_cd_to_datetime_every_month(self):
+        for month in range(1, 13):
+            expected = datetime.datetime(1999, month, 28, 23, 59)
+            self.assertEqual(cd_to_datetime(expected.strftime("%Y-%b-%d %H:%M")), expected)
+
+    def test_cds_to_datetimes(self):
+        self.assertEqual(cds_to_datetimes(self.calendar_dates),
+                         [strptime(calendar_date) for calendar_date in self.calendar_dates])
+
+    def test_cds_to_minutes(self):
+        self.assertEqual(list(cds_to_minutes(self.calendar_dates)),
+                         [datetime_to_minutes(strptime(calendar_date))
+                          for calendar_date in self.calendar_dates])
+
+    def test_invalid_calendar_dates_are_rejected(self):
+        for calendar_date in ('2020-Foo-01 00:00', '2020-Feb-30 12:00', '2020-Jan-01 24:00',
+                              '2020-Jan-01 12:60', '2020/Jan/01 12:00', '', 'not a date'):
+            with self.subTest(calendar_date=calendar_date):
+                with self.assertRaises(ValueError):
+                    cd_to_datetime(calendar_date)
+                with self.assertRaises(ValueError):
+                    cds_to_minutes([calendar_date])
+
+    def test_memoized_dates_are_bounded(self):
+        for memoized in (helpers._parse_cd_date, helpers._date_to_minutes):
+            with self.subTest(memoized=memoized.__name__):
+                self.assertIsNotNone(memoized.cache_info().maxsize)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+"""Check that the data files are reloaded when they change during a session.
+
+Appending to the data files must only load the new records, and any other
+change must load them from scratch; either way, the new database must hold
+exactly what loading the data files would.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_hotreload
+"""
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from columnar import ColumnarNEODatabase
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from hotreload import Reloader
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestReloader(unittest.TestCase):
+    engine = NEODatabase
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = pathlib.Path(tmp.name)
+        self.neo_file, self.cad_file = root / 'neos.csv', root / 'cad.json'
+        shutil.copy(TEST_NEO_FILE, self.neo_file)
+        shutil.copy(TEST_CAD_FILE, self.cad_file)
+        self.cad = json.loads(TEST_CAD_FILE.read_text())
+
+        self.db = self.engine(load_neos(self.neo_file), load_approaches(self.cad_file))
+        self.reloader = Reloader(self.neo_file, self.cad_file, self.engine)
+        self.reloader.wait()
+
+    def write_cad(self, rows):
+        self.cad['data'] = rows
+        self.cad['count'] = len(rows)
+        self.cad_file.write_text(json.dumps(self.cad, indent=2) + '\n')
+
+    def append_neo(self, designation, name):
+        # Only the leading columns of a record are ever read.
+        header = self.neo_file.read_text().splitlines()[0].split(',')
+        record = dict.fromkeys(header, '')
+        record.update(pdes=designation, name=name, pha='Y', diameter='1.5')
+        with open(self.neo_file, 'a') as file:
+            file.write(','.join(record[column] for column in header) + '\n')
+
+    def reload(self):
+        self.assertIsNone(self.reloader.poll(self.db))
+        self.reloader.wait()
+        reloaded = self.reloader.poll(self.db)
+        if reloaded is not None:
+            database, message = reloaded
+            self.assertIsNotNone(database, message)
+            self.db = database
+        return reloaded
+
+    def assertLoaded(self):
+        expected = self.engine(load_neos(self.neo_file), load_approaches(self.cad_file))
+        self.assertEqual(len(self.db.neos), len(expected.neos))
+        self.assertEqual(sorted((a.time, a.distance, a.neo.designation) for a in self.db.query()),
+                         sorted((a.time, a.distance, a.neo.designation) for a in expected.query()))
+
+    def test_appended_rows_are_a_delta(self):
+        old = self.db
+        rows = self.cad['data']
+        neo = old.get_neo_by_designation(rows[0][0])
+        approach_count = len(neo.approaches)
+        self.write_cad(rows + [rows[0][:3] + ['2020-Dec-31 23:59'] + rows[0][4:]])
+        self.assertIsNotNone(self.reload())
+        self.assertEqual((self.reloader.deltas, self.reloader.reloads), (1, 0))
+        # The new row is added to the database in use, rather than to a copy.
+        self.assertIs(self.db, old)
+        self.assertEqual(len(list(self.db.query())), len(rows) + 1)
+        self.assertEqual(len(neo.approaches), approach_count + 1)
+        self.assertLoaded()
+
+    def test_delta_waits_for_the_lock(self):
+        rows = self.cad['data']
+        self.write_cad(rows + rows[:2])
+        with self.reloader.lock:
+            self.assertIsNone(self.reloader.poll(self.db))
+            self.reloader._thread.join(0.2)
+            # The new rows are parsed, but not added while a command holds the lock.
+            self.assertTrue(self.reloader._thread.is_alive())
+            self.assertEqual(len(list(self.db.query())), len(rows))
+        self.reloader.wait()
+        self.assertIs(self.reloader.poll(self.db)[0], self.db)
+        self.assertLoaded()
+
+    def test_bad_delta_leaves_the_database_alone(self):
+        self.append_neo('2099 ZZ', 'Reloaded')
+        rows = self.cad['data']
+        self.write_cad(rows + [['2099 ZZ'] + rows[0][1:], ['no such NEO'] + rows[0][1:]])
+        old = self.db
+        self.assertIsNone(self.reloader.poll(self.db))
+        self.reloader.wait()
+        database, message = self.reloader.poll(self.db)
+        self.assertIsNone(database, message)
+        self.assertEqual((self.reloader.deltas, self.reloader.reloads), (0, 0))
+        self.assertIsNone(old.get_neo_by_name('Reloaded'))
+        self.assertEqual(len(list(old.query())), len(rows))
+
+    def test_unreadable_files_are_described_on_a_later_poll(self):
+        moved = self.cad_file.with_name('moved.json')
+        self.cad_file.rename(moved)
+        self.reloader = Reloader(self.neo_file, self.cad_file, self.engine)
+        self.reloader.wait()
+        self.assertIsNone(self.reloader._files)
+        moved.rename(self.cad_file)
+        self.assertIsNone(self.reload())
+        self.assertIsNotNone(self.reloader._files)
+        self.write_cad(self.cad['data'] + self.cad['data'][:1])
+        self.reload()
+        self.assertEqual((self.reloader.deltas, self.reloader.reloads), (1, 0))
+        self.assertLoaded()
+
+    def test_appended_neo_and_its_approaches(self):
+        self.append_neo('2099 ZZ', 'Reloaded')
+        rows = self.cad['data']
+        self.write_cad(rows + [['2099 ZZ'] + rows[0][1:]])
+        self.reload()
+        self.assertEqual(self.reloader.deltas, 1)
+        neo = self.db.get_neo_by_name('Reloaded')
+        self.assertEqual(len(neo.approaches), 1)
+        self.assertLoaded()
+
+    def test_changed_rows_are_reloaded(self):
+        rows = self.cad['data']
+        self.write_cad(rows[1:] + rows[:1])
+        self.reload()
+        self.assertEqual((self.reloader.deltas, self.reloader.reloads), (0, 1))
+        self.assertLoaded()
+
+    def test_repeated_appends(self):
+        rows = self.cad['data']
+        for count in (1, 3):
+            self.write_cad(rows + rows[:count])
+            self.reload()
+        self.assertEqual((self.reloader.deltas, self.reloader.reloads), (2, 0))
+        self.assertLoaded()
+
+    def test_failed_reload_waits_for_a_change(self):
+        rows = self.cad['data']
+        self.cad_file.write_text('{"fields": ["des"], "data": [[')
+        self.assertIsNone(self.reloader.poll(self.db))
+        self.reloader.wait()
+        database, message = self.reloader.poll(self.db)
+        self.assertIsNone(database)
+        # The broken file isn't reloaded again, but a fixed one is.
+        self.assertIsNone(self.reloader.poll(self.db))
+        self.assertIsNone(self.reloader._thread)
+        self.write_cad(rows + rows[:1])
+        self.reload()
+        self.assertEqual((self.reloader.deltas, self.reloader.reloads), (1, 0))
+        self.assertLoaded()
+
+    def test_missing_file_waits_to_be_replaced(self):
+        moved = self.cad_file.with_name('moved.json')
+        self.cad_file.rename(moved)
+        self.assertIsNone(self.reloader.poll(self.db))
+        self.assertIsNone(self.reloader._thread)
+        moved.rename(self.cad_file)
+        self.assertIsNone(self.reload())
+        self.assertEqual((self.reloader.deltas, self.reloader.reloads), (0, 0))
+
+    def test_touched_files_are_not_reloaded(self):
+        stat = self.cad_file.stat()
+        os.utime(self.cad_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(self.reload())
+        self.assertEqual((self.reloader.deltas, self.reloader.reloads), (0, 0))
+        # Nothing has changed since.
+        self.assertIsNone(self.reloader.poll(self.db))
+        self.assertIsNone(self.reloader._thread)
+
+
+class TestColumnarReloader(TestReloader):
+    engine = ColumnarNEODatabase
+
+
+if __name__ == '__main__':
+    unittest.main()
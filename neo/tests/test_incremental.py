@@ -0,0 +1,146 @@
+"""Check that adding to and removing from a database keeps it consistent.
+
+A database that's built up, or whittled down, a batch at a time must answer
+every query just as a database built from the same data in one go. Both
+database engines are checked.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_incremental
+"""
+import datetime
+import pathlib
+import unittest
+import unittest.mock
+
+from columnar import ColumnarNEODatabase
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+from models import CloseApproach, NearEarthObject
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+QUERIES = (
+    {},
+    {'start_date': datetime.date(2020, 3, 1), 'end_date': datetime.date(2020, 3, 31)},
+    {'start_date': datetime.date(2020, 6, 1), 'distance_max': 0.05, 'velocity_min': 10},
+    {'diameter_min': 1.0, 'hazardous': True},
+    {'distance_min': 0.1, 'velocity_max': 10},
+)
+
+
+def describe(database, criteria):
+    """Describe the matches of a query by their NEOs and times."""
+    return sorted((approach.neo.designation, approach.time_key)
+                  for approach in database.query(create_filters(**criteria)))
+
+
+def estimate(database, criteria):
+    """Estimate the fraction of close approaches that match a query."""
+    plan = database.plan(create_filters(**criteria))
+    fraction = plan.scan_estimate
+    for selectivity in plan.estimates:
+        fraction *= selectivity
+    return fraction
+
+
+class TestIncrementalDatabase(unittest.TestCase):
+    engine = NEODatabase
+    # The method that would index the whole database again.
+    reindex = '_index_neo_attributes'
+
+    def setUp(self):
+        self.neos = load_neos(TEST_NEO_FILE)
+        self.approaches = load_approaches(TEST_CAD_FILE)
+        self.expected = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    def assertSameAs(self, database, expected):
+        for criteria in QUERIES:
+            with self.subTest(criteria=criteria):
+                self.assertEqual(describe(database, criteria), describe(expected, criteria))
+        for neo in expected.neos:
+            self.assertEqual(len(database.get_neo_by_designation(neo.designation).approaches),
+                             len(neo.approaches))
+        self.assertEqual(len(database.neos), len(expected.neos))
+        times = [approach.time_key for approach in database.query(order_by='time')]
+        self.assertEqual(times, sorted(times))
+
+    def test_add_in_batches(self):
+        # Hold back the NEOs of the last approaches, and some early approaches too.
+        held_back = {approach._designation for approach in self.approaches[-300:]}
+        neos = [neo for neo in self.neos if neo.designation not in held_back]
+        database = self.engine(neos, [a for a in self.approaches[:4000]
+                                      if a._designation not in held_back])
+        # Build the range index, so that it's kept up to date too.
+        database.query(create_filters(**QUERIES[2]))
+
+        database.add_neos(neo for neo in self.neos if neo.designation in held_back)
+        rest = [a for a in self.approaches[:4000] if a._designation in held_back]
+        database.add_approaches(rest + self.approaches[4000:4500])
+        database.add_approaches(self.approaches[4500:])
+        self.assertSameAs(database, self.expected)
+        self.assertIsNotNone(database.get_neo_by_name(
+            next(neo.name for neo in self.neos if neo.name and neo.designation in held_back)))
+
+    def test_remove(self):
+        database = self.engine(self.neos, self.approaches)
+        database.query(create_filters(**QUERIES[2]))
+        kept = load_approaches(TEST_CAD_FILE)
+        removed, kept = kept[::7], [a for i, a in enumerate(kept) if i % 7]
+        # The approaches to remove are identified by their NEOs and times.
+        database.remove_approaches(removed)
+        self.assertSameAs(database, NEODatabase(load_neos(TEST_NEO_FILE), kept))
+
+    def test_remove_then_add_back(self):
+        database = self.engine(self.neos, self.approaches)
+        removed = list(database.query(create_filters(hazardous=True)))
+        database.remove_approaches(removed)
+        self.assertEqual(describe(database, {'hazardous': True}), [])
+        database.add_approaches(CloseApproach(a.time_key, a.distance, a.velocity, a.neo.designation)
+                                for a in removed)
+        self.assertSameAs(database, self.expected)
+
+    def test_invalid_changes_are_rejected(self):
+        database = self.engine(self.neos, self.approaches)
+        with self.assertRaises(ValueError):
+            database.add_neos([NearEarthObject(self.neos[0].designation, hazardous=False)])
+        with self.assertRaises(ValueError):
+            database.add_approaches([CloseApproach(0, 0.1, 10.0, designation='no such NEO')])
+        with self.assertRaises(ValueError):
+            database.remove_approaches([CloseApproach(0, 0.1, 10.0, self.neos[0].designation)])
+        self.assertSameAs(database, self.expected)
+
+    def test_small_batches_dont_revisit_the_database(self):
+        database = self.engine(self.neos, self.approaches[:4000])
+        database.query(create_filters(**QUERIES[2]))
+        # Neither the statistics nor the links of the rest of the database are rebuilt.
+        with unittest.mock.patch(f'{self.engine.__module__}.gather_statistics',
+                                 side_effect=AssertionError), \
+                unittest.mock.patch.object(self.engine, self.reindex, side_effect=AssertionError):
+            database.add_approaches(self.approaches[4000:4100])
+            database.remove_approaches(self.approaches[:100])
+        expected = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE)[100:4100])
+        self.assertSameAs(database, expected)
+
+    def test_statistics_follow_changes(self):
+        database = self.engine(self.neos, self.approaches[:2000])
+        database.add_approaches(self.approaches[2000:])
+        database.remove_approaches(self.approaches[:2000])
+        rebuilt = self.engine(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE)[2000:])
+        for criteria in QUERIES[1:]:
+            with self.subTest(criteria=criteria):
+                self.assertAlmostEqual(estimate(database, criteria), estimate(rebuilt, criteria),
+                                       delta=0.02)
+
+
+class TestIncrementalColumnarDatabase(TestIncrementalDatabase):
+    engine = ColumnarNEODatabase
+    reindex = '_index_rows'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Check that ordered and top-k queries sort their matches correctly.
+
+Every ordered query is compared with sorting all of the unordered matches, for
+both database engines.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_order
+"""
+import datetime
+import math
+import pathlib
+import unittest
+
+from columnar import ColumnarNEODatabase
+from database import NEODatabase, ORDER_KEYS
+from extract import load_neos, load_approaches
+from filters import create_filters, top
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestTop(unittest.TestCase):
+    def test_sorts_everything_without_limit(self):
+        self.assertEqual(top(iter([3, 1, 2]), key=lambda x: x), [1, 2, 3])
+        self.assertEqual(top(iter([3, 1, 2]), key=lambda x: x, descending=True), [3, 2, 1])
+
+    def test_keeps_first_n(self):
+        self.assertEqual(top(iter(range(100)), key=lambda x: -x, n=3), [99, 98, 97])
+
+    def test_unknown_keys_sort_last(self):
+        values = [2.0, math.nan, 1.0]
+        self.assertEqual(top(iter(values), key=lambda x: x)[:2], [1.0, 2.0])
+        self.assertTrue(math.isnan(top(iter(values), key=lambda x: x, descending=True)[-1]))
+        self.assertEqual(len(top(iter(values), key=lambda x: x, n=3)), 3)
+
+
+class TestOrderedQuery(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.databases = (
+            NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE)),
+            ColumnarNEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE)),
+        )
+
+    def assertOrdered(self, order_by, descending=False, limit=None, **criteria):
+        filters = create_filters(**criteria)
+        key = ORDER_KEYS[order_by]
+        for database in self.databases:
+            with self.subTest(engine=type(database).__name__):
+                expected = sorted((key(approach) for approach in database.query(filters)
+                                   if key(approach) == key(approach)), reverse=descending)
+                results = list(database.query(filters, order_by=order_by,
+                                              descending=descending, limit=limit))
+                keys = [key(approach) for approach in results]
+                known = [k for k in keys if k == k]
+                self.assertEqual(known, expected[:limit])
+                # Unknown keys, if any, only come after every known one.
+                self.assertEqual(keys[:len(known)], known)
+
+    def test_order_by_each_attribute(self):
+        for order_by in ORDER_KEYS:
+            self.assertOrdered(order_by)
+            self.assertOrdered(order_by, descending=True)
+
+    def test_top_k(self):
+        self.assertOrdered('distance', limit=20, start_date=datetime.date(2020, 6, 1))
+        self.assertOrdered('velocity', descending=True, limit=50, hazardous=True)
+        self.assertOrdered('diameter', descending=True, limit=5, distance_max=0.1)
+
+    def test_order_by_time_uses_time_index(self):
+        self.assertOrdered('time', descending=True, limit=10, start_date=datetime.date(2020, 6, 1))
+        self.assertOrdered('time', limit=10, diameter_min=1.0)
+
+    def test_unknown_diameters_sort_last(self):
+        for database in self.databases:
+            results = list(database.query(order_by='diameter', descending=True))
+            self.assertEqual(len(results), 4700)
+            self.assertTrue(math.isnan(results[-1].neo.diameter))
+
+    def test_limit_without_order(self):
+        for database in self.databases:
+            self.assertEqual(len(list(database.query(limit=7))), 7)
+
+    def test_unknown_order_is_an_error(self):
+        for database in self.databases:
+            with self.assertRaises(ValueError):
+                database.query(order_by='name')
+
+
+if __name__ == '__main__':
+    unittest.main()
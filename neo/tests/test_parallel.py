@@ -0,0 +1,73 @@
+"""Check that loading the data files in parallel produces the same data as loading them serially.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_parallel
+"""
+import json
+import pathlib
+import tempfile
+import unittest
+
+from columnar import ColumnarNEODatabase
+from extract import load_neos, iter_approaches
+from parallel import load_columns
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestLoadColumns(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        serial = ColumnarNEODatabase(load_neos(TEST_NEO_FILE), iter_approaches(TEST_CAD_FILE))
+        cls.expected_neos = [(neo.designation, neo.name, neo.hazardous) for neo in serial.neos]
+        cls.expected_columns = vars(serial.columns)
+
+        # The test file lists its `data` rows before its `fields`, which can't be
+        # split into shards, so also write a copy with the `fields` first.
+        with open(TEST_CAD_FILE) as file:
+            document = json.load(file)
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.fields_first_file = pathlib.Path(cls.tmp.name) / 'cad.json'
+        with open(cls.fields_first_file, 'w') as file:
+            json.dump({'signature': {'version': '1.1'}, 'count': document['count'],
+                       'fields': document['fields'], 'data': document['data']}, file, indent=2)
+
+        # And a copy whose rows hold a string that looks like the end of a row.
+        for row in document['data']:
+            row[document['fields'].index('t_sigma_f')] = '], ['
+        cls.fake_boundary_file = pathlib.Path(cls.tmp.name) / 'cad-fake-boundary.json'
+        with open(cls.fake_boundary_file, 'w') as file:
+            json.dump({'signature': {'version': '1.1'}, 'count': document['count'],
+                       'fields': document['fields'], 'data': document['data']}, file, indent=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def assertSameData(self, cad_file, workers):
+        neos, columns = load_columns(TEST_NEO_FILE, cad_file, workers)
+        self.assertEqual([(neo.designation, neo.name, neo.hazardous) for neo in neos],
+                         self.expected_neos)
+        self.assertEqual(vars(columns).keys(), self.expected_columns.keys())
+        for name, column in vars(columns).items():
+            self.assertEqual(column.tobytes(), self.expected_columns[name].tobytes(), msg=name)
+
+    def test_unsplittable_file(self):
+        self.assertSameData(TEST_CAD_FILE, workers=3)
+
+    def test_split_file(self):
+        self.assertSameData(self.fields_first_file, workers=3)
+
+    def test_more_shards_than_rows_per_shard(self):
+        self.assertSameData(self.fields_first_file, workers=64)
+
+    def test_row_boundary_within_a_string(self):
+        self.assertSameData(self.fake_boundary_file, workers=64)
+
+
+if __name__ == '__main__':
+    unittest.main()
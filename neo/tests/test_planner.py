@@ -0,0 +1,184 @@
+"""Check that the query planner merges, orders and estimates filters sensibly.
+
+The plans are checked against the small test data set, and every planned query
+must produce exactly the close approaches that evaluating the filters naively
+would.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_planner
+"""
+import datetime
+import operator
+import pathlib
+import unittest
+
+from columnar import ColumnarNEODatabase
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters, DateFilter, DistanceFilter, VelocityFilter, DiameterFilter, \
+    HazardousFilter, RangeFilter
+from planner import ColumnStatistics, plan_query
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestColumnStatistics(unittest.TestCase):
+    def test_selectivity_of_range(self):
+        statistics = ColumnStatistics(range(100))
+        self.assertAlmostEqual(statistics.selectivity(10, 19), 0.1)
+        self.assertAlmostEqual(statistics.selectivity(high=49), 0.5)
+        self.assertEqual(statistics.selectivity(50, 10), 0)
+
+    def test_missing_values_never_match(self):
+        statistics = ColumnStatistics([float('nan'), float('nan'), 1.0, 2.0])
+        self.assertAlmostEqual(statistics.selectivity(), 0.5)
+
+
+class TestPlanQuery(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    def test_min_and_max_merge_into_range(self):
+        plan = self.db.plan(create_filters(distance_min=0.01, distance_max=0.1))
+        self.assertEqual(len(plan.filters), 1)
+        merged = plan.filters[0]
+        self.assertIsInstance(merged, RangeFilter)
+        self.assertIs(merged.kind, DistanceFilter)
+        self.assertEqual((merged.low, merged.high), (0.01, 0.1))
+
+    def test_tightest_bounds_win(self):
+        filters = [DistanceFilter(operator.ge, 0.01), DistanceFilter(operator.ge, 0.02),
+                   DistanceFilter(operator.le, 0.1)]
+        merged, = plan_query(filters, self.db.statistics, len(self.db.approaches)).filters
+        self.assertEqual((merged.low, merged.high), (0.02, 0.1))
+
+    def test_contradictory_bounds_are_empty(self):
+        filters = create_filters(velocity_min=30, velocity_max=10)
+        self.assertTrue(self.db.plan(filters).empty)
+        self.assertEqual(list(self.db.query(filters)), [])
+
+    def test_date_range_goes_to_time_index(self):
+        filters = create_filters(start_date=datetime.date(2020, 3, 1),
+                                 end_date=datetime.date(2020, 3, 31), hazardous=True)
+        plan = self.db.plan(filters)
+        self.assertEqual(plan.access, 'time')
+        (kind, first_day, last_day), = plan.access_bounds
+        self.assertEqual((first_day, last_day), (DateFilter.key_of(datetime.date(2020, 3, 1)),
+                                                 DateFilter.key_of(datetime.date(2020, 3, 31))))
+        self.assertEqual([type(f) for f in plan.filters], [HazardousFilter])
+
+    def test_date_range_is_a_filter_without_time_index(self):
+        filters = create_filters(date=datetime.date(2020, 3, 2))
+        plan = plan_query(filters, self.db.statistics, len(self.db.approaches))
+        self.assertEqual(plan.access, 'scan')
+        self.assertEqual([type(f) for f in plan.filters], [DateFilter])
+
+    def test_selective_filters_run_first(self):
+        # Almost every approach is within 0.5 au, but few are hazardous.
+        filters = create_filters(distance_max=0.5, hazardous=True)
+        plan = plan_query(filters, self.db.statistics, len(self.db.approaches), time_index=True)
+        self.assertEqual([type(f) for f in plan.filters], [HazardousFilter, DistanceFilter])
+        self.assertGreater(plan.estimates[1], plan.estimates[0])
+
+    def test_neo_filters_pick_neos(self):
+        plan = self.db.plan(create_filters(diameter_min=1.0, hazardous=True, velocity_max=20))
+        self.assertEqual(plan.access, 'neos')
+        self.assertEqual({type(f) for f in plan.access_filters}, {DiameterFilter, HazardousFilter})
+        self.assertEqual([type(f) for f in plan.filters], [VelocityFilter])
+        self.assertLess(plan.scan_estimate, 0.1)
+
+    def test_narrower_index_wins(self):
+        # A single day is narrower than every non-hazardous NEO.
+        plan = self.db.plan(create_filters(date=datetime.date(2020, 3, 2), hazardous=False))
+        self.assertEqual(plan.access, 'time')
+        self.assertEqual([type(f) for f in plan.filters], [HazardousFilter])
+        # But every day of the year is wider than the NEOs of at least 1 km.
+        plan = self.db.plan(create_filters(start_date=datetime.date(2020, 1, 1), diameter_min=1.0))
+        self.assertEqual(plan.access, 'neos')
+        self.assertEqual([type(f) for f in plan.access_filters], [DiameterFilter])
+        self.assertEqual([type(f) for f in plan.filters], [DateFilter])
+
+    def test_explain_mentions_every_filter(self):
+        plan = self.db.plan(create_filters(start_date=datetime.date(2020, 3, 1),
+                                           distance_min=0.01, distance_max=0.1))
+        text = str(plan)
+        self.assertIn('range index', text)
+        self.assertIn('RangeFilter(DistanceFilter', text)
+
+    def test_several_ranges_go_to_range_index(self):
+        filters = create_filters(start_date=datetime.date(2020, 3, 1), distance_max=0.05,
+                                 velocity_min=20, hazardous=False)
+        plan = self.db.plan(filters)
+        self.assertEqual(plan.access, 'box')
+        self.assertEqual({kind for kind, *_ in plan.access_bounds},
+                         {DateFilter, DistanceFilter, VelocityFilter})
+        self.assertEqual([type(f) for f in plan.filters], [HazardousFilter])
+
+    def test_box_filter_is_planned_by_its_ranges(self):
+        criteria = dict(start_date=datetime.date(2020, 3, 1), distance_max=0.05, velocity_min=20)
+        boxed = self.db.plan(create_filters(box=True, **criteria))
+        unboxed = self.db.plan(create_filters(**criteria))
+        self.assertEqual(boxed.access, unboxed.access)
+        self.assertEqual(boxed.access_bounds, unboxed.access_bounds)
+
+
+class TestPlannedQuery(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        cls.columnar = ColumnarNEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    def assertMatchesNaiveQuery(self, **criteria):
+        filters = create_filters(**criteria)
+        expected = {(approach.time, approach.neo.designation) for approach in self.db.approaches
+                    if all(f(approach) for f in filters)}
+        for database in (self.db, self.columnar):
+            with self.subTest(engine=type(database).__name__):
+                self.assertEqual(expected, {(approach.time, approach.neo.designation)
+                                            for approach in database.query(filters)})
+        return expected
+
+    def test_ranges(self):
+        self.assertTrue(self.assertMatchesNaiveQuery(
+            start_date=datetime.date(2020, 2, 1), end_date=datetime.date(2020, 5, 1),
+            distance_min=0.01, distance_max=0.2, velocity_min=5, velocity_max=25,
+            diameter_min=0.1, diameter_max=3.0))
+
+    def test_neo_attributes(self):
+        self.assertTrue(self.assertMatchesNaiveQuery(diameter_min=1.0, hazardous=True))
+        self.assertTrue(self.assertMatchesNaiveQuery(diameter_min=0.1, diameter_max=0.5,
+                                                     hazardous=False, velocity_min=10))
+        self.assertTrue(self.assertMatchesNaiveQuery(start_date=datetime.date(2020, 6, 1),
+                                                     diameter_min=1.0))
+
+    def test_neo_attributes_are_sorted_by_time(self):
+        times = [approach.time for approach in self.db.query(create_filters(hazardous=True))]
+        self.assertEqual(times, sorted(times))
+
+    def test_box(self):
+        self.assertTrue(self.assertMatchesNaiveQuery(
+            start_date=datetime.date(2020, 3, 1), distance_max=0.05, velocity_min=10))
+        self.assertTrue(self.assertMatchesNaiveQuery(distance_min=0.1, velocity_max=10))
+
+    def test_box_filter(self):
+        criteria = dict(date=datetime.date(2020, 3, 2), start_date=datetime.date(2020, 3, 1),
+                        distance_max=0.3, velocity_min=3, hazardous=False)
+        expected = self.assertMatchesNaiveQuery(**criteria)
+        boxed = create_filters(box=True, **criteria)
+        for database in (self.db, self.columnar):
+            self.assertEqual(expected, {(approach.time, approach.neo.designation)
+                                        for approach in database.query(boxed)})
+
+    def test_mixed(self):
+        self.assertTrue(self.assertMatchesNaiveQuery(
+            date=datetime.date(2020, 3, 2), velocity_max=30, hazardous=False))
+        self.assertTrue(self.assertMatchesNaiveQuery(distance_max=0.1, hazardous=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
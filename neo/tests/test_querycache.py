@@ -0,0 +1,155 @@
+"""Check that the query cache answers queries exactly as its database would.
+
+Repeated, reordered and refined queries must be answered from the cache, and
+the least recently used queries must be evicted to respect its limits.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_querycache
+"""
+import datetime
+import pathlib
+import sys
+import unittest
+import unittest.mock
+
+from columnar import ColumnarNEODatabase
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+from querycache import QueryCache, _size
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestQueryCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    def setUp(self):
+        self.cache = QueryCache(self.db)
+
+    def assertCachedQueryMatches(self, filters, **options):
+        expected = [(a.time, a.neo.designation) for a in self.db.query(filters, **options)]
+        found = [(a.time, a.neo.designation) for a in self.cache.query(filters, **options)]
+        if options.get('order_by') is None:
+            expected, found = sorted(expected), sorted(found)
+        self.assertEqual(found, expected)
+
+    def test_repeated_query_hits(self):
+        filters = create_filters(start_date=datetime.date(2020, 3, 1), hazardous=True)
+        self.assertCachedQueryMatches(filters)
+        self.assertCachedQueryMatches(filters)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_order_of_filters_is_irrelevant(self):
+        self.cache.matches(create_filters(distance_min=0.01, distance_max=0.1))
+        reordered = list(reversed(create_filters(distance_max=0.1, distance_min=0.01)))
+        self.cache.matches(reordered)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_refinement_narrows_cached_matches(self):
+        self.cache.matches(create_filters(hazardous=False))
+        self.assertCachedQueryMatches(create_filters(hazardous=False, velocity_max=10))
+        self.assertCachedQueryMatches(create_filters(hazardous=False, velocity_min=5, velocity_max=8))
+        self.assertCachedQueryMatches(create_filters(hazardous=False, velocity_min=30, velocity_max=8))
+        self.assertEqual((self.cache.refinements, self.cache.misses), (3, 1))
+
+    def test_looser_query_is_a_miss(self):
+        self.cache.matches(create_filters(velocity_max=10))
+        self.assertCachedQueryMatches(create_filters(velocity_max=20))
+        self.assertCachedQueryMatches(create_filters(hazardous=True))
+        self.assertEqual((self.cache.refinements, self.cache.misses), (0, 3))
+
+    def test_order_and_limit_of_cached_matches(self):
+        filters = create_filters(start_date=datetime.date(2020, 6, 1))
+        self.cache.matches(filters)
+        for order_by in ('time', 'distance', 'diameter'):
+            for descending in (False, True):
+                with self.subTest(order_by=order_by, descending=descending):
+                    self.assertCachedQueryMatches(filters, order_by=order_by,
+                                                  descending=descending, limit=25)
+        self.assertEqual(len(list(self.cache.query(filters, limit=7))), 7)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache = QueryCache(self.db, max_entries=2)
+        first, second, third = (create_filters(hazardous=True), create_filters(hazardous=False),
+                                create_filters(velocity_max=5))
+        self.cache.matches(first)
+        self.cache.matches(second)
+        self.cache.matches(first)
+        self.cache.matches(third)
+        self.assertEqual(self.cache.evictions, 1)
+        # The second query was evicted, but the first was used since.
+        self.cache.matches(first)
+        self.cache.matches(create_filters(hazardous=False, velocity_max=25))
+        self.assertEqual((self.cache.hits, self.cache.refinements), (2, 0))
+
+    def test_memory_cap(self):
+        # The approaches belong to the database; the cache only holds a tuple of them.
+        self.cache = QueryCache(self.db, max_bytes=16 * 1024)
+        self.cache.matches(create_filters())
+        self.cache.matches(create_filters())
+        self.assertEqual(self.cache.hits, 0)
+        self.cache.matches(create_filters(hazardous=True))
+        self.cache.matches(create_filters(hazardous=True))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_rows_are_cached_rather_than_approaches(self):
+        database = ColumnarNEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        self.cache = QueryCache(database)
+        matches = self.cache.matches(create_filters())
+        (_, rows), = self.cache._entries.values()
+        self.assertEqual(_size(rows), sys.getsizeof(rows))
+        self.assertLess(_size(rows), 10 * len(database.columns))
+        times = [approach.time_key for approach in matches]
+        self.assertEqual(times, sorted(times))
+
+    def test_time_order_is_not_sorted_again(self):
+        filters = create_filters(hazardous=True)
+        self.cache.matches(filters)
+        with unittest.mock.patch('builtins.sorted', side_effect=AssertionError):
+            found = list(self.cache.query(filters, order_by='time', descending=True, limit=5))
+        expected = list(self.db.query(filters, order_by='time', descending=True, limit=5))
+        self.assertEqual([a.time_key for a in found], [a.time_key for a in expected])
+
+    def test_expensive_limited_miss_is_streamed(self):
+        with unittest.mock.patch('querycache.CHEAP_CANDIDATES', 10):
+            self.assertCachedQueryMatches(create_filters(velocity_max=20), limit=5)
+            self.assertCachedQueryMatches(create_filters(velocity_max=20), order_by='distance',
+                                          limit=5)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+        self.assertEqual(len(self.cache._entries), 0)
+        # Without a limit, every match is found, and cached.
+        self.cache.matches(create_filters(velocity_max=20))
+        self.assertCachedQueryMatches(create_filters(velocity_max=20), limit=5)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_cheap_limited_miss_is_cached(self):
+        filters = create_filters(start_date=datetime.date(2020, 3, 1),
+                                 end_date=datetime.date(2020, 3, 2))
+        self.assertCachedQueryMatches(filters, limit=5)
+        self.assertCachedQueryMatches(filters, limit=5)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_columnar_database(self):
+        self.cache = QueryCache(ColumnarNEODatabase(load_neos(TEST_NEO_FILE),
+                                                    load_approaches(TEST_CAD_FILE)))
+        self.cache.matches(create_filters(distance_max=0.1))
+        self.assertCachedQueryMatches(create_filters(distance_max=0.05, hazardous=True),
+                                      order_by='velocity', limit=10)
+        self.assertEqual(self.cache.refinements, 1)
+        for order_by in (None, 'time', 'distance'):
+            for descending in (False, True):
+                with self.subTest(order_by=order_by, descending=descending):
+                    self.assertCachedQueryMatches(create_filters(distance_max=0.1),
+                                                  order_by=order_by, descending=descending,
+                                                  limit=25)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Check that a `GridIndex` finds exactly the close approaches within a box.
+
+The index is built with small slabs and cells, so that the test data is spread
+over many of them and boxes cut through slabs and cells alike.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_rangeindex
+"""
+import datetime
+import math
+import pathlib
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import DateFilter, DistanceFilter, VelocityFilter
+from rangeindex import GridIndex
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+KINDS = (DateFilter, DistanceFilter, VelocityFilter)
+
+
+class TestGridIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.approaches = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE)).approaches
+        cls.index = GridIndex(cls.approaches, KINDS, slab_size=256, cell_size=16)
+
+    def assertFindsBox(self, bounds):
+        expected = {id(approach) for approach in self.approaches
+                    if all(low <= kind.key(approach) <= high for kind, (low, high) in bounds.items())}
+        found = self.index.search(bounds)
+        self.assertEqual(len(found), len(expected))
+        self.assertEqual({id(approach) for approach in found}, expected)
+        return expected
+
+    def test_unbounded_box_finds_everything(self):
+        self.assertEqual(len(self.assertFindsBox({})), len(self.approaches))
+
+    def test_box(self):
+        march = (DateFilter.key_of(datetime.date(2020, 3, 1)),
+                 DateFilter.key_of(datetime.date(2020, 3, 31)))
+        self.assertTrue(self.assertFindsBox({DateFilter: march,
+                                             DistanceFilter: (0.0, 0.1),
+                                             VelocityFilter: (10.0, 20.0)}))
+
+    def test_partial_box(self):
+        self.assertTrue(self.assertFindsBox({DistanceFilter: (0.05, 0.15),
+                                             VelocityFilter: (-math.inf, 8.0)}))
+        self.assertTrue(self.assertFindsBox({VelocityFilter: (30.0, math.inf)}))
+
+    def test_empty_box(self):
+        self.assertFalse(self.assertFindsBox({DistanceFilter: (10.0, math.inf)}))
+
+    def test_empty_index(self):
+        self.assertEqual(GridIndex([], KINDS).search({}), [])
+
+
+class TestGridIndexUpdates(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.approaches = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE)).approaches
+
+    def test_add_and_remove(self):
+        approaches = list(self.approaches)
+        # Start from every other approach, so the rest fall between and around them.
+        index = GridIndex(approaches[::2], KINDS, slab_size=256, cell_size=16)
+        for approach in approaches[1::2]:
+            index.add(approach)
+        for _, _, cells, cell_firsts, cell_lasts in index.slabs:
+            # Searches bisect these, so adding approaches must keep them sorted.
+            self.assertEqual(cell_firsts, sorted(cell_firsts))
+            self.assertEqual(cell_lasts, sorted(cell_lasts))
+            self.assertEqual(cell_firsts, [cell[0] for cell in cells])
+        for approach in approaches[::3]:
+            index.remove(approach)
+        remaining = {id(approach) for i, approach in enumerate(approaches) if i % 3}
+        march = (DateFilter.key_of(datetime.date(2020, 3, 1)),
+                 DateFilter.key_of(datetime.date(2020, 3, 31)))
+        for bounds in ({}, {DateFilter: march, DistanceFilter: (0.0, 0.1)},
+                       {VelocityFilter: (30.0, math.inf)}):
+            expected = {id(approach) for approach in approaches if id(approach) in remaining and
+                        all(low <= kind.key(approach) <= high for kind, (low, high) in bounds.items())}
+            self.assertEqual({id(approach) for approach in index.search(bounds)}, expected)
+        with self.assertRaises(ValueError):
+            index.remove(approaches[0])
+
+    def test_add_to_empty_index(self):
+        index = GridIndex([], KINDS)
+        approach = self.approaches[0]
+        index.add(approach)
+        self.assertEqual(index.search({}), [approach])
+
+
+if __name__ == '__main__':
+    unittest.main()
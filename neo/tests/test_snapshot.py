@@ -0,0 +1,193 @@
+"""Check that a database restored from a snapshot matches one parsed from the data files.
+
+The snapshot is written into a temporary directory, alongside copies of the test
+data files, so that the data files can be modified to check that a stale
+snapshot gets rebuilt.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_snapshot
+"""
+import datetime
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+import random
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+from columnar import ColumnarNEODatabase
+from database import NEODatabase
+from filters import create_filters
+import snapshot
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def as_rows(database):
+    return sorted((approach.time, approach.distance, approach.velocity,
+                   approach.neo.designation, approach.neo.name, approach.neo.hazardous)
+                  for approach in database.query())
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = pathlib.Path(tmp.name)
+        self.neo_file = pathlib.Path(shutil.copy(TEST_NEO_FILE, self.root))
+        self.cad_file = pathlib.Path(shutil.copy(TEST_CAD_FILE, self.root))
+        self.snapshot_file = self.root / 'snapshot.bin'
+
+    def load(self, engine=NEODatabase):
+        return snapshot.load_database(self.neo_file, self.cad_file, engine, self.snapshot_file)
+
+    def test_first_load_writes_snapshot(self):
+        self.load()
+        self.assertTrue(self.snapshot_file.exists())
+
+    def test_restored_database_matches_parsed_database(self):
+        parsed = self.load()
+        with unittest.mock.patch('snapshot.load_approaches') as load_approaches:
+            restored = self.load()
+            load_approaches.assert_not_called()
+        self.assertEqual(as_rows(parsed), as_rows(restored))
+        self.assertEqual(restored.get_neo_by_name('Adonis').designation, '2101')
+        self.assertEqual(len(restored.get_neo_by_designation('2101').approaches),
+                         len(parsed.get_neo_by_designation('2101').approaches))
+
+    def test_snapshot_is_shared_between_engines(self):
+        parsed = self.load(ColumnarNEODatabase)
+        restored = self.load(NEODatabase)
+        self.assertIsInstance(restored, NEODatabase)
+        self.assertEqual(as_rows(parsed), as_rows(restored))
+
+    def test_restored_indexes_are_not_rebuilt(self):
+        for engine in (NEODatabase, ColumnarNEODatabase):
+            with self.subTest(engine=engine.__name__):
+                self.snapshot_file.unlink(missing_ok=True)
+                parsed = self.load(engine)
+                with unittest.mock.patch(f'{engine.__module__}.gather_statistics',
+                                         side_effect=AssertionError), \
+                        unittest.mock.patch('sortedindex.sorted', create=True,
+                                            side_effect=AssertionError), \
+                        unittest.mock.patch.object(ColumnarNEODatabase, '_index_rows',
+                                                   side_effect=AssertionError):
+                    restored = self.load(engine)
+                self.assertEqual(as_rows(parsed), as_rows(restored))
+                for criteria in ({'diameter_min': 1.0}, {'hazardous': True},
+                                 {'start_date': datetime.date(2020, 3, 1),
+                                  'end_date': datetime.date(2020, 3, 31)}):
+                    filters = create_filters(**criteria)
+                    self.assertEqual(restored.plan(filters).estimates,
+                                     parsed.plan(filters).estimates)
+                    self.assertEqual(sorted(a.time_key for a in restored.query(filters)),
+                                     sorted(a.time_key for a in parsed.query(filters)))
+
+    def test_data_files_are_hashed_before_parsing(self):
+        original = snapshot._parse
+
+        def parse_while_renaming(*args, **kwargs):
+            database = original(*args, **kwargs)
+            # Rename an NEO in place, keeping the size of the file.
+            stat = self.neo_file.stat()
+            self.neo_file.write_bytes(self.neo_file.read_bytes().replace(b'Adonis', b'Adonix'))
+            os.utime(self.neo_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            return database
+
+        with unittest.mock.patch('snapshot._parse', side_effect=parse_while_renaming):
+            self.load()
+        # The snapshot describes the file as it was parsed, so the renamed NEO is parsed anew.
+        self.assertIsNotNone(self.load().get_neo_by_name('Adonix'))
+
+    def test_errors_while_restoring_fall_back_to_parsing(self):
+        self.load()
+        with unittest.mock.patch('snapshot.neos_from_columns', side_effect=ZeroDivisionError):
+            with unittest.mock.patch('snapshot.load_approaches',
+                                     wraps=snapshot.load_approaches) as load_approaches:
+                self.assertEqual(len(as_rows(self.load())), 4700)
+                load_approaches.assert_called_once()
+
+    def test_modified_data_file_rebuilds_snapshot(self):
+        self.load()
+        with open(self.cad_file, 'a') as file:
+            file.write('\n')
+        with unittest.mock.patch('snapshot.load_approaches',
+                                 wraps=snapshot.load_approaches) as load_approaches:
+            self.load()
+            load_approaches.assert_called_once()
+
+    def test_touched_data_file_keeps_snapshot(self):
+        self.load()
+        stat = self.cad_file.stat()
+        os.utime(self.cad_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        with unittest.mock.patch('snapshot.load_approaches') as load_approaches:
+            self.load()
+            load_approaches.assert_not_called()
+        # The snapshot now knows the new modification time, so the file isn't hashed again.
+        with unittest.mock.patch('snapshot._fingerprint') as fingerprint:
+            self.load()
+            fingerprint.assert_not_called()
+
+    def test_corrupt_snapshot_is_rebuilt(self):
+        self.snapshot_file.write_bytes(b'not a snapshot')
+        self.assertEqual(len(as_rows(self.load())), 4700)
+
+    def test_snapshot_holds_no_pickle(self):
+        self.load()
+        self.assertTrue(self.snapshot_file.read_bytes().startswith(snapshot.MAGIC))
+        with open(self.snapshot_file, 'rb') as file, self.assertRaises(pickle.UnpicklingError):
+            pickle.load(file)
+
+    def test_corrupted_bytes_rebuild_snapshot(self):
+        self.load()
+        contents = self.snapshot_file.read_bytes()
+        rng = random.Random(2020)
+        # Anywhere from the header's end onwards, a few flipped bytes never get restored.
+        for attempt in range(10):
+            corrupted = bytearray(contents)
+            for position in rng.sample(range(len(contents) // 4, len(contents)), 3):
+                corrupted[position] ^= 0xFF
+            with self.subTest(attempt=attempt):
+                self.snapshot_file.write_bytes(corrupted)
+                with unittest.mock.patch('snapshot.load_approaches',
+                                         wraps=snapshot.load_approaches) as load_approaches:
+                    self.assertEqual(len(as_rows(self.load())), 4700)
+                    load_approaches.assert_called_once()
+
+    def test_garbled_snapshot_is_rebuilt(self):
+        self.load()
+        with open(self.snapshot_file, 'rb') as file:
+            file.read(len(snapshot.MAGIC))
+            header = json.loads(snapshot._read_sized(file))
+            body = file.read()
+        missing_sources = dict(header)
+        del missing_sources['sources']
+        # Headers that parse but don't hold what a header should, ahead of a good body.
+        for garbled in (missing_sources, {'version': snapshot.SNAPSHOT_VERSION},
+                        dict(header, sources=[5, 5]), dict(header, body=None), [header]):
+            with self.subTest(header=garbled):
+                garbled = json.dumps(garbled).encode()
+                self.snapshot_file.write_bytes(snapshot.MAGIC + snapshot._LENGTH.pack(len(garbled))
+                                               + garbled + body)
+                self.assertEqual(len(as_rows(self.load())), 4700)
+        # A body whose layout is nonsense, though it matches the hash in its header.
+        for layout in ({'byteorder': 'middle'}, {'arrays': 7}, [1, 2]):
+            with self.subTest(layout=layout):
+                layout = json.dumps(layout).encode()
+                garbled = [snapshot._LENGTH.pack(len(layout)), layout]
+                snapshot._dump(self.snapshot_file, dict(header, body={
+                    'size': sum(map(len, garbled)),
+                    'sha256': hashlib.sha256(b''.join(garbled)).hexdigest()}), garbled)
+                self.assertEqual(len(as_rows(self.load())), 4700)
+
+
+if __name__ == '__main__':
+    unittest.main()
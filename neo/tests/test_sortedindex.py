@@ -0,0 +1,113 @@
+"""Check that a `SortedIndex` stays sorted, and finds exactly its items within a range.
+
+The index is built with small blocks, so that adding and removing items splits
+and drops blocks.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_sortedindex
+"""
+import random
+import unittest
+import unittest.mock
+
+from sortedindex import SortedIndex
+
+
+class Item:
+    """An item with a key, compared by identity as the index compares items."""
+    def __init__(self, key):
+        self.key = key
+
+    def __repr__(self):
+        return f"Item({self.key!r})"
+
+
+def key(item):
+    return item.key
+
+
+class TestSortedIndex(unittest.TestCase):
+    def setUp(self):
+        self.random = random.Random(2020)
+        self.items = [Item(self.random.randrange(500)) for _ in range(1000)]
+
+    def assertIndexes(self, index, items):
+        expected = sorted(items, key=key)
+        self.assertEqual(len(index), len(expected))
+        self.assertEqual([item.key for item in index], [item.key for item in expected])
+        self.assertEqual([item.key for item in reversed(index)], [item.key for item in reversed(expected)])
+        self.assertEqual({id(item) for item in index}, {id(item) for item in items})
+        for low, high in ((-1, 1000), (100, 199), (250, 250), (600, 700), (300, 200)):
+            with self.subTest(low=low, high=high):
+                found = index.between(low, high)
+                matches = [item for item in expected if low <= item.key <= high]
+                self.assertEqual([item.key for item in found], [item.key for item in matches])
+                self.assertEqual({id(item) for item in found}, {id(item) for item in matches})
+
+    def test_build(self):
+        self.assertIndexes(SortedIndex(self.items, key, block_size=16), self.items)
+
+    def test_add_and_remove(self):
+        index = SortedIndex(self.items[::2], key, block_size=16)
+        for item in self.items[1::2]:
+            index.add(item)
+        self.assertIndexes(index, self.items)
+        self.assertTrue(all(len(block) <= 32 for block in index._blocks))
+
+        self.random.shuffle(self.items)
+        removed, kept = self.items[:700], self.items[700:]
+        for item in removed:
+            index.remove(item)
+        self.assertIndexes(index, kept)
+        with self.assertRaises(ValueError):
+            index.remove(removed[0])
+
+    def test_equal_keys_keep_the_order_they_were_added_in(self):
+        items = [Item(1) for _ in range(50)]
+        index = SortedIndex(items[:10], key, block_size=4)
+        for item in items[10:]:
+            index.add(item)
+        self.assertEqual([id(item) for item in index], [id(item) for item in items])
+
+    def test_empty_index(self):
+        index = SortedIndex([], key)
+        self.assertEqual(index.between(0, 10), [])
+        item = Item(5)
+        index.add(item)
+        self.assertEqual(index.between(0, 10), [item])
+        index.remove(item)
+        self.assertEqual(len(index), 0)
+        self.assertEqual(list(index), [])
+
+    def test_positions(self):
+        index = SortedIndex(self.items, key, block_size=16)
+        expected = sorted(self.items, key=key)
+        self.assertIs(index[0], expected[0])
+        self.assertIs(index[-1], expected[-1])
+        self.assertIs(index[500], expected[500])
+        self.assertEqual(index[::100], expected[::100])
+        with self.assertRaises(IndexError):
+            index[len(expected)]
+
+    def test_slices(self):
+        index = SortedIndex(self.items[::2], key, block_size=16)
+        for item in self.items[1::2]:
+            index.add(item)
+        expected = list(index)
+        # A slice doesn't copy the whole index first.
+        with unittest.mock.patch.object(SortedIndex, '__iter__', side_effect=AssertionError), \
+                unittest.mock.patch.object(SortedIndex, '__reversed__', side_effect=AssertionError):
+            for start in (None, 0, 5, 31, 32, 500, -40, 999, 1000, 2000):
+                for stop in (None, 0, 1, 33, 640, -1, -500, 1000):
+                    for step in (None, 1, 3, 16, 47, 4096, -1, -7, -64):
+                        with self.subTest(start=start, stop=stop, step=step):
+                            found = index[start:stop:step]
+                            self.assertEqual([id(item) for item in found],
+                                             [id(item) for item in expected[start:stop:step]])
+        with self.assertRaises(IndexError):
+            index[len(expected)]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -21,12 +21,14 @@ import datetime
 import io
 import json
 import pathlib
+import tempfile
 import unittest
 import unittest.mock
 
 
 from extract import load_neos, load_approaches
 from database import NEODatabase
+import write
 from write import write_to_csv, write_to_json
 
 
@@ -226,5 +228,140 @@ class TestWriteToJSON(unittest.TestCase):
         self.assertIsInstance(approach['neo']['potentially_hazardous'], bool)
 
 
+class TestStreamingWrites(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.results = build_results(None)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = pathlib.Path(tmp.name)
+
+    def test_json_is_laid_out_like_json_dump(self):
+        # More results than fit in a single batch, streamed from a one-shot iterator.
+        path = self.root / 'results.json'
+        for n in (0, 1, write.BATCH_SIZE, write.BATCH_SIZE + 1):
+            with self.subTest(n=n):
+                write_to_json(iter(self.results[:n]), path)
+                expected = json.dumps([approach.serialize() for approach in self.results[:n]],
+                                      indent=4)
+                self.assertEqual(path.read_text(), expected)
+
+    def test_compact_json(self):
+        path = self.root / 'results.json'
+        write_to_json(iter(self.results[:50]), path, indent=None)
+        text = path.read_text()
+        self.assertNotIn('\n', text)
+        self.assertNotIn(', ', text)
+        self.assertEqual(text, json.dumps([approach.serialize() for approach in self.results[:50]],
+                                          separators=(',', ':')))
+
+    def test_csv_rows_match_approaches(self):
+        path = self.root / 'results.csv'
+        write_to_csv(iter(self.results), path)
+        with open(path, newline='') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), len(self.results))
+        for row, approach in list(zip(rows, self.results))[::97]:
+            self.assertEqual(row['datetime_utc'], approach.time_str)
+            self.assertEqual(float(row['distance_au']), approach.distance)
+            self.assertEqual(row['designation'], approach.neo.designation)
+            self.assertEqual(row['potentially_hazardous'], str(approach.neo.hazardous))
+
+    def test_ndjson_has_one_element_per_line(self):
+        path = self.root / 'results.ndjson'
+        write.write_to_ndjson(iter(self.results), path)
+        lines = path.read_text().splitlines()
+        self.assertEqual(len(lines), len(self.results))
+        self.assertEqual(lines[7], json.dumps(self.results[7].serialize(), separators=(',', ':')))
+
+    @unittest.skipIf(write.pyarrow is None, "pyarrow isn't installed")
+    def test_columnar_formats_are_typed(self):
+        import pyarrow.parquet
+        parquet_path, arrow_path = self.root / 'results.parquet', self.root / 'results.arrow'
+        write.write_to_parquet(iter(self.results), parquet_path)
+        write.write_to_arrow(iter(self.results), arrow_path)
+        with write.pyarrow.memory_map(str(arrow_path)) as source:
+            arrow = write.pyarrow.ipc.open_file(source).read_all()
+        for table in (pyarrow.parquet.read_table(parquet_path), arrow):
+            self.assertEqual(table.num_rows, len(self.results))
+            first = table.slice(0, 1).to_pylist()[0]
+            approach = self.results[0]
+            self.assertEqual(first['datetime_utc'], approach.time)
+            self.assertEqual(first['distance_au'], approach.distance)
+            self.assertEqual(first['designation'], approach.neo.designation)
+            self.assertIsInstance(first['potentially_hazardous'], bool)
+            # Unknown diameters are null rather than NaN.
+            self.assertEqual(table.column('diameter_km').null_count,
+                             sum(approach.neo.diameter != approach.neo.diameter
+                                 for approach in self.results))
+
+    def test_writers_by_extension(self):
+        self.assertIs(write.WRITERS['.csv'], write_to_csv)
+        self.assertIs(write.WRITERS['.json'], write_to_json)
+        self.assertIn('.ndjson', write.WRITERS)
+
+
+class TestCachedWrites(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = pathlib.Path(tmp.name)
+        # These results are changed by some tests, so they aren't shared.
+        self.results = build_results(2 * write.BATCH_SIZE + 3)
+
+    def assertCachedWriteMatches(self, writer, suffix, **kwargs):
+        plain, cached = self.root / f'plain{suffix}', self.root / f'cached{suffix}'
+        writer(iter(self.results), plain, **kwargs)
+        for _ in range(2):
+            writer(iter(self.results), cached, cache=True, **kwargs)
+            self.assertEqual(cached.read_bytes(), plain.read_bytes())
+
+    def test_cached_writes_match_plain_writes(self):
+        self.assertCachedWriteMatches(write_to_csv, '.csv')
+        self.assertCachedWriteMatches(write_to_json, '.json')
+        self.assertCachedWriteMatches(write_to_json, '.json', indent=None)
+        self.assertCachedWriteMatches(write.write_to_ndjson, '.ndjson')
+
+    def test_repeated_write_reuses_renderings(self):
+        path = self.root / 'results.json'
+        write_to_json(iter(self.results), path, cache=True)
+        with unittest.mock.patch('models.CloseApproach.serialize', side_effect=AssertionError):
+            write_to_json(iter(self.results), path, cache=True)
+        # Another format is rendered anew, but doesn't replace the first one's rendering.
+        with self.assertRaises(AssertionError), \
+                unittest.mock.patch('models.CloseApproach.serialize', side_effect=AssertionError):
+            write_to_json(iter(self.results), path, indent=None, cache=True)
+        write_to_json(iter(self.results), path, indent=None, cache=True)
+        with unittest.mock.patch('models.CloseApproach.serialize', side_effect=AssertionError):
+            for indent in (4, None, 4):
+                write_to_json(iter(self.results), path, indent=indent, cache=True)
+
+    def test_changes_are_rendered_again(self):
+        path = self.root / 'results.csv'
+        write_to_csv(iter(self.results[:5]), path, cache=True)
+        approach = self.results[2]
+        approach.distance = 0.125
+        approach.neo.name = 'Renamed'
+        write_to_csv(iter(self.results[:5]), path, cache=True)
+        with open(path, newline='') as file:
+            row = list(csv.DictReader(file))[2]
+        self.assertEqual(row['distance_au'], '0.125')
+        self.assertEqual(row['name'], 'Renamed')
+
+    def test_changes_drop_every_format(self):
+        csv_path, json_path = self.root / 'results.csv', self.root / 'results.json'
+        write_to_csv(iter(self.results[:5]), csv_path, cache=True)
+        write_to_json(iter(self.results[:5]), json_path, cache=True)
+        self.results[2].velocity = 12.5
+        write_to_json(iter(self.results[:5]), json_path, cache=True)
+        with open(json_path) as file:
+            self.assertEqual(json.load(file)[2]['velocity_km_s'], 12.5)
+        write_to_csv(iter(self.results[:5]), csv_path, cache=True)
+        with open(csv_path, newline='') as file:
+            self.assertEqual(list(csv.DictReader(file))[2]['velocity_km_s'], '12.5')
+
+
 if __name__ == '__main__':
     unittest.main()
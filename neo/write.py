@@ -1,20 +1,59 @@
-"""Write a stream of close approaches to CSV or to JSON.
+"""Write a stream of close approaches to CSV, to JSON, or to another format.
 
 This module exports two functions: `write_to_csv` and `write_to_json`, each of
 which accept an `results` stream of close approaches and a path to which to
 write the data.
 
-These functions are invoked by the main module with the output of the `limit`
-function and the filename supplied by the user at the command line. The file's
-extension determines which of these functions is used.
+For other programs to read, `write_to_ndjson` writes newline-delimited JSON -
+one object per line - and, if the optional `pyarrow` package is installed,
+`write_to_parquet` and `write_to_arrow` write typed columns to a Parquet file or
+an Arrow IPC file. The columnar formats keep times as timestamps and flags as
+booleans, rather than strings, and are far quicker to read back. `WRITERS` maps
+each supported file extension to its function.
+
+These functions are invoked by the main module with the results of a query
+and the filename supplied by the user at the command line. The file's extension
+determines which of these functions is used.
+
+Both functions stream: each close approach is turned into a row or a JSON
+element as it arrives, and the output is written out a batch at a time, so
+that writing a million results takes no more memory than writing ten.
+
+An interactive session writes many overlapping sets of results. With `cache`,
+the text-based writers instead keep each approach's rendered line or element
+on the approach itself (see `CloseApproach.render`), so that writing it again -
+unchanged, in the same format - only copies the text.
 
 You'll edit this file in Part 4.
 """
 import csv
+import datetime
+import functools
+import io
+import itertools
 import json
 
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from helpers import datetime_to_minutes, minutes_to_str
+
+
+# How many close approaches to format before each write to the output file.
+BATCH_SIZE = 1024
+
+# The header of a CSV file of close approaches.
+CSV_FIELDNAMES = (
+    'datetime_utc', 'distance_au', 'velocity_km_s',
+    'designation', 'name', 'diameter_km', 'potentially_hazardous'
+)
+
 
-def write_to_csv(results, filename):
+def write_to_csv(results, filename, cache=False):
     """Write an iterable of `CloseApproach` objects to a CSV file.
 
     The precise output specification is in `README.md`. Roughly, each output row
@@ -23,37 +62,45 @@ def write_to_csv(results, filename):
 
     :param results: An iterable of `CloseApproach` objects.
     :param filename: A Path-like object pointing to where the data should be saved.
+    :param cache: Whether to reuse, and keep, each approach's rendered line.
     """
-    fieldnames = (
-        'datetime_utc', 'distance_au', 'velocity_km_s',
-        'designation', 'name', 'diameter_km', 'potentially_hazardous'
-    )
-    # Write the results to a CSV file
-    fieldnames = [
-        'datetime_utc', 'distance_au',
-        'velocity_km_s', 'designation', 
-        'name', 'diameter_km', 
-        'potentially_hazardous'
-        ]
-    
     with open(filename, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for approach in results:
-            row = {
-                'datetime_utc': approach.time.strftime('%Y-%m-%d %H:%M'),
-                'distance_au': approach.distance,
-                'velocity_km_s': approach.velocity,
-                'designation': approach.neo.designation if approach.neo else '',
-                'name': approach.neo.name if approach.neo else '',
-                'diameter_km': approach.neo.diameter if approach.neo else '',
-                'potentially_hazardous': str(approach.neo.hazardous) if approach.neo else 'False'
-            }
-            writer.writerow(row)
-
-
-def write_to_json(results, filename):
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_FIELDNAMES)
+        if not cache:
+            for batch in _batches(map(csv_row, results)):
+                writer.writerows(batch)
+            return
+        for batch in _batches(results):
+            csvfile.write(''.join([approach.render('csv', csv_line) for approach in batch]))
+
+
+def csv_row(approach):
+    """Build the CSV row of a single close approach, in the order of `CSV_FIELDNAMES`.
+
+    :param approach: A `CloseApproach`, usually linked to its NEO.
+    :return: A tuple of the row's values.
+    """
+    neo = approach.neo
+    time = minutes_to_str(approach.time_key)
+    if neo is None:
+        return (time, approach.distance, approach.velocity, '', '', '', 'False')
+    return (time, approach.distance, approach.velocity,
+            neo.designation, neo.name, neo.diameter, str(neo.hazardous))
+
+
+def csv_line(approach):
+    """Render the CSV line of a single close approach, exactly as `write_to_csv` writes it.
+
+    :param approach: A `CloseApproach`, usually linked to its NEO.
+    :return: The line's text, including its line terminator.
+    """
+    line = io.StringIO()
+    csv.writer(line).writerow(csv_row(approach))
+    return line.getvalue()
+
+
+def write_to_json(results, filename, indent=4, cache=False):
     """Write an iterable of `CloseApproach` objects to a JSON file.
 
     The precise output specification is in `README.md`. Roughly, the output is a
@@ -61,10 +108,156 @@ def write_to_json(results, filename):
     their values and the 'neo' key mapping to a dictionary of the associated
     NEO's attributes.
 
+    The list is written one element at a time, laid out exactly as `json.dump`
+    would lay out the whole list.
+
     :param results: An iterable of `CloseApproach` objects.
     :param filename: A Path-like object pointing to where the data should be saved.
+    :param indent: How many spaces to indent nested values by, or None for compact output.
+    :param cache: Whether to reuse, and keep, each approach's encoded element.
     """
-    # Write the results to a JSON file
-    data = [approach.serialize() for approach in results]
+    encoder = _json_encoder(indent)
+    render = functools.partial(json_element, indent=indent)
+
     with open(filename, 'w') as jsonfile:
-        json.dump(data, jsonfile, indent=4)
\ No newline at end of file
+        started = False
+        for batch in _batches(results):
+            if cache:
+                elements = ','.join([approach.render(('json', indent), render) for approach in batch])
+            else:
+                # Encoding a whole batch as a list lays out its elements just as they'd
+                # be laid out in the complete list; only the brackets are dropped.
+                elements = encoder.encode([approach.serialize() for approach in batch])[1:-1]
+                if indent is not None:
+                    elements = elements.rstrip('\n')
+            jsonfile.write((',' if started else '[') + elements)
+            started = True
+        if not started:
+            jsonfile.write('[]')
+        else:
+            jsonfile.write(']' if indent is None else '\n]')
+
+
+def json_element(approach, indent=4):
+    """Encode a single close approach as an element of the list that `write_to_json` writes.
+
+    :param approach: A `CloseApproach`, usually linked to its NEO.
+    :param indent: How many spaces to indent nested values by, or None for compact output.
+    :return: The element's text. If indented, it starts with the line break and
+             the indentation that precede it in the list.
+    """
+    element = _json_encoder(indent).encode([approach.serialize()])[1:-1]
+    return element if indent is None else element.rstrip('\n')
+
+
+def write_to_ndjson(results, filename, cache=False):
+    """Write an iterable of `CloseApproach` objects to a newline-delimited JSON file.
+
+    Each line holds one compact JSON object, exactly as an element of the list
+    written by `write_to_json`, so that the file can be read a line at a time.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :param filename: A Path-like object pointing to where the data should be saved.
+    :param cache: Whether to reuse, and keep, each approach's encoded object - which
+                  is shared with compact output from `write_to_json`.
+    """
+    encode = _json_encoder(None).encode
+    render = functools.partial(json_element, indent=None)
+    with open(filename, 'w') as ndjsonfile:
+        for batch in _batches(results):
+            if cache:
+                lines = [approach.render(('json', None), render) + '\n' for approach in batch]
+            else:
+                lines = [encode(approach.serialize()) + '\n' for approach in batch]
+            ndjsonfile.write(''.join(lines))
+
+
+@functools.lru_cache(maxsize=None)
+def _json_encoder(indent):
+    """Make the JSON encoder for an indentation, or for compact output if it's None."""
+    if indent is None:
+        return json.JSONEncoder(separators=(',', ':'))
+    return json.JSONEncoder(indent=indent)
+
+
+# The minute of the Unix epoch, from which Arrow counts its timestamps.
+_EPOCH_MINUTES = datetime_to_minutes(datetime.datetime(1970, 1, 1))
+
+
+def _record_batches(results):
+    """Convert a stream of close approaches into a stream of Arrow record batches.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :yield: A `pyarrow.RecordBatch` of up to `BATCH_SIZE` approaches at a time.
+    """
+    for batch in _batches(results):
+        neos = [approach.neo for approach in batch]
+        diameters = [neo.diameter if neo else None for neo in neos]
+        yield pyarrow.RecordBatch.from_arrays([
+            pyarrow.array([(approach.time_key - _EPOCH_MINUTES) * 60 for approach in batch],
+                          pyarrow.timestamp('s')),
+            pyarrow.array([approach.distance for approach in batch], pyarrow.float64()),
+            pyarrow.array([approach.velocity for approach in batch], pyarrow.float64()),
+            pyarrow.array([neo.designation if neo else None for neo in neos], pyarrow.string()),
+            pyarrow.array([neo.name if neo else None for neo in neos], pyarrow.string()),
+            # An unknown diameter is null, rather than NaN.
+            pyarrow.array(diameters, pyarrow.float64(), from_pandas=True),
+            pyarrow.array([bool(neo and neo.hazardous) for neo in neos], pyarrow.bool_()),
+        ], schema=ARROW_SCHEMA)
+
+
+def write_to_parquet(results, filename):
+    """Write an iterable of `CloseApproach` objects to a Parquet file.
+
+    The columns are those of `write_to_csv`, typed as in `ARROW_SCHEMA`, and
+    each batch of approaches becomes its own row group. Requires `pyarrow`.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :param filename: A Path-like object pointing to where the data should be saved.
+    """
+    with pyarrow.parquet.ParquetWriter(str(filename), ARROW_SCHEMA) as writer:
+        for batch in _record_batches(results):
+            writer.write_batch(batch)
+
+
+def write_to_arrow(results, filename):
+    """Write an iterable of `CloseApproach` objects to an Arrow IPC file.
+
+    The columns are those of `write_to_csv`, typed as in `ARROW_SCHEMA`, written
+    one record batch at a time. Requires `pyarrow`.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :param filename: A Path-like object pointing to where the data should be saved.
+    """
+    with pyarrow.OSFile(str(filename), 'wb') as sink, \
+            pyarrow.ipc.new_file(sink, ARROW_SCHEMA) as writer:
+        for batch in _record_batches(results):
+            writer.write_batch(batch)
+
+
+# The typed columns of the Parquet and Arrow IPC formats, when `pyarrow` is installed.
+ARROW_SCHEMA = pyarrow.schema([
+    ('datetime_utc', pyarrow.timestamp('s')),
+    ('distance_au', pyarrow.float64()),
+    ('velocity_km_s', pyarrow.float64()),
+    ('designation', pyarrow.string()),
+    ('name', pyarrow.string()),
+    ('diameter_km', pyarrow.float64()),
+    ('potentially_hazardous', pyarrow.bool_()),
+]) if pyarrow is not None else None
+
+# The function that writes each supported format, by file extension.
+WRITERS = {
+    '.csv': write_to_csv,
+    '.json': write_to_json,
+    '.ndjson': write_to_ndjson,
+}
+if pyarrow is not None:
+    WRITERS['.parquet'] = write_to_parquet
+    WRITERS['.arrow'] = write_to_arrow
+
+
+def _batches(iterable, size=BATCH_SIZE):
+    """Split an iterable into lists of at most `size` consecutive values."""
+    iterator = iter(iterable)
+    return iter(lambda: list(itertools.islice(iterator, size)), [])